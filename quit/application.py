@@ -3,6 +3,7 @@ import sys
 import os
 from quit.conf import Feature, QuitConfiguration
 from quit.exceptions import InvalidConfigurationError
+from quit.helpers import parseSize
 from quit.web.app import create_app
 import logging
 
@@ -69,6 +70,14 @@ def initialize(args):
             configmode=args.configmode,
             features=args.features,
             namespace=args.namespace,
+            storemode=args.storemode,
+            blobcache=args.blobcache,
+            commitcache=args.commitcache,
+            diskcache=args.diskcache,
+            parsers=args.parsers,
+            resultcache=args.resultcache,
+            resultcachedir=args.resultcachedir,
+            resultcachedirsize=args.resultcachedirsize,
         )
     except InvalidConfigurationError as e:
         logger.error(e)
@@ -118,6 +127,26 @@ def parseArgs(args):
     featurehelp = """This option enables additional features of the QuitStore:
                 "provenance" - Store provenance information for each revision.
                 "persistance" - Store all internal data as rdf graph."""
+    storehelp = """This option tells QuitStore where to keep its internal quad store:
+                "memory" - Rebuild the store in memory on every start (default).
+                "sqlite" - Keep the store in a database file below the .git directory and only
+                synchronize new commits on start."""
+    blobcachehelp = """Memory budget of the cache for parsed graph files, e.g. "512M" or "2G".
+                    If not set, the 50 most recently used files are kept."""
+    commitcachehelp = """Memory budget of the cache for the file lists of commits, e.g. "16M".
+                    If not set, the file lists of the 50 most recently used commits are kept."""
+    diskcachehelp = """Disk budget of the index files of parsed graph files below .git/quit/blobs,
+                    e.g. "1G". Least recently used files are removed once the budget is exceeded,
+                    0 disables the disk cache. If not set, the files are kept."""
+    parsershelp = """Number of processes which parse the graph files of a revision concurrently.
+                  Defaults to 1, 0 uses all available processors."""
+    resultcachehelp = """Memory budget of the cache for serialized query results, e.g. "64M".
+                      If not set, query results are not cached."""
+    resultcachedirhelp = """Directory to which query results evicted from the result cache are
+                         written, so they can be loaded again without evaluating the query."""
+    resultcachedirsizehelp = """Disk budget of the results in the result cache directory, e.g.
+                             "1G". Least recently used results are removed once the budget is
+                             exceeded. Defaults to ten times the memory budget."""
     confighelp = """Path of config file (turtle). Defaults to ./config.ttl."""
     loghelp = """Path to the log file."""
     targethelp = 'The directory of the local store repository.'
@@ -130,6 +159,14 @@ def parseArgs(args):
     namespace_default = 'http://quit.instance/'
     targetdir_default = None
     configfile_default = "config.ttl"
+    storemode_default = None
+    blobcache_default = None
+    commitcache_default = None
+    diskcache_default = None
+    parsers_default = None
+    resultcache_default = None
+    resultcachedir_default = None
+    resultcachedirsize_default = None
 
     if 'QUIT_PORT' in os.environ:
         port_default = os.environ['QUIT_PORT']
@@ -149,6 +186,30 @@ def parseArgs(args):
     if 'QUIT_CONFIGFILE' in os.environ:
         configfile_default = os.environ['QUIT_CONFIGFILE']
 
+    if 'QUIT_STOREMODE' in os.environ:
+        storemode_default = os.environ['QUIT_STOREMODE']
+
+    if 'QUIT_BLOBCACHE' in os.environ:
+        blobcache_default = os.environ['QUIT_BLOBCACHE']
+
+    if 'QUIT_COMMITCACHE' in os.environ:
+        commitcache_default = os.environ['QUIT_COMMITCACHE']
+
+    if 'QUIT_DISKCACHE' in os.environ:
+        diskcache_default = os.environ['QUIT_DISKCACHE']
+
+    if 'QUIT_PARSERS' in os.environ:
+        parsers_default = os.environ['QUIT_PARSERS']
+
+    if 'QUIT_RESULTCACHE' in os.environ:
+        resultcache_default = os.environ['QUIT_RESULTCACHE']
+
+    if 'QUIT_RESULTCACHEDIR' in os.environ:
+        resultcachedir_default = os.environ['QUIT_RESULTCACHEDIR']
+
+    if 'QUIT_RESULTCACHEDIRSIZE' in os.environ:
+        resultcachedirsize_default = os.environ['QUIT_RESULTCACHEDIRSIZE']
+
     parser = argparse.ArgumentParser()
     parser.add_argument('-b', '--basepath', type=str, default=basepath_default, help=basepathhelp)
     parser.add_argument(
@@ -165,6 +226,28 @@ def parseArgs(args):
         'localconfig',
         'repoconfig'
     ], help=graphhelp)
+    parser.add_argument('-sm', '--storemode', type=str, default=storemode_default, choices=[
+        'memory',
+        'sqlite'
+    ], help=storehelp)
+    parser.add_argument(
+        '-bc', '--blobcache', type=parseSize, default=blobcache_default, help=blobcachehelp)
+    parser.add_argument(
+        '-cc', '--commitcache', type=parseSize, default=commitcache_default,
+        help=commitcachehelp)
+    parser.add_argument(
+        '-dc', '--diskcache', type=parseSize, default=diskcache_default, help=diskcachehelp)
+    parser.add_argument(
+        '-ps', '--parsers', type=int, default=parsers_default, help=parsershelp)
+    parser.add_argument(
+        '-rc', '--resultcache', type=parseSize, default=resultcache_default,
+        help=resultcachehelp)
+    parser.add_argument(
+        '-rd', '--resultcachedir', type=str, default=resultcachedir_default,
+        help=resultcachedirhelp)
+    parser.add_argument(
+        '-rs', '--resultcachedirsize', type=parseSize, default=resultcachedirsize_default,
+        help=resultcachedirsizehelp)
     parser.add_argument('-f', '--features', nargs='*', action=FeaturesAction,
                         default=Feature.Unknown,
                         help=featurehelp)
@@ -1,12 +1,71 @@
+import hashlib
+import logging
+import marshal
+import os
+
+from bisect import bisect_left
 from collections import OrderedDict
+from heapq import merge
+from itertools import islice
+from zlib import crc32
+from rdflib import ConjunctiveGraph, Graph, URIRef, BNode, Literal
+from rdflib.store import VALID_STORE
 from sortedcontainers import SortedSet
 
+from quit.plugins.stores.indexstore import BloomFilter, IndexStore, build
+
+logger = logging.getLogger('quit.cache')
+
+
+def encode_term(term):
+    """Split a term into a (kind, value, extra) tuple of strings."""
+    if isinstance(term, Graph):
+        term = term.identifier
+    if isinstance(term, Literal):
+        if term.language:
+            return 'L', str(term), '@' + term.language
+        if term.datatype:
+            return 'L', str(term), '^' + str(term.datatype)
+        return 'L', str(term), ''
+    if isinstance(term, BNode):
+        return 'B', str(term), ''
+    return 'U', str(term), ''
+
+
+def decode_term(kind, value, extra):
+    """Build a term from the (kind, value, extra) tuple created by encode_term."""
+    if kind == 'L':
+        if extra.startswith('@'):
+            return Literal(value, lang=extra[1:])
+        if extra.startswith('^'):
+            return Literal(value, datatype=URIRef(extra[1:]))
+        return Literal(value)
+    if kind == 'B':
+        return BNode(value)
+    return URIRef(value)
+
 
 class Cache:
+    """A least recently used cache.
+
+    By default the cache holds up to capacity entries. If a budget is given, entries are evicted
+    once the sum of their sizes, as estimated by the sizeof function, exceeds the budget, thus
+    the number of entries is not limited in this mode. Entries which exceed the budget on their
+    own are not cached at all. If a name is given, evictions are logged with the counters of the
+    cache to tell when a budget is too small for the working set.
+    """
 
-    def __init__(self, capacity=50):
+    def __init__(self, capacity=50, budget=None, sizeof=None, name=None):
+        self.name = name
         self.stack = OrderedDict()
         self.capacity = capacity
+        self.budget = budget
+        self.sizeof = sizeof or (lambda value: 1)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizes = {}
 
     def get(self, key):
         """Get a value from the cache.
@@ -14,23 +73,52 @@ class Cache:
         Raises:
             KeyError if no value was found for the given key
         """
-        value = self.stack.pop(key)
+        try:
+            value = self.stack.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
         self.stack[key] = value
         return value
 
     def set(self, key, value):
-        try:
-            self.stack.pop(key)
-        except KeyError:
+        self.remove(key)
+
+        if self.budget is None:
             if len(self.stack) >= self.capacity:
-                self.stack.popitem(last=False)
+                self._evict()
+            self.stack[key] = value
+            return
+
+        size = self.sizeof(value)
+        if size > self.budget:
+            self.evictions += 1
+            if self.name is not None:
+                logger.info('Entry of {} bytes exceeds the budget of the {} cache: {}'.format(
+                    size, self.name, self.stats
+                ))
+            return
+        while self.stack and self.bytes + size > self.budget:
+            self._evict()
         self.stack[key] = value
+        self._sizes[key] = size
+        self.bytes += size
+
+    def _evict(self):
+        key, _ = self.stack.popitem(last=False)
+        self.bytes -= self._sizes.pop(key, 0)
+        self.evictions += 1
+        if self.name is not None and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Evicted an entry of the {} cache: {}'.format(self.name, self.stats))
 
     def remove(self, key):
         try:
-            return self.stack.pop(key)
+            value = self.stack.pop(key)
         except KeyError:
             return
+        self.bytes -= self._sizes.pop(key, 0)
+        return value
 
     def __contains__(self, key):
         return key in self.stack
@@ -45,29 +133,471 @@ class Cache:
         """
         return len(self.stack)
 
+    @property
+    def stats(self):
+        """Return the counters of the cache as dictionary."""
+        return {
+            'entries': len(self.stack),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class CommitIndex:
+    """An index of the commits which are already synchronized into the store.
+
+    Next to the commit ids the index remembers the last seen target of each reference, thus a
+    synchronization only has to walk the history behind references which have moved. If a path is
+    given the index is persisted as an append-only log with one record per line.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._commits = set()
+        self._refs = {}
+
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        records = 0
+        try:
+            with open(self._path, 'r') as f:
+                for line in f:
+                    record = line.split()
+                    records += 1
+                    if len(record) == 2 and record[0] == 'commit':
+                        self._commits.add(record[1])
+                    elif len(record) == 3 and record[0] == 'ref':
+                        self._refs[record[1]] = record[2]
+        except FileNotFoundError:
+            return
+
+        # every moved reference leaves an outdated record behind, so rewrite the log from time
+        # to time
+        if records > 2 * (len(self._commits) + len(self._refs)):
+            self._write()
+
+    def _records(self):
+        for commit_id in self._commits:
+            yield 'commit {}\n'.format(commit_id)
+        for name, commit_id in self._refs.items():
+            yield 'ref {} {}\n'.format(name, commit_id)
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(self._records())
+        os.replace(tmp, self._path)
+
+    def _append(self, record):
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'a') as f:
+            f.write(record)
+
+    def add(self, commit_id):
+        """Mark a commit as synchronized."""
+        if commit_id not in self._commits:
+            self._commits.add(commit_id)
+            self._append('commit {}\n'.format(commit_id))
+
+    def ref(self, name):
+        """Get the commit id a reference pointed to during the last synchronization or None."""
+        return self._refs.get(name)
+
+    def set_ref(self, name, commit_id):
+        """Remember the commit id a reference points to."""
+        if self._refs.get(name) != commit_id:
+            self._refs[name] = commit_id
+            self._append('ref {} {}\n'.format(name, commit_id))
+
+    def clear(self):
+        """Forget all commits and references."""
+        self._commits.clear()
+        self._refs.clear()
+        if self._path is not None and os.path.exists(self._path):
+            self._write()
+
+    def __contains__(self, commit_id):
+        return commit_id in self._commits
+
+    def __len__(self):
+        return len(self._commits)
+
+
+class BlobHistory:
+    """An index of the commits which changed the blobs of the graph files.
+
+    For each commit the index holds the paths whose blob differs from the first parent together
+    with the new and the previous blob oid. If a path is given the index is persisted as an
+    append-only log with one tab separated record per line.
+
+    Which paths are recorded depends on the mapping of graph files, thus the log starts with the
+    fingerprint of the mapping it was written with. A log with another fingerprint is discarded.
+    """
+
+    def __init__(self, path=None, fingerprint=None):
+        self._path = path
+        self._fingerprint = fingerprint or ''
+        self._changes = {}
+        self._commits = {}
+        # whether the log on disk holds the header of the current fingerprint
+        self._valid = False
+
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                if f.readline() != self._header():
+                    return
+                self._valid = True
+                for line in f:
+                    record = line.rstrip('\n').split('\t')
+                    if len(record) == 4:
+                        self._add(*record)
+        except FileNotFoundError:
+            return
+
+    def _header(self):
+        return '#{}\n'.format(self._fingerprint)
+
+    def _add(self, commit_id, path, oid, prev):
+        self._changes.setdefault(commit_id, {})[path] = (oid, prev or None)
+        self._commits.setdefault(path, []).append(commit_id)
+
+    def add(self, commit_id, changes):
+        """Record the changed blobs of a commit.
+
+        Args:
+            commit_id: The id of the commit
+            changes: A list of (path, oid, previous oid) tuples, the previous oid is None for
+                new files
+        """
+        if commit_id in self._changes:
+            return
+        self._changes[commit_id] = {}
+        records = []
+        for path, oid, prev in changes:
+            self._add(commit_id, path, str(oid), str(prev) if prev else '')
+            records.append('{}\t{}\t{}\t{}\n'.format(
+                commit_id, path, oid, prev if prev else ''
+            ))
+
+        if self._path is not None and (records or not self._valid):
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            # a stale log is replaced on the first write
+            with open(self._path, 'a' if self._valid else 'w') as f:
+                if not self._valid:
+                    f.write(self._header())
+                    self._valid = True
+                f.writelines(records)
+
+    @property
+    def valid(self):
+        """Tell whether the log on disk was written with the current fingerprint.
+
+        A log which was discarded or never written holds none of the commits indexed before.
+        """
+        return self._valid
+
+    def changes(self, commit_id):
+        """Get the changed blobs of a commit.
+
+        Returns:
+            A dictionary of paths and (oid, previous oid) tuples or None if the commit is unknown
+        """
+        return self._changes.get(commit_id)
+
+    def previous(self, path, commit_id):
+        """Get the oid of the blob of a path before it was changed by a commit or None."""
+        oid, prev = self._changes.get(commit_id, {}).get(path, (None, None))
+        return prev
+
+    def commits(self, path):
+        """Get the ids of the commits which changed a path in the order they were indexed."""
+        return list(self._commits.get(path, []))
+
+    def __contains__(self, commit_id):
+        return commit_id in self._changes
+
+
+def pack(graph):
+    """Serialize the quads of a graph into the index file format of the IndexStore.
+
+    The data holds the table of distinct terms and the sorted permutation indexes of the triples
+    of each context as integer offsets into that table.
+    """
+    return build(graph.quads((None, None, None, None)))
+
+
+def unpack(data):
+    """Build a read-only ConjunctiveGraph on the data created by pack.
+
+    Returns:
+        The graph or None if the data is invalid
+    """
+    store = IndexStore()
+    if not store.load(data):
+        return None
+    return ConjunctiveGraph(store=store)
+
+
+class BlobCache:
+    """A disk cache of the parsed content of git blobs.
+
+    Since the content of a blob never changes for its oid, the parsed quads are stored once as an
+    index file below the given directory. The file is memory-mapped when the blob is loaded later
+    on, thus neither the N-Quads have to be parsed again nor the triples have to be copied into
+    memory. If a budget is given, the least recently used files are removed once the files take
+    more bytes than the budget.
+    """
+
+    def __init__(self, path, budget=None):
+        self._path = path
+        self.budget = budget
+        self._size = None
+
+    def _file(self, oid):
+        oid = str(oid)
+        return os.path.join(self._path, oid[:2], oid[2:])
+
+    def _files(self):
+        try:
+            directories = [entry for entry in os.scandir(self._path) if entry.is_dir()]
+        except FileNotFoundError:
+            return
+        for directory in directories:
+            for entry in os.scandir(directory.path):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    yield entry
+
+    def __contains__(self, oid):
+        return os.path.exists(self._file(oid))
+
+    def get(self, oid):
+        """Load the graph of a blob.
+
+        Returns:
+            A read-only ConjunctiveGraph on the index file of the blob or None if the blob is not
+            cached
+        """
+        path = self._file(oid)
+        store = IndexStore()
+        if store.open(path) != VALID_STORE:
+            return None
+        if self.budget is not None:
+            # the modification time tells which files were used least recently
+            os.utime(path)
+        return ConjunctiveGraph(store=store)
+
+    def set(self, oid, graph):
+        """Store the quads of the graph parsed from a blob."""
+        self.write(oid, pack(graph))
+
+    def write(self, oid, data):
+        """Store the packed quads of a blob."""
+        path = self._file(oid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        if self.budget is not None:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._files())
+            else:
+                self._size += len(data)
+            if self._size > self.budget:
+                self.prune()
+
+    def prune(self):
+        """Remove the least recently used files until they take three quarters of the budget.
+
+        Pruning below the budget leaves room for the next files, thus not every write has to scan
+        the directory.
+        """
+        files = sorted(self._files(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in files)
+        for entry in files:
+            if size <= self.budget * 3 // 4:
+                break
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            size -= entry.stat().st_size
+        self._size = size
+
+
+class ResultCache(Cache):
+    """A least recently used cache of serialized query results.
+
+    Each entry is a (content type, bytes) tuple. Results are evicted once their size exceeds the
+    budget. If a path is given, evicted results are spilled to files below this directory and
+    loaded back when they are requested again. A result is either kept in memory or in a file, the
+    least recently used files are removed once they take more bytes than the disk budget, which
+    defaults to ten times the memory budget.
+    """
+
+    def __init__(self, budget, path=None, diskBudget=None):
+        super().__init__(budget=budget, sizeof=lambda value: len(value[1]), name='result')
+        self._path = path
+        self.diskBudget = diskBudget if diskBudget is not None else budget * 10
+        self._spilled = None
+        self._spilledBytes = 0
+
+    @staticmethod
+    def key(*parts):
+        """Build the key of a result from the commit, the query and the format it depends on."""
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self._path, key[:2], key[2:])
+
+    def _files(self):
+        """Get the sizes of the spilled results by their key, the least recently used first.
+
+        Files spilled by an earlier process are found in the directory when it is used first.
+        """
+        if self._spilled is None:
+            files = []
+            try:
+                directories = [entry for entry in os.scandir(self._path) if entry.is_dir()]
+            except FileNotFoundError:
+                directories = []
+            for directory in directories:
+                for entry in os.scandir(directory.path):
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, directory.name + entry.name, stat.st_size))
+            self._spilled = OrderedDict((key, size) for mtime, key, size in sorted(files))
+            self._spilledBytes = sum(self._spilled.values())
+        return self._spilled
+
+    def _spill(self, key, value):
+        files = self._files()
+        if key in files:
+            files.move_to_end(key)
+            return
+        data = marshal.dumps(value)
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        files[key] = len(data)
+        self._spilledBytes += len(data)
+
+        while self._spilledBytes > self.diskBudget:
+            self._unspill(next(iter(files)))
+
+    def _unspill(self, key):
+        """Remove the file of a spilled result."""
+        self._spilledBytes -= self._files().pop(key, 0)
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key):
+        try:
+            return super().get(key)
+        except KeyError:
+            if self._path is None:
+                raise
+
+        try:
+            with open(self._file(key), 'rb') as f:
+                value = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            raise KeyError(key)
+
+        self.misses -= 1
+        self.hits += 1
+        if self.sizeof(value) > self.budget:
+            # a result which does not fit into memory stays in its file
+            files = self._files()
+            if key in files:
+                files.move_to_end(key)
+        else:
+            self._unspill(key)
+            super().set(key, value)
+        return value
+
+    def set(self, key, value):
+        if self._path is not None:
+            if self.sizeof(value) > self.budget:
+                self._spill(key, value)
+            else:
+                self._unspill(key)
+        super().set(key, value)
+
+    def _evict(self):
+        key, value = self.stack.popitem(last=False)
+        self.bytes -= self._sizes.pop(key, 0)
+        self.evictions += 1
+        if self._path is not None:
+            self._spill(key, value)
+
 
 class FileReference:
     """A class that manages n-quad files.
     This class stores inforamtation about the location of a n-quad file and is
     able to add and delete triples/quads to that file.
+
+    The lines of the file are kept as sorted list while added and removed lines are collected
+    separately, thus changes only cost in the size of the delta. The delta is merged into the
+    lines once the content of the file is requested.
+
+    If the content is given as function, it is only called once the lines are needed, so a file
+    which is not edited is never read.
     """
 
-    def __init__(self, path, content):
+    def __init__(self, path, content, size=None):
         """Initialize a new FileReference instance.
         Args:
-            filelocation: A string of the filepath.
-            filecontentinmem: Boolean to decide if local filesystem should be used to
-                or if file content should be kept in memory too . (Defaults false)
-        Raises:
-            ValueError: If no file at the filelocation, or in the given directory + filelocation.
+            path: A string of the filepath.
+            content: The content of the file as string or list of lines or a function which
+                returns it.
+            size: The length of the content of a file which is loaded lazily.
         """
+        self._path = path
+        self._added = SortedSet()
+        self._removed = set()
+
+        if callable(content):
+            self._load = content
+            self._lines = None
+            self._size = size or 0
+        else:
+            self._setLines(content)
 
+    def _setLines(self, content):
         if isinstance(content, str):
             content = content.splitlines() or []
 
-        self._path = path
-        self._content = SortedSet(content)
-        self._modified = False
+        content = list(content)
+        # files written by the store are already sorted, so only sort files if necessary
+        if any(a >= b for a, b in zip(content, islice(content, 1, None))):
+            content = sorted(set(content))
+
+        self._load = None
+        self._lines = content
+        self._size = sum(len(line) + 1 for line in content)
+
+    def _loadLines(self):
+        if self._lines is None:
+            self._setLines(self._load())
+        return self._lines
 
     @property
     def path(self):
@@ -75,19 +605,125 @@ class FileReference:
 
     @property
     def content(self):
-        return "\n".join(self._content)
+        if self._added or self._removed:
+            self._merge()
+        return "\n".join(self._loadLines())
+
+    @property
+    def size(self):
+        """Return the length of the file content."""
+        return self._size
+
+    def _merge(self):
+        """Merge the added and removed lines into the sorted lines of the file."""
+        removed = self._removed
+        lines = self._loadLines()
+        lines = (line for line in lines if line not in removed) if removed else lines
+        self._lines = list(merge(lines, self._added))
+        self._added = SortedSet()
+        self._removed = set()
+
+    def _contains(self, data):
+        lines = self._loadLines()
+        index = bisect_left(lines, data)
+        return index < len(lines) and lines[index] == data
+
+    def files(self):
+        """Return the paths and contents of the files to write."""
+        return [(self._path, self.content)]
 
     def add(self, data):
         """Add a quad to the file content."""
-        self._content.add(data)
+        if data in self._removed:
+            self._removed.remove(data)
+        elif data in self._added or self._contains(data):
+            return
+        else:
+            self._added.add(data)
+        self._size += len(data) + 1
 
     def extend(self, data):
         """Add quads to the file content."""
-        self._content.extend(data)
+        for line in data:
+            self.add(line)
 
     def remove(self, data):
         """Remove quad from the file content."""
-        try:
-            self._content.remove(data)
-        except KeyError:
-            pass
+        if data in self._added:
+            self._added.remove(data)
+        elif data not in self._removed and self._contains(data):
+            self._removed.add(data)
+        else:
+            return
+        self._size -= len(data) + 1
+
+
+class ShardedFileReference:
+    """A class that manages n-quad files which are split into shards.
+
+    The lines are distributed over up to 256 shard files (00.nq ... ff.nq) in the directory of
+    the file by the hash of their subject, thus a change only rewrites the affected shards.
+    """
+
+    SHARDS = 256
+
+    def __init__(self, path, shards=None, sizes=None):
+        """Initialize a new ShardedFileReference instance.
+
+        Args:
+            path: A string of the directory path.
+            shards: A dictionary of the names and contents of the existing shard files, a content
+                may be given as function as for FileReference.
+            sizes: A dictionary of the names and content lengths of shard files loaded lazily.
+        """
+        self._path = path
+        self._shards = {}
+        self._modified = set()
+
+        for name, content in (shards or {}).items():
+            self._shards[name] = FileReference(
+                os.path.join(path, name), content, (sizes or {}).get(name)
+            )
+
+    @classmethod
+    def shard(cls, line):
+        """Return the name of the shard file of a N-Quads line."""
+        subject = line.split(' ', 1)[0]
+        return '{:02x}.nq'.format(crc32(subject.encode('utf-8')) % cls.SHARDS)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def size(self):
+        """Return the length of the content of all shards."""
+        return sum(shard.size for shard in self._shards.values())
+
+    def files(self):
+        """Return the paths and contents of the shards which were modified since the last reset."""
+        return [self._shards[name].files()[0] for name in sorted(self._modified)]
+
+    def reset(self):
+        """Mark all shards as unmodified once their files are written."""
+        self._modified.clear()
+
+    def add(self, data):
+        """Add a quad to the shard of its subject."""
+        name = self.shard(data)
+        if name not in self._shards:
+            self._shards[name] = FileReference(os.path.join(self._path, name), '')
+        self._shards[name].add(data)
+        self._modified.add(name)
+
+    def extend(self, data):
+        """Add quads to the shards of their subjects."""
+        for line in data:
+            self.add(line)
+
+    def remove(self, data):
+        """Remove a quad from the shard of its subject."""
+        name = self.shard(data)
+        if name in self._shards:
+            self._shards[name].remove(data)
+            self._modified.add(name)
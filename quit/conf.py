@@ -5,7 +5,7 @@ from os import walk
 from os.path import join, isfile
 from quit.exceptions import MissingConfigurationError, InvalidConfigurationError
 from quit.exceptions import UnknownConfigurationError
-from quit.helpers import isAbsoluteUri
+from quit.helpers import isAbsoluteUri, parseSize
 from rdflib import Graph, ConjunctiveGraph, Literal, Namespace, URIRef, BNode
 from rdflib.plugins.parsers import notation3
 from rdflib.namespace import RDF, NamespaceManager
@@ -34,7 +34,15 @@ class QuitConfiguration:
         features=None,
         repository=None,
         targetdir=None,
-        namespace=None
+        namespace=None,
+        storemode=None,
+        blobcache=None,
+        commitcache=None,
+        diskcache=None,
+        parsers=None,
+        resultcache=None,
+        resultcachedir=None,
+        resultcachedirsize=None
     ):
         """The init method.
 
@@ -66,7 +74,15 @@ class QuitConfiguration:
                 repository=repository,
                 targetdir=targetdir,
                 configfile=configfile,
-                configmode=configmode
+                configmode=configmode,
+                storemode=storemode,
+                blobcache=blobcache,
+                commitcache=commitcache,
+                diskcache=diskcache,
+                parsers=parsers,
+                resultcache=resultcache,
+                resultcachedir=resultcachedir,
+                resultcachedirsize=resultcachedirsize
             )
         except InvalidConfigurationError as e:
             logger.error(e)
@@ -74,7 +90,11 @@ class QuitConfiguration:
 
         return
 
-    def __initstoreconfig(self, namespace, repository, targetdir, configfile, configmode):
+    def __initstoreconfig(
+        self, namespace, repository, targetdir, configfile, configmode, storemode=None,
+        blobcache=None, commitcache=None, diskcache=None, parsers=None, resultcache=None,
+        resultcachedir=None, resultcachedirsize=None
+    ):
         """Initialize store settings."""
         if isAbsoluteUri(namespace):
             self.namespace = namespace
@@ -109,6 +129,30 @@ class QuitConfiguration:
         if configmode:
             self.setConfigMode(configmode)
 
+        if storemode:
+            self.setStoreMode(storemode)
+
+        if blobcache is not None:
+            self.setBlobCacheSize(blobcache)
+
+        if commitcache is not None:
+            self.setCommitCacheSize(commitcache)
+
+        if diskcache is not None:
+            self.setDiskCacheSize(diskcache)
+
+        if parsers is not None:
+            self.setParsers(parsers)
+
+        if resultcache is not None:
+            self.setResultCacheSize(resultcache)
+
+        if resultcachedir is not None:
+            self.setResultCacheDir(resultcachedir)
+
+        if resultcachedirsize is not None:
+            self.setResultCacheDirSize(resultcachedirsize)
+
         if targetdir:
             self.setRepoPath(targetdir)
 
@@ -153,11 +197,13 @@ class QuitConfiguration:
 
             if graphuri and format == 'nquads':
                 self.addgraph(file=file, graphuri=graphuri, format=format)
+            elif graphuri is None and file.endswith('.d'):
+                logger.warning('No *.graph file found. ' + file + ' skipped.')
             elif graphuri is None and format == 'nquads':
                 tmpgraph = ConjunctiveGraph(identifier='default')
 
                 try:
-                    tmpgraph.parse(source=os.path.join(repopath, file), format=format)
+                    tmpgraph.parse(source=os.path.join(repopath, file), format='nquad-canonical')
                 except Exception:
                     logger.error(
                         "Could not parse graphfile {}. File skipped.".format(file)
@@ -249,7 +295,9 @@ class QuitConfiguration:
 
         for row in result:
             filename = str(row['filename'])
-            format = guess_format(filename)
+            # a graph file name ending with ".d" denotes a directory of sharded graph files
+            sharded = filename.endswith('.d')
+            format = guess_format(filename[:-2] if sharded else filename)
             if format not in ['nt', 'nquads']:
                 break
 
@@ -257,12 +305,15 @@ class QuitConfiguration:
 
             graphFile = join(repopath, filename)
 
-            if isfile(graphFile):
+            if isfile(graphFile) or (sharded and os.path.isdir(graphFile)):
                 # everything is fine
                 pass
             else:
                 try:
-                    open(graphFile, 'a+').close()
+                    if sharded:
+                        os.makedirs(graphFile)
+                    else:
+                        open(graphFile, 'a+').close()
                 except PermissionError:
                     raise InvalidConfigurationError(
                         "Permission denied. Can't create file {} in repo {}".format(
@@ -297,7 +348,8 @@ class QuitConfiguration:
             else:
                 self.files[filename] = {
                     'serialization': format,
-                    'graphs': [graphuri]
+                    'graphs': [graphuri],
+                    'sharded': sharded
                 }
 
         return
@@ -330,6 +382,108 @@ class QuitConfiguration:
 
         return 'graphfiles'
 
+    def getStoreMode(self):
+        """Get the mode how Quit-Store keeps its internal quad store.
+
+        Returns:
+            A string containing the mode, "memory" if nothing is configured.
+        """
+        nsQuit = 'http://quit.aksw.org/vocab/'
+        property = URIRef(nsQuit + 'storeMode')
+
+        for s, p, o in self.sysconf.triples((None, property, None)):
+            return str(o)
+
+        return 'memory'
+
+    def getBlobCacheSize(self):
+        """Get the memory budget of the cache for parsed graph files.
+
+        Returns:
+            The budget in bytes or None if the cache is limited by its number of entries.
+        """
+        return self.__getCacheSize('blobCacheSize')
+
+    def getCommitCacheSize(self):
+        """Get the memory budget of the cache for the files of commits.
+
+        Returns:
+            The budget in bytes or None if the cache is limited by its number of entries.
+        """
+        return self.__getCacheSize('commitCacheSize')
+
+    def getDiskCacheSize(self):
+        """Get the disk budget of the index files of parsed graph files.
+
+        Returns:
+            The budget in bytes, 0 if the disk cache is disabled or None if it is not limited.
+        """
+        return self.__getCacheSize('diskCacheSize')
+
+    def getResultCacheSize(self):
+        """Get the memory budget of the cache for query results.
+
+        Returns:
+            The budget in bytes or None if query results are not cached.
+        """
+        return self.__getCacheSize('resultCacheSize')
+
+    def getResultCacheDir(self):
+        """Get the directory evicted query results are spilled to.
+
+        Returns:
+            A string containing the path or None if evicted results are dropped.
+        """
+        nsQuit = 'http://quit.aksw.org/vocab/'
+        property = URIRef(nsQuit + 'resultCacheDir')
+
+        for s, p, o in self.sysconf.triples((None, property, None)):
+            return str(o)
+
+        return None
+
+    def getResultCacheDirSize(self):
+        """Get the disk budget of the query results spilled to the result cache directory.
+
+        Returns:
+            The budget in bytes or None if the default of ten times the memory budget is used.
+        """
+        return self.__getCacheSize('resultCacheDirSize')
+
+    def __getCacheSize(self, name):
+        nsQuit = 'http://quit.aksw.org/vocab/'
+        property = URIRef(nsQuit + name)
+
+        for s, p, o in self.sysconf.triples((None, property, None)):
+            return parseSize(o)
+
+        return None
+
+    def getParsers(self):
+        """Get the number of processes which parse graph files concurrently.
+
+        Returns:
+            An integer, 1 if nothing is configured and 0 to use all available processors.
+        """
+        nsQuit = 'http://quit.aksw.org/vocab/'
+        property = URIRef(nsQuit + 'parsers')
+
+        for s, p, o in self.sysconf.triples((None, property, None)):
+            return self.__parsers(o)
+
+        return 1
+
+    def __parsers(self, value):
+        try:
+            parsers = int(value)
+        except ValueError:
+            parsers = -1
+        if parsers < 0:
+            raise InvalidConfigurationError(
+                'The number of parsers must be a non-negative integer, not {}'.format(value)
+            )
+        return parsers
+
     def getRepoPath(self):
         """Get the path of Git repository from configuration.
 
@@ -444,6 +598,20 @@ class QuitConfiguration:
 
         return
 
+    def isshardedfile(self, file):
+        """Check if a graph file is a directory of sharded graph files.
+
+        Args:
+            file: A String of a file path
+
+        Returns:
+            True, if the graph file is split into shards
+        """
+        if file in self.files:
+            return self.files[file].get('sharded', False)
+
+        return False
+
     def getgraphuriforfile(self, file):
         """Get the file for a given graph uri.
 
@@ -472,6 +640,11 @@ class QuitConfiguration:
         graphfiles = {}
         for dirpath, dirs, files in walk(path):
             dirs[:] = [d for d in dirs if d not in exclude]
+            for dirname in dirs:
+                if dirname.endswith('.d') and guess_format(dirname[:-2]) is not None:
+                    graphfiles[dirname] = guess_format(dirname[:-2])
+            # the shards of a sharded graph file are no graph files on their own
+            dirs[:] = [d for d in dirs if d not in graphfiles]
             for filename in files:
 
                 format = guess_format(join(dirpath, filename))
@@ -489,6 +662,57 @@ class QuitConfiguration:
 
         return
 
+    def setStoreMode(self, mode):
+        self.sysconf.remove((None, self.quit.storeMode, None))
+        self.sysconf.add((self.quit.Store, self.quit.storeMode, Literal(mode)))
+
+        return
+
+    def setBlobCacheSize(self, size):
+        self.sysconf.remove((None, self.quit.blobCacheSize, None))
+        self.sysconf.add((self.quit.Store, self.quit.blobCacheSize, Literal(parseSize(size))))
+
+        return
+
+    def setCommitCacheSize(self, size):
+        self.sysconf.remove((None, self.quit.commitCacheSize, None))
+        self.sysconf.add((self.quit.Store, self.quit.commitCacheSize, Literal(parseSize(size))))
+
+        return
+
+    def setDiskCacheSize(self, size):
+        self.sysconf.remove((None, self.quit.diskCacheSize, None))
+        self.sysconf.add((self.quit.Store, self.quit.diskCacheSize, Literal(parseSize(size))))
+
+        return
+
+    def setResultCacheSize(self, size):
+        self.sysconf.remove((None, self.quit.resultCacheSize, None))
+        self.sysconf.add((self.quit.Store, self.quit.resultCacheSize, Literal(parseSize(size))))
+
+        return
+
+    def setResultCacheDir(self, path):
+        self.sysconf.remove((None, self.quit.resultCacheDir, None))
+        self.sysconf.add((self.quit.Store, self.quit.resultCacheDir, Literal(path)))
+
+        return
+
+    def setResultCacheDirSize(self, size):
+        self.sysconf.remove((None, self.quit.resultCacheDirSize, None))
+        self.sysconf.add(
+            (self.quit.Store, self.quit.resultCacheDirSize, Literal(parseSize(size)))
+        )
+
+        return
+
+    def setParsers(self, parsers):
+        parsers = self.__parsers(parsers)
+        self.sysconf.remove((None, self.quit.parsers, None))
+        self.sysconf.add((self.quit.Store, self.quit.parsers, Literal(parsers)))
+
+        return
+
     def setGitOrigin(self, origin):
         self.sysconf.remove((None, self.quit.origin, None))
         self.sysconf.add((self.quit.Store, self.quit.origin, Literal(origin)))
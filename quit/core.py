@@ -1,6 +1,11 @@
 import pygit2
 
+import functools
+import hashlib
 import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
 
 from pygit2 import GIT_MERGE_ANALYSIS_UP_TO_DATE
 from pygit2 import GIT_MERGE_ANALYSIS_FASTFORWARD
@@ -12,9 +17,17 @@ from rdflib.plugins.serializers.nquads import _nq_row as _nq
 
 from quit.conf import Feature
 from quit.namespace import RDFS, FOAF, XSD, PROV, QUIT, is_a
-from quit.graphs import RewriteGraph, InMemoryAggregatedGraph
+from quit.graphs import RewriteGraph, InMemoryAggregatedGraph, InMemoryCopyOnEditAggregatedGraph
+from quit.graphs import CopyOnEditGraph, ShardedGraph, termFilter
 from quit.utils import graphdiff, git_timestamp
-from quit.cache import Cache, FileReference
+from quit.cache import BlobCache, BlobHistory, Cache, CommitIndex, ResultCache
+from quit.cache import FileReference, ShardedFileReference, unpack
+from quit.plugins.parsers.nquads import quads, UnusualLine
+from quit.plugins.stores.compactstore import CompactStore
+from quit.plugins.stores.indexstore import IndexStore, build
+from quit.plugins.stores.sqlitestore import SQLiteCommitIndex
+from quit.tools.evaluate import evalConstructTriples
+from quit.tools.statistics import Statistics
 
 import subprocess
 
@@ -56,6 +69,9 @@ class Store(Queryable):
     FileReference object (n-quad) that enables versioning (with git) and persistence.
     """
 
+    # Whether the content of the store survives a restart of the process
+    persistent = False
+
     def __init__(self, store):
         """Initialize a new Store instance."""
         self.store = store
@@ -74,6 +90,31 @@ class MemoryStore(Store):
         super().__init__(store=store)
 
 
+class PersistentStore(Store):
+    """A store which keeps its quads in an embedded database on the local file system.
+
+    The persistence contexts and the provenance graph survive a restart, thus only commits which
+    were not synchronized before have to be processed on startup.
+    """
+
+    persistent = True
+
+    def __init__(self, path, additional_bindings=list()):
+        store = ConjunctiveGraph(store='QuitSQLite', identifier='default')
+        store.open(path, create=True)
+        nsBindings = [('quit', QUIT), ('foaf', FOAF), ('prov', PROV)]
+
+        for prefix, namespace in nsBindings + additional_bindings:
+            store.bind(prefix, namespace)
+        store.commit()
+
+        super().__init__(store=store)
+
+    def commitIndex(self):
+        """Get the index of the commits which are synchronized into the database."""
+        return SQLiteCommitIndex(self.store.store)
+
+
 class VirtualGraph(Queryable):
     def __init__(self, store):
         if not isinstance(store, InMemoryAggregatedGraph):
@@ -86,6 +127,105 @@ class VirtualGraph(Queryable):
     def update(self, querystring):
         return self.store.update(querystring)
 
+    def construct(self, query):
+        """Generate the triples of a translated CONSTRUCT query one by one."""
+        return evalConstructTriples(self.store, query)
+
+
+def _quads(content):
+    """Parse the N-Quads content of a blob into (s, p, o, c) tuples without adding them to a store.
+
+    Lines without a graph label are put into a blank node graph like the default context of a
+    ConjunctiveGraph.
+    """
+    try:
+        return quads(content, BNode())
+    except UnusualLine:
+        graph = ConjunctiveGraph()
+        graph.parse(data=content, format='nquads')
+        return graph.quads((None, None, None, None))
+
+
+def _parseBlob(content):
+    """Parse the N-Quads content of a blob and return the packed quads of its index file."""
+    return build(_quads(content))
+
+
+def _commitSize(blobs):
+    """Estimate the memory used by the set of (path, oid) tuples of a commit."""
+    return sum(len(name) + 100 for name, oid in blobs)
+
+
+def _graphStores(graphs):
+    """Get the stores which keep the parsed triples of graphs, overlays only add their template."""
+    for graph in graphs:
+        if isinstance(graph, CopyOnEditGraph):
+            delta = graph.delta()
+            if delta is None or delta[0] is None:
+                continue
+            graph = delta[0]
+        if isinstance(graph, ShardedGraph):
+            yield from _graphStores(graph.shards)
+        elif isinstance(graph.store, CompactStore):
+            yield graph.store
+
+
+def _blobSize(value):
+    """Estimate the memory used by the FileReference and parsed contexts of a blob.
+
+    The parsed graphs count with the terms and indexes their stores keep in memory, the pages of
+    memory-mapped index files are left to the operating system.
+    """
+    file_reference, contexts = value
+    stores = {id(store): store for store in _graphStores(contexts)}
+    return file_reference.size + sum(store.size for store in stores.values())
+
+
+def _graphStatistics(graph):
+    """Get the Statistics of a parsed graph.
+
+    The statistics of graphs on an index file are read from the file, only graphs which were
+    edited since they were parsed are scanned.
+    """
+    if isinstance(graph, ShardedGraph):
+        return Statistics.combine(_graphStatistics(shard) for shard in graph.shards)
+    if type(graph) is Graph and isinstance(graph.store, IndexStore):
+        statistics = graph.store.statistics(graph.identifier)
+        if statistics is not None:
+            return statistics
+    return Statistics.fromGraphs([graph])
+
+
+class _AnyFilter:
+    """Tells whether a value may be in any of the BloomFilters of the shards of a graph."""
+
+    def __init__(self, filters):
+        self.size = sum(bloom.size for bloom in filters)
+        self._filters = filters
+
+    def __contains__(self, value):
+        return any(value in bloom for bloom in self._filters)
+
+
+def _storedFilter(graph):
+    """Get the BloomFilter of a parsed graph as saved in its index file or None."""
+    if isinstance(graph, ShardedGraph):
+        filters = [_storedFilter(shard) for shard in graph.shards]
+        return None if None in filters else _AnyFilter(filters)
+    if type(graph) is Graph and isinstance(graph.store, IndexStore):
+        return graph.store.termFilter(graph.identifier)
+    return None
+
+
+def _content(node):
+    """Get a function which reads the content of the blob of a node."""
+    return lambda: node.content
+
+
+def _filtersSize(filters):
+    """Get the memory used by the BloomFilters of the graphs of a blob."""
+    return sum(bloom.size // 8 for bloom in filters.values())
+
 
 class Quit(object):
     """Quit object which keeps the store syncronised with the repository."""
@@ -96,22 +236,107 @@ class Quit(object):
         self.config = config
         self.repository = repository
         self.store = store
-        self._commits = Cache()
-        self._blobs = Cache()
+        self._commits = Cache(
+            budget=config.getCommitCacheSize() if config else None, sizeof=_commitSize,
+            name='commit'
+        )
+        self._blobs = Cache(
+            budget=config.getBlobCacheSize() if config else None, sizeof=_blobSize, name='blob'
+        )
+        self._parsed = None
+        diskcache = config.getDiskCacheSize() if config else None
+        if repository and diskcache != 0:
+            self._parsed = BlobCache(repository.internal_path('blobs'), diskcache)
+        self._parsers = config.getParsers() if config else 1
+        self._pool = None
+        self._prefetched = {}
+        self._instances = Cache(
+            budget=config.getCommitCacheSize() if config else None, sizeof=_commitSize,
+            name='instance'
+        )
+        self._commitStatistics = Cache(name='commit statistics')
+        self._filters = Cache(
+            budget=config.getBlobCacheSize() if config else None, sizeof=_filtersSize,
+            name='filter'
+        )
+        self.results = None
+        if config and config.getResultCacheSize():
+            self.results = ResultCache(
+                config.getResultCacheSize(), config.getResultCacheDir(),
+                config.getResultCacheDirSize()
+            )
+        self._synced = self._commitIndex()
+        self._history = BlobHistory(
+            repository.internal_path('history') if repository else None,
+            self._fileMapFingerprint() if config else None
+        )
+        if repository and not self._history.valid and len(self._synced):
+            # the history of the synchronized commits is gone, thus they are synchronized again to
+            # index their changed blobs
+            self._synced.clear()
+
+    def close(self):
+        """Stop the processes which parse graph files."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def cacheStats(self):
+        """Get the counters of the caches of the store.
+
+        Returns:
+            A dictionary of the stats of each cache by its name
+        """
+        caches = [
+            self._commits, self._blobs, self._instances, self._commitStatistics, self._filters
+        ]
+        if self.results is not None:
+            caches.append(self.results)
+        return {cache.name: cache.stats for cache in caches}
+
+    def _commitIndex(self):
+        """Get the index of the commits which are synchronized into the store.
+
+        A persistent store keeps the index in its own database, thus the index is written in the
+        transaction of the synchronized quads and is gone together with the store. Otherwise the
+        index may only be persisted if no feature writes into the store at all, since a memory
+        store is empty after a restart.
+        """
+        if self.store is not None and self.store.persistent:
+            return self.store.commitIndex()
+
+        if self.config is None or self.repository is None:
+            return CommitIndex()
+
+        writesStore = (
+            self.config.hasFeature(Feature.Provenance) or
+            self.config.hasFeature(Feature.Persistence)
+        )
+        if writesStore:
+            return CommitIndex()
+
+        return CommitIndex(self.repository.internal_path('commits'))
+
+    @property
+    def syncedCommits(self):
+        """Get the number of commits which are synchronized into the store."""
+        return len(self._synced)
 
     def _exists(self, cid):
-        uri = QUIT['commit-' + cid]
-        for _ in self.store.store.quads((uri, None, None, QUIT.default)):
-            return True
-        return False
+        return cid in self._synced
 
     def rebuild(self):
-        for context in self.store.contexts():
-            self.store.remove((None, None, None), context)
+        for context in self.store.store.contexts():
+            self.store.store.remove((None, None, None), context)
+        self._synced.clear()
         self.syncAll()
 
     def syncAll(self):
-        """Synchronize store with repository data."""
+        """Synchronize store with repository data.
+
+        Only the history behind references which moved since the last synchronization is walked,
+        the walk stops at every commit already contained in the commit index.
+        """
         def traverse(commit, seen):
             commits = []
             merges = []
@@ -139,55 +364,162 @@ class Quit(object):
 
         for name in self.repository.tags_or_branches:
             initial_commit = self.repository.revision(name)
+
+            if self._synced.ref(name) == initial_commit.id and self._exists(initial_commit.id):
+                continue
+
             commits = traverse(initial_commit, seen)
 
             while commits:
                 commit = commits.pop()
                 self.syncSingle(commit)
 
+            self._synced.set_ref(name, initial_commit.id)
+            self.store.store.commit()
+
     def syncSingle(self, commit, delta=None):
         if not self._exists(commit.id):
-            self.changeset(commit, delta)
+            self.getBlobChanges(commit)
+            try:
+                self.changeset(commit, delta)
+                # the index of a persistent store is committed together with the quads
+                self._synced.add(commit.id)
+            except Exception:
+                self.store.store.rollback()
+                raise
+            self.store.store.commit()
 
     def instance(self, commit_id=None, force=False):
         """Create and return dataset for a given commit id.
 
         Args:
-            id: commit id of the commit to retrieve
+            commit_id: commit id or reference of the commit to retrieve or its resolved Revision
             force: force to get the dataset from the git repository instead of the internal cache
         Returns:
             Instance of VirtualGraph representing the respective dataset
         """
 
-        default_graphs = []
+        default_graphs = filters = ()
 
         if commit_id:
-            commit = self.repository.revision(commit_id)
-
-            for blob in self.getFilesForCommit(commit):
+            commit = commit_id
+            if isinstance(commit_id, str):
+                commit = self.repository.revision(commit_id)
+            if force:
+                default_graphs, filters = self._graphsForCommit(commit, force)
+            else:
+                # a commit identifies an immutable dataset, thus its prepared files are reused by
+                # every request for the same commit, while the graphs are only held by the blob
+                # cache and are released together with its entries
                 try:
-                    (name, oid) = blob
-                    f, contexts = self.getFileReferenceAndContext(blob, commit)
-                    for context in contexts:
-                        internal_identifier = context.identifier + '-' + str(oid)
-
-                        if force or not self.config.hasFeature(Feature.Persistence):
-                            g = context
-                        else:
-                            g = RewriteGraph(
-                                self.store.store.store,
-                                internal_identifier,
-                                context.identifier
-                            )
-                        default_graphs.append(g)
+                    blobs = self._instances.get(commit.id)
                 except KeyError:
-                    pass
-
-        instance = InMemoryAggregatedGraph(
-            graphs=default_graphs, identifier='default')
+                    blobs = None
+                if blobs is not None:
+                    default_graphs, filters = self._graphsForBlobs(commit, blobs)
+                else:
+                    default_graphs, filters = self._graphsForCommit(commit)
+                    self._instances.set(commit.id, self.getFilesForCommit(commit))
+
+        instance = InMemoryCopyOnEditAggregatedGraph(
+            graphs=list(default_graphs), identifier='default',
+            statistics=functools.partial(self.getStatistics, commit) if commit_id else None,
+            filters=list(filters)
+        )
 
         return VirtualGraph(instance)
 
+    def _graphsForCommit(self, commit, force=False):
+        """Get the graphs of the dataset of a commit.
+
+        Returns:
+            A tuple of the graphs and a tuple of functions which return the BloomFilter of the
+            graph at the same position
+        """
+        blobs = self.getFilesForCommit(commit)
+        self._parseAll(commit, blobs)
+        return self._graphsForBlobs(commit, blobs, force)
+
+    def _graphsForBlobs(self, commit, blobs, force=False):
+        """Get the graphs of the given blobs of a commit as returned by _graphsForCommit."""
+        default_graphs = []
+        filters = []
+
+        for blob in blobs:
+            try:
+                (name, oid) = blob
+                f, contexts = self.getFileReferenceAndContext(blob, commit)
+                contexts = sorted(contexts, key=lambda context: context.identifier)
+                for index, context in enumerate(contexts):
+                    internal_identifier = QUIT["graph-{}-{}".format(oid, index)]
+
+                    if force or not self.config.hasFeature(Feature.Persistence):
+                        g = context
+                    else:
+                        g = RewriteGraph(
+                            self.store.store.store,
+                            internal_identifier,
+                            context.identifier
+                        )
+                    default_graphs.append(g)
+                    filters.append(functools.partial(self.getTermFilter, oid, context))
+            except KeyError:
+                pass
+
+        return tuple(default_graphs), tuple(filters)
+
+    def getTermFilter(self, oid, graph):
+        """Get the BloomFilter of the terms of a graph of a blob.
+
+        The filters of graphs on an index file are read from the file. The filters of graphs
+        which were edited since they were parsed are computed once and shared by all commits
+        which contain the blob.
+        """
+        bloom = _storedFilter(graph)
+        if bloom is not None:
+            return bloom
+        try:
+            filters = self._filters.get(oid)
+        except KeyError:
+            filters = {}
+        try:
+            return filters[graph.identifier]
+        except KeyError:
+            filters = dict(filters)
+            filters[graph.identifier] = termFilter(graph)
+            self._filters.set(oid, filters)
+            return filters[graph.identifier]
+
+    def getStatistics(self, commit):
+        """Get the statistics of the graphs of a commit.
+
+        The statistics of the graphs of a blob are read from its index file and combined for all
+        blobs which contain the same graph. The combined statistics are kept for each commit.
+
+        Returns:
+            A dictionary of the Statistics for each graph identifier
+        """
+        try:
+            return self._commitStatistics.get(commit.id)
+        except KeyError:
+            pass
+
+        statistics = {}
+        for blob in self.getFilesForCommit(commit):
+            try:
+                f, contexts = self.getFileReferenceAndContext(blob, commit)
+            except KeyError:
+                continue
+            for context in contexts:
+                statistics.setdefault(context.identifier, []).append(_graphStatistics(context))
+
+        statistics = {
+            identifier: Statistics.combine(graphStatistics)
+            for identifier, graphStatistics in statistics.items()
+        }
+        self._commitStatistics.set(commit.id, statistics)
+        return statistics
+
     def changeset(self, commit, delta=None):
 
         if (
@@ -277,9 +609,12 @@ class Quit(object):
             if not delta:
                 parent = next(iter(commit.parents or []), None)
 
-                i2 = self.instance(parent.id, True) if parent else None
+                delta = self._linediff(parent, commit) if parent else None
+
+                if delta is None:
+                    i2 = self.instance(parent.id, True) if parent else None
 
-                delta = graphdiff(i2.store if i2 else None, i1.store)
+                    delta = graphdiff(i2.store if i2 else None, i1.store)
 
             for index, (iri, changesets) in enumerate(delta.items()):
                 update_uri = QUIT['update-{}-{}'.format(commit.id, index)]
@@ -293,65 +628,113 @@ class Quit(object):
         # Entities
         map = self.config.getgraphurifilemap()
 
-        for entity in commit.node().entries(recursive=True):
-            # todo check if file was changed
-            if entity.is_file:
+        # blobs which did not change since the parent commit are already described by the
+        # entities and contexts created for an earlier commit
+        changes = self.getBlobChanges(commit)
 
-                if entity.name not in map.values():
-                    continue
-
-                graphUris = self.config.getgraphuriforfile(entity.name)
-                graphsFromConfig = set((Graph(identifier=i) for i in graphUris))
+        for blob in sorted(self.getFilesForCommit(commit)):
+            (name, oid) = blob
+            if name not in changes:
+                continue
+            prev = changes[name][1]
+
+            f, contexts = self.getFileReferenceAndContext(blob, commit)
+
+            # the index is part of the persisted identifier, thus the order has to be stable
+            contexts = sorted(contexts, key=lambda context: context.identifier)
+            for index, context in enumerate(contexts):
+                private_uri = QUIT["graph-{}-{}".format(oid, index)]
+
+                if (
+                    self.config.hasFeature(Feature.Provenance) or
+                    self.config.hasFeature(Feature.Persistence)
+                ):
+                    g.add((private_uri, is_a, PROV['Entity']))
+                    g.add(
+                        (private_uri, PROV['specializationOf'], context.identifier))
+                    g.add(
+                        (private_uri, PROV['wasGeneratedBy'], commit_uri))
+
+                    q_usage = BNode()
+                    g.add((private_uri, PROV['qualifiedGeneration'], q_usage))
+                    g.add((q_usage, is_a, PROV['Generation']))
+                    g.add((q_usage, PROV['activity'], commit_uri))
+
+                    if prev:
+                        prev_uri = QUIT["graph-{}-{}".format(prev, index)]
+                        g.add((private_uri, PROV['wasDerivedFrom'], prev_uri))
+                        g.add((commit_uri, PROV['used'], prev_uri))
+
+                        q_derivation = BNode()
+                        g.add((private_uri, PROV['qualifiedDerivation'], q_derivation))
+                        g.add((q_derivation, is_a, PROV['Derivation']))
+                        g.add((q_derivation, PROV['entity'], prev_uri))
+                        g.add((q_derivation, PROV['hadActivity'], commit_uri))
+                if self.config.hasFeature(Feature.Persistence):
+                    g.addN((s, p, o, private_uri) for s, p, o
+                           in context.triples((None, None, None)))
+
+    def _linediff(self, parent, commit):
+        """Get the changes of the graphs between two commits from the diff of their files.
+
+        Since the files are written as canonical N-Quads the added and removed lines of the
+        files correspond to the added and removed triples. Only for triples with blank nodes the
+        graphs of both revisions have to be compared with help of their isomorphism.
 
-                blob = (entity.name, entity.oid)
+        Returns:
+            A dictionary of graph identifiers and their changesets or None if the files contain
+            lines which can not be compared on the line level
+        """
+        from rdflib.compare import to_isomorphic, graph_diff
 
+        map = self.config.getgraphurifilemap()
+        files = set(map.values())
+        additions = {}
+        removals = {}
+        bnodes = set()
+
+        for path, lines in commit.diff(parent).items():
+            if path not in files and not self.config.isshardedfile(os.path.dirname(path)):
+                continue
+            for changes, target in zip(lines, (additions, removals)):
                 try:
-                    f, contexts = self.getFileReferenceAndContext(blob, commit)
-                except KeyError:
-                    tmp = ConjunctiveGraph()
-                    tmp.parse(data=entity.content, format='nquads')
-
-                    # Info: currently filter graphs from file that were not defined in config
-                    # Todo: is this the wanted behaviour?
-                    contexts = set((context for context in tmp.contexts(None)
-                                    if context.identifier in map)) | graphsFromConfig
-
-                    self._blobs.set(
-                        blob, (FileReference(entity.name, entity.content), contexts)
-                    )
-
-                for index, context in enumerate(contexts):
-                    private_uri = QUIT["graph-{}-{}".format(entity.oid, index)]
-
-                    if (
-                        self.config.hasFeature(Feature.Provenance) or
-                        self.config.hasFeature(Feature.Persistence)
-                    ):
-                        g.add((private_uri, is_a, PROV['Entity']))
-                        g.add(
-                            (private_uri, PROV['specializationOf'], context.identifier))
-                        g.add(
-                            (private_uri, PROV['wasGeneratedBy'], commit_uri))
-
-                        q_usage = BNode()
-                        g.add((private_uri, PROV['qualifiedGeneration'], q_usage))
-                        g.add((q_usage, is_a, PROV['Generation']))
-                        g.add((q_usage, PROV['activity'], commit_uri))
-
-                        prev = next(entity.history(), None)
-                        if prev:
-                            prev_uri = QUIT["graph-{}-{}".format(prev.oid, index)]
-                            g.add((private_uri, PROV['wasDerivedFrom'], prev_uri))
-                            g.add((commit_uri, PROV['used'], prev_uri))
-
-                            q_derivation = BNode()
-                            g.add((private_uri, PROV['qualifiedDerivation'], q_derivation))
-                            g.add((q_derivation, is_a, PROV['Derivation']))
-                            g.add((q_derivation, PROV['entity'], prev_uri))
-                            g.add((q_derivation, PROV['hadActivity'], commit_uri))
-                    if self.config.hasFeature(Feature.Persistence):
-                        g.addN((s, p, o, private_uri) for s, p, o
-                               in context.triples((None, None, None)))
+                    parsed = quads('\n'.join(changes))
+                except UnusualLine:
+                    return None
+                for s, p, o, c in parsed:
+                    if c not in map:
+                        continue
+                    if isinstance(s, BNode) or isinstance(o, BNode):
+                        bnodes.add(c)
+                    else:
+                        target.setdefault(c, set()).add((s, p, o))
+
+        if bnodes:
+            def _bnodeGraph(graph):
+                result = Graph()
+                result.addN((s, p, o, result) for s, p, o in graph
+                            if isinstance(s, BNode) or isinstance(o, BNode))
+                return to_isomorphic(result)
+
+            i1 = self.instance(commit.id, True).store
+            i2 = self.instance(parent.id, True).store
+            for iri in bnodes:
+                in_both, in_first, in_second = graph_diff(
+                    _bnodeGraph(i2.get_context(iri)), _bnodeGraph(i1.get_context(iri))
+                )
+                additions.setdefault(iri, set()).update(in_second)
+                removals.setdefault(iri, set()).update(in_first)
+
+        delta = {}
+        for iri in sorted(set(additions) | set(removals)):
+            added = additions.get(iri, set())
+            removed = removals.get(iri, set())
+            # a triple may have moved between files of the same graph
+            changes = [('additions', added - removed), ('removals', removed - added)]
+            changes = [(op, triples) for op, triples in changes if triples]
+            if changes:
+                delta[iri] = changes
+        return delta
 
     def getFilesForCommit(self, commit):
         """Get all entry, oid tupples for a commit.
@@ -360,40 +743,148 @@ class Quit(object):
         """
         uriFileMap = self.config.getgraphurifilemap()
 
-        if commit.id not in self._commits:
+        try:
+            return self._commits.get(commit.id)
+        except KeyError:
             blobs = set()
             for entity in commit.node().entries(recursive=True):
-                if entity.is_file:
+                if entity.is_file or self.config.isshardedfile(entity.name):
                     if entity.name not in uriFileMap.values():
                         continue
                     blob = (entity.name, entity.oid)
                     blobs.add(blob)
             self._commits.set(commit.id, blobs)
             return blobs
-        return self._commits.get(commit.id)
+
+    def _fileMapFingerprint(self):
+        """Get a fingerprint of the mapping of graph files which decides the files of a commit."""
+        files = sorted(set(self.config.getgraphurifilemap().values()))
+        mapping = '\n'.join(
+            '{}\t{}'.format(name, self.config.isshardedfile(name)) for name in files
+        )
+        return hashlib.sha1(mapping.encode('utf-8')).hexdigest()
+
+    def getBlobChanges(self, commit):
+        """Get the graph files of a commit whose blob differs from the first parent.
+
+        The changes are looked up in the blob history index and added to it on a miss.
+
+        Returns:
+            A dictionary of file names and (oid, previous oid) tuples, the previous oid is None
+            for files which did not exist in the parent commit
+        """
+        changes = self._history.changes(commit.id)
+        if changes is not None:
+            return changes
+
+        parent = next(iter(commit.parents or []), None)
+        previous = dict(self.getFilesForCommit(parent)) if parent else {}
+        self._history.add(commit.id, [
+            (name, oid, previous.get(name)) for name, oid in sorted(self.getFilesForCommit(commit))
+            if previous.get(name) != oid
+        ])
+        return self._history.changes(commit.id)
+
+    def getCommitsForFile(self, name):
+        """Get the ids of the synchronized commits which changed a graph file."""
+        return self._history.commits(name)
+
+    def _parseAll(self, commit, blobs):
+        """Parse the blobs of a commit which are not cached yet concurrently in a process pool.
+
+        The packed results are written to the disk cache or, without a disk cache, kept until
+        _parse is called for the respective blob.
+        """
+        if self._parsers == 1:
+            return
+
+        missing = {}
+        for blob in blobs:
+            if blob in self._blobs:
+                continue
+            node = commit.node(path=blob[0])
+            nodes = [entry for entry in node.entries() if entry.is_file] if node.is_dir else [node]
+            for node in nodes:
+                if self._parsed is not None and node.oid in self._parsed:
+                    continue
+                missing[node.oid] = node
+
+        if len(missing) < 2:
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self._parsers or None)
+
+        oids = list(missing.keys())
+        contents = (missing[oid].content for oid in oids)
+        for oid, data in zip(oids, self._pool.map(_parseBlob, contents)):
+            if self._parsed is not None:
+                self._parsed.write(oid, data)
+            else:
+                self._prefetched[oid] = data
+
+    def _parse(self, node):
+        """Get the graph of a blob, reading its content only if it is not on the disk cache.
+
+        The parsed quads are packed into an index file right away, thus the terms of a blob are
+        only kept by the IndexStore on the memory-mapped file or, without a disk cache, on the
+        packed data.
+        """
+        oid = node.oid
+        data = self._prefetched.pop(oid, None)
+        if data is None:
+            if self._parsed is not None:
+                graph = self._parsed.get(oid)
+                if graph is not None:
+                    return graph
+
+            data = _parseBlob(node.content)
+            if self._parsed is not None:
+                self._parsed.write(oid, data)
+                graph = self._parsed.get(oid)
+                if graph is not None:
+                    return graph
+        return unpack(data)
 
     def getFileReferenceAndContext(self, blob, commit):
         """Get the FielReference and Context for a given blob (name, oid) of a commit.
 
-        On Cache miss this method also updates teh commits cache.
+        On Cache miss this method also updates teh commits cache. The content of the file is only
+        read by the FileReference once the file is edited.
         """
         uriFileMap = self.config.getgraphurifilemap()
 
-        if blob not in self._blobs:
+        try:
+            return self._blobs.get(blob)
+        except KeyError:
             (name, oid) = blob
-            content = commit.node(path=name).content
-            # content = self.repository._repository[oid].data
+            node = commit.node(path=name)
             graphUris = self.config.getgraphuriforfile(name)
             graphsFromConfig = set((Graph(identifier=i) for i in graphUris))
-            tmp = ConjunctiveGraph()
-            tmp.parse(data=content, format='nquads')
-            contexts = set((context for context in tmp.contexts(None)
+            if node.is_dir:
+                shards = [entry for entry in node.entries() if entry.is_file]
+                # a graph may be split over several shards, whose graphs are read as they are
+                shardContexts = {}
+                for shard in shards:
+                    for context in self._parse(shard).contexts(None):
+                        shardContexts.setdefault(context.identifier, []).append(context)
+                contexts = [
+                    graphs[0] if len(graphs) == 1 else ShardedGraph(identifier, graphs)
+                    for identifier, graphs in shardContexts.items()
+                ]
+                file_reference = ShardedFileReference(
+                    name, {shard.basename: _content(shard) for shard in shards},
+                    {shard.basename: shard.content_length for shard in shards}
+                )
+            else:
+                contexts = self._parse(node).contexts(None)
+                file_reference = FileReference(name, _content(node), node.content_length)
+            contexts = set((context for context in contexts
                             if context.identifier in uriFileMap)) | graphsFromConfig
-            quitWorkingData = (FileReference(name, content), contexts)
+            quitWorkingData = (file_reference, contexts)
             self._blobs.set(
                 blob, quitWorkingData)
             return quitWorkingData
-        return self._blobs.get(blob)
 
     def commit(self, graph, delta, message, commit_id, ref, **kwargs):
         def build_message(message, kwargs):
@@ -422,6 +913,12 @@ class Quit(object):
         if not delta:
             return
 
+        # the entries of delta get consumed while applying them to the files
+        changes = {}
+        for entry in delta:
+            for identifier, changeset in entry.items():
+                changes.setdefault(identifier, []).extend(changeset)
+
         commit = self.repository.revision(commit_id)
         index = self.repository.index(commit.id)
 
@@ -431,10 +928,14 @@ class Quit(object):
         except KeyError:
             blobs = []
 
+        # the oid of the directory of a sharded file is only known after the commit
+        sharded = {}
+
         for blob in blobs:
             (fileName, oid) = blob
             try:
                 file_reference, contexts = self.getFileReferenceAndContext(blob, commit)
+                edited = set()
                 for context in contexts:
                     for entry in delta:
                         changeset = entry.get(context.identifier, None)
@@ -442,16 +943,48 @@ class Quit(object):
                         if changeset:
                             _apply(file_reference, changeset, context.identifier)
                             del(entry[context.identifier])
+                            edited.add(context.identifier)
+
+                # the file of an unchanged blob is neither read nor written again
+                if not edited:
+                    blobs_new.add(blob)
+                    continue
+
+                # the edits are kept in the overlays of the graph while the contexts of the
+                # parent commit stay unchanged
+                contexts = set(
+                    graph.store.get_context(context.identifier)
+                    if context.identifier in edited else context for context in contexts
+                )
 
-                index.add(file_reference.path, file_reference.content)
+                for path, content in file_reference.files():
+                    index.add(path, content)
 
                 self._blobs.remove(blob)
+                if isinstance(file_reference, ShardedFileReference):
+                    sharded[fileName] = (file_reference, contexts)
+                    continue
                 blob = fileName, index.stash[file_reference.path][0]
                 self._blobs.set(blob, (file_reference, contexts))
                 blobs_new.add(blob)
             except KeyError:
                 pass
 
+        # sharded files which do not exist yet are created, since git does not track the empty
+        # directory of a new sharded file
+        for entry in delta:
+            for identifier in list(entry.keys()):
+                fileName = self.config.getfileforgraphuri(identifier)
+                if not fileName or not self.config.isshardedfile(fileName):
+                    continue
+                if fileName not in sharded:
+                    sharded[fileName] = (ShardedFileReference(fileName), set())
+                file_reference, contexts = sharded[fileName]
+                contexts.add(graph.store.get_context(identifier))
+                _apply(file_reference, entry.pop(identifier), identifier)
+                for path, content in file_reference.files():
+                    index.add(path, content)
+
         unassigned = set()
         f_name = self.config.getGlobalFile() or 'unassigned.nq'
         f_new = FileReference(f_name, "")
@@ -460,11 +993,12 @@ class Quit(object):
                 unassigned.add(graph.store.get_context(identifier))
                 _apply(f_new, changeset, graph.store.identifier)
 
-                index.add(f_new.path, f_new.content)
+        if unassigned:
+            index.add(f_new.path, f_new.content)
 
-                blob = f_name, index.stash[f_new.path][0]
-                self._blobs.set(blob, (f_new, unassigned))
-                blobs_new.add(blob)
+            blob = f_name, index.stash[f_new.path][0]
+            self._blobs.set(blob, (f_new, unassigned))
+            blobs_new.add(blob)
 
         message = build_message(message, kwargs)
         author = self.repository._repository.default_signature
@@ -475,12 +1009,17 @@ class Quit(object):
             self.garbagecollection()
 
         if oid:
-            self._commits.set(oid.hex, blobs_new)
             commit = self.repository.revision(oid.hex)
+            for fileName, (file_reference, contexts) in sharded.items():
+                file_reference.reset()
+                blob = fileName, commit.node(path=fileName).oid
+                self._blobs.set(blob, (file_reference, contexts))
+                blobs_new.add(blob)
+            self._commits.set(oid.hex, blobs_new)
             if not self.repository.is_bare:
                 self.repository._repository.checkout(
                     ref, strategy=pygit2.GIT_CHECKOUT_FORCE)
-            self.syncSingle(commit, delta)
+            self.syncSingle(commit, changes)
 
     def garbagecollection(self):
         """Start garbage collection.
@@ -88,6 +88,10 @@ class Repository(object):
             logger.info('Git garbage collection could not be configured and was disabled')
             logger.debug(e)
 
+    def internal_path(self, *parts):
+        """Get a path below the git directory reserved for internal data of the QuitStore."""
+        return os.path.join(self._repository.path, 'quit', *parts)
+
     @property
     def is_empty(self):
         return self._repository.is_empty
@@ -452,6 +456,27 @@ class Revision(object):
     def node(self, path=None):
         return Node(self._repository, self._commit, path)
 
+    def diff(self, other):
+        """Get the lines which were added and removed in the files since another revision.
+
+        Args:
+            other: The Revision to compare with, usually a parent of this revision.
+        Returns:
+            A dictionary of file paths and tuples of the lists of added and removed lines.
+        """
+        changes = {}
+        diff = other._commit.tree.diff_to_tree(self._commit.tree, context_lines=0)
+        for patch in diff:
+            for hunk in patch.hunks:
+                for line in hunk.lines:
+                    if line.origin == '+':
+                        path = patch.delta.new_file.path
+                        changes.setdefault(path, ([], []))[0].append(line.content.rstrip('\n'))
+                    elif line.origin == '-':
+                        path = patch.delta.old_file.path
+                        changes.setdefault(path, ([], []))[1].append(line.content.rstrip('\n'))
+        return changes
+
 
 class Node(object):
 
@@ -4,6 +4,25 @@ from itertools import chain
 from rdflib import Graph, ConjunctiveGraph, URIRef
 from rdflib.graph import ModificationException
 from rdflib.graph import Path
+from quit.plugins.stores.indexstore import BloomFilter, termHash
+from quit.tools.statistics import Statistics
+
+
+def termHashes(triple):
+    """Get the hashes of the bound terms of a triple pattern together with their positions.
+
+    The hashes are the values of the BloomFilter of a graph as built by termFilter or saved in
+    the index file of the graph.
+    """
+    return [termHash(position, term) for position, term in enumerate(triple)
+            if term is not None and not isinstance(term, Path)]
+
+
+def termFilter(graph):
+    """Build a BloomFilter of the subjects, predicates and objects of the triples of a graph."""
+    return BloomFilter(
+        value for triple in graph.triples((None, None, None)) for value in termHashes(triple)
+    )
 
 
 class RewriteGraph(Graph):
@@ -42,12 +61,65 @@ class RewriteGraph(Graph):
         return len(self.__graph)
 
 
-def _copyIfNotExists(store, self, other):
-    if other and self not in store.contexts(None):
-        store.addN((s, p, o, self) for s, p, o in other.triples((None, None, None)))
+class ShardedGraph(Graph):
+    """A read-only graph whose triples are kept in the graphs of the shards of a sharded file.
+
+    The shards split the triples by their subject, thus each triple is found in one shard only
+    and the graphs of the shards are read as they are instead of copying them into one store.
+    """
+
+    def __init__(self, identifier, shards, namespace_manager=None):
+        super().__init__(identifier=identifier, namespace_manager=namespace_manager)
+        self._shards = shards
+
+    @property
+    def shards(self):
+        return list(self._shards)
+
+    def triples(self, triple):
+        s, p, o = triple
+        if isinstance(p, Path):
+            for _s, _o in p.eval(self, s, o):
+                yield _s, p, _o
+            return
+
+        for shard in self._shards:
+            for t in shard.triples(triple):
+                yield t
+
+    def __contains__(self, triple):
+        return any(triple in shard for shard in self._shards)
+
+    def add(self, triple_or_quad):
+        raise ModificationException()
+
+    def addN(self, triple_or_quad):
+        raise ModificationException()
+
+    def remove(self, triple_or_quad):
+        raise ModificationException()
+
+    def __iadd__(self, other):
+        raise ModificationException()
+
+    def __isub__(self, other):
+        raise ModificationException()
+
+    def parse(self, source, publicID=None, format="xml", **args):
+        raise ModificationException()
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
 
 
 class CopyOnEditGraph(Graph):
+    """A graph which keeps its changes in an overlay on top of an immutable template graph.
+
+    Added and removed triples are kept in two sets, thus the cost of an edit depends on the size
+    of the change and not on the size of the template. The triples are only copied into the store
+    if the store of the graph is accessed directly.
+    """
+
     def __init__(self, template, store='default', identifier=None, namespace_manager=None):
         super().__init__(store, identifier, namespace_manager)
 
@@ -57,35 +129,102 @@ class CopyOnEditGraph(Graph):
 
         self._template = template
         self._store = store
+        self._added = set()
+        self._removed = set()
+        # whether the triples of the graph live in the store instead of the overlay
+        self._copied = self in super().store.contexts(None)
+
+    def _copy(self):
+        if self._copied:
+            return
+        triples = list(self.triples((None, None, None)))
+        self._copied = True
+        self._added.clear()
+        self._removed.clear()
+        super().addN((s, p, o, self) for s, p, o in triples)
+
+    def _inTemplate(self, triple):
+        return self._template is not None and triple in self._template
 
     def add(self, triple_or_quad):
-        _copyIfNotExists(self._store, self, self._template)
-        super().add(triple_or_quad)
+        if self._copied:
+            return super().add(triple_or_quad)
+
+        triple = tuple(triple_or_quad)
+        if triple in self._removed:
+            self._removed.discard(triple)
+        elif not self._inTemplate(triple):
+            self._added.add(triple)
 
     def addN(self, triple_or_quad):
-        _copyIfNotExists(self._store, self, self._template)
-        super().addN(triple_or_quad)
+        if self._copied:
+            return super().addN(triple_or_quad)
+
+        for s, p, o, c in triple_or_quad:
+            if isinstance(c, Graph) and c.identifier == self.identifier:
+                self.add((s, p, o))
 
     def remove(self, triple_or_quad):
-        _copyIfNotExists(self._store, self, self._template)
-        super().remove(triple_or_quad)
+        if self._copied:
+            return super().remove(triple_or_quad)
+
+        for triple in list(self.triples(triple_or_quad)):
+            if triple in self._added:
+                self._added.discard(triple)
+            else:
+                self._removed.add(triple)
 
     def triples(self, triple):
-        if self not in self._store.contexts(None):
-            return self._template.triples(triple) if self._template else (_ for _ in ())
-        else:
+        if self._copied:
             return super().triples(triple)
+        return self._triples(triple)
+
+    def _triples(self, triple):
+        s, p, o = triple
+        if isinstance(p, Path):
+            for _s, _o in p.eval(self, s, o):
+                yield _s, p, _o
+            return
+
+        if self._template is not None:
+            removed = self._removed
+            for t in self._template.triples(triple):
+                if not removed or t not in removed:
+                    yield t
+
+        for t in list(self._added):
+            if (s is None or s == t[0]) and (p is None or p == t[1]) and (o is None or o == t[2]):
+                yield t
+
+    def __contains__(self, triple):
+        if self._copied or None in triple:
+            return super().__contains__(triple)
+
+        triple = tuple(triple)
+        if triple in self._added:
+            return True
+        return triple not in self._removed and self._inTemplate(triple)
 
     @property
     def store(self):
-        if self not in self._store.contexts(None):
-            return self._template.store
-        else:
-            return super().store
+        if not self._copied and not self._added and not self._removed:
+            return self._template.store if self._template is not None else super().store
+        self._copy()
+        return super().store
 
     def unwrap(self):
         return Graph(store=self.store, identifier=self.identifier)
 
+    def delta(self):
+        """Get the template and the changes kept in the overlay.
+
+        Returns:
+            A (template, added, removed) tuple or None if the triples live in the store
+        """
+        if self._copied:
+            return None
+        return self._template, self._added, self._removed
+
     def __isub__(self, other):
         """Subtract all triples in Graph other from Graph.
 
@@ -96,19 +235,70 @@ class CopyOnEditGraph(Graph):
         return self
 
     def __len__(self):
-        if self not in self._store.contexts(None):
-            return self._template.__len__()
-        else:
+        if self._copied:
             return super().__len__()
+        size = len(self._template) if self._template is not None else 0
+        return size - len(self._removed) + len(self._added)
 
 
 class InMemoryAggregatedGraph(ConjunctiveGraph):
-    def __init__(self, store='default', identifier=None, graphs=[]):
+    """A dataset which aggregates a list of immutable graphs.
+
+    If filters are given, a graph is only searched for a triple pattern if its BloomFilter may
+    contain the bound terms of the pattern.
+
+    Args:
+        graphs: A list of Graphs
+        statistics: A function which returns a dictionary of the Statistics for each identifier
+        filters: A list of functions which return the BloomFilter of the graph at the same position
+            as built by termFilter or None
+    """
+
+    def __init__(
+        self, store='default', identifier=None, graphs=[], statistics=None, filters=None
+    ):
         super().__init__(store=store, identifier=None)
 
         if not (isinstance(graphs, list) and all(isinstance(g, Graph) for g in graphs)):
             raise Exception("graphs argument must be a list of Graphs!!")
         self._contexts = graphs
+        self._identifiers = {}
+        self._names = {}
+        for graph in graphs:
+            self._identifiers.setdefault(graph.identifier, graph)
+            self._names.setdefault(str(graph.identifier), graph)
+        self._getStatistics = statistics
+        self._statistics = None
+        # the graphs are kept by the aggregated graph, thus their ids are unique while it lives
+        self._getFilters = dict(zip(map(id, graphs), filters or ()))
+        self._filters = {}
+
+    def statistics(self, identifier=None):
+        """Get the Statistics of an aggregated graph.
+
+        Args:
+            identifier: The identifier of a graph or None for all graphs
+        Returns:
+            The Statistics or None if there are no statistics for the graph
+        """
+        if self._statistics is None:
+            if self._getStatistics is None:
+                return None
+            self._statistics = dict(self._getStatistics())
+            self._statistics[None] = Statistics.combine(self._statistics.values())
+        return self._statistics.get(identifier)
+
+    def _mayContain(self, graph, hashes):
+        """Check whether a graph may contain triples with the terms given by termHashes."""
+        if not hashes:
+            return True
+        key = id(graph)
+        try:
+            bloom = self._filters[key]
+        except KeyError:
+            getFilter = self._getFilters.get(key)
+            bloom = self._filters[key] = getFilter() if getFilter is not None else None
+        return bloom is None or all(value in bloom for value in hashes)
 
     def __repr__(self):
         return "<{}: {}|{} graphs>".format(
@@ -131,8 +321,9 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
             if triple is None or triple is (None, None, None):
                 contexts = (context for context in self._contexts)
             else:
+                hashes = termHashes(triple)
                 contexts = (context for context in self._contexts
-                            if triple in context)
+                            if self._mayContain(context, hashes) and triple in context)
 
             seen = set()
             for element in chain(self.store.contexts(triple), contexts):
@@ -153,27 +344,32 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
             for s, o in p.eval(self, s, o):
                 yield s, p, o
         else:
+            hashes = termHashes((s, p, o))
             for graph in self.contexts():
                 if context is None or graph.identifier == context.identifier:
-                    for s, p, o in graph.triples((s, p, o)):
-                        yield s, p, o
+                    if self._mayContain(graph, hashes):
+                        for s, p, o in graph.triples((s, p, o)):
+                            yield s, p, o
 
     def quads(self, triple_or_quad=None):
         s, p, o, c = self._spoc(triple_or_quad)
         context = self._graph(c)
+        hashes = termHashes((s, p, o))
 
         for graph in self.graphs():
             if context is None or graph.identifier == context.identifier:
-                for s1, p1, o1 in graph.triples((s, p, o)):
-                    yield (s1, p1, o1, graph)
+                if self._mayContain(graph, hashes):
+                    for s1, p1, o1 in graph.triples((s, p, o)):
+                        yield (s1, p1, o1, graph)
 
     def __contains__(self, triple_or_quad):
         (_, _, _, context) = self._spoc(triple_or_quad)
         context = self._graph(context)
+        hashes = termHashes(triple_or_quad[:3])
 
         for graph in self.graphs():
             if context is None or graph.identifier == context.identifier:
-                if triple_or_quad[:3] in graph:
+                if self._mayContain(graph, hashes) and triple_or_quad[:3] in graph:
                     return True
         return False
 
@@ -189,9 +385,9 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
             Graph if found, else None
         """
         if isinstance(identifier, URIRef):
-            return next((x for x in self._contexts if x.identifier == identifier), None)
+            return self._identifiers.get(identifier)
         else:
-            return next((x for x in self._contexts if str(x.identifier) == identifier), None)
+            return self._names.get(identifier)
 
     def get_context(self, identifier, quoted=False):
         """Return the requested context/Graph.
@@ -213,35 +409,76 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
 
 
 class InMemoryCopyOnEditAggregatedGraph(InMemoryAggregatedGraph):
+    """An aggregated graph whose edits are kept in a CopyOnEditGraph for each changed graph."""
 
-    def add(self, triple_or_quad):
-        s, p, o, c = self._spoc(triple_or_quad, default=True)
-
-        _copyIfNotExists(self.store, c, self._get_context(self.identifier))
+    def __init__(
+        self, store='default', identifier=None, graphs=[], statistics=None, filters=None
+    ):
+        super().__init__(
+            store=store, identifier=identifier, graphs=graphs, statistics=statistics,
+            filters=filters
+        )
+        self._overlays = {}
 
-        self.store.add((s, p, o), context=c, quoted=False)
+    def contexts(self, triple=None):
+        overlays = list(self._overlays.values())
+        seen = set(overlay.identifier for overlay in overlays)
+        if triple is not None and triple != (None, None, None):
+            overlays = [overlay for overlay in overlays if triple in overlay]
 
-    def addN(self, quads):
-        def do(g):
-            c = self._graph(g)
+        return overlays + [context for context in super().contexts(triple)
+                           if context.identifier not in seen]
 
-            _copyIfNotExists(self.store, c, self._get_context(self.identifier))
+    graphs = contexts
 
-            return g
+    def add(self, triple_or_quad):
+        s, p, o, c = self._spoc(triple_or_quad, default=True)
+        self.edit_context(c).add((s, p, o))
 
-        self.store.addN((s, p, o, do(c)) for s, p, o, c in quads)
+    def addN(self, quads):
+        for s, p, o, c in quads:
+            self.edit_context(c).add((s, p, o))
 
     def remove(self, triple_or_quad):
         s, p, o, c = self._spoc(triple_or_quad)
 
-        _copyIfNotExists(self.store, c, self._get_context(self.identifier))
+        if c is not None:
+            self.edit_context(c).remove((s, p, o))
+            return
 
-        self.store.remove((s, p, o), context=c)
+        for context in self.contexts((s, p, o)):
+            self.edit_context(context.identifier).remove((s, p, o))
 
     def get_context(self, identifier, quoted=False):
+        """Return the overlay of an edited graph or the unchanged graph.
+
+        The returned graph is meant to be read, changes are made through edit_context.
+        """
+        if isinstance(identifier, Graph):
+            identifier = identifier.identifier
+        try:
+            return self._overlays[identifier]
+        except KeyError:
+            return super().get_context(identifier)
+
+    def edit_context(self, identifier):
+        """Return the overlay which keeps the changes of a graph, created on the first edit."""
         if isinstance(identifier, Graph):
             identifier = identifier.identifier
-        return CopyOnEditGraph(
-            store=self.store, identifier=identifier, namespace_manager=self,
-            template=self._get_context(identifier)
+        try:
+            return self._overlays[identifier]
+        except KeyError:
+            pass
+
+        template = self._get_context(identifier)
+        added = removed = ()
+        if isinstance(template, CopyOnEditGraph) and template.delta() is not None:
+            # the changes of an earlier edit are taken over to not stack overlays
+            template, added, removed = template.delta()
+
+        overlay = self._overlays[identifier] = CopyOnEditGraph(
+            store=self.store, identifier=identifier, namespace_manager=self, template=template
         )
+        overlay._added.update(added)
+        overlay._removed.update(removed)
+        return overlay
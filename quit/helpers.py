@@ -119,3 +119,26 @@ def isAbsoluteUri(uri):
         return True
     else:
         return False
+
+
+def parseSize(size):
+    """Convert a size like "512M" or "2G" into a number of bytes.
+
+    Returns:
+        The number of bytes as integer
+
+    Raises:
+        ValueError, if the size can not be parsed
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    size = str(size).strip().upper()
+    if size.endswith('B'):
+        size = size[:-1]
+    factor = 1
+    if size and size[-1] in units:
+        factor = units[size[-1]]
+        size = size[:-1]
+    value = int(float(size) * factor)
+    if value < 0:
+        raise ValueError('Size must not be negative')
+    return value
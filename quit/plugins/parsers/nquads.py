@@ -0,0 +1,133 @@
+"""A fast parser for N-Quads as written by the QuitStore.
+
+The QuitStore writes one quad per line with single spaces between the terms, thus such lines can
+be matched by a single precompiled regular expression. Files which contain anything unusual,
+e.g. escaped IRIs, additional whitespace or comments, are handed over to the rdflib parser.
+"""
+
+import re
+
+from rdflib import ConjunctiveGraph, URIRef, Literal, BNode
+from rdflib.parser import Parser, StringInputSource
+from rdflib.plugins.parsers.nquads import NQuadsParser
+from rdflib.plugins.parsers.ntriples import NTriplesParser, unquote
+
+__all__ = ['CanonicalNQuadsParser', 'quads']
+
+_iri = r'<([^:\s"<>{}|^`\\]+:[^\s"<>{}|^`\\]*)>'
+_bnode = r'_:([A-Za-z0-9_:](?:[-A-Za-z0-9_:\.]*[-A-Za-z0-9_:])?)'
+_literal = r'"([^"\\]*(?:\\.[^"\\]*)*)"(?:@([a-zA-Z]+(?:-[a-zA-Z0-9]+)*)|\^\^' + _iri + r')?'
+
+r_quad = re.compile(
+    '(?:' + _iri + '|' + _bnode + ') ' +
+    _iri + ' ' +
+    '(?:' + _iri + '|' + _bnode + '|' + _literal + ')' +
+    '(?: (?:' + _iri + '|' + _bnode + '))? \\.'
+)
+
+
+class UnusualLine(Exception):
+    """Raised for lines which are not in the format written by the QuitStore."""
+    pass
+
+
+def quads(data, default=None):
+    """Parse N-Quads as written by the QuitStore.
+
+    Args:
+        data: A string of N-Quads
+        default: The identifier of the graph for lines without a graph label
+    Returns:
+        A list of (s, p, o, c) tuples of rdflib terms
+    Raises:
+        UnusualLine if a line is not in the expected format
+    """
+    # blank node labels are mapped to the same nodes as by the rdflib parser
+    bnodes = NTriplesParser._bnode_ids
+    iris = {}
+    literals = {}
+    result = []
+    append = result.append
+    match = r_quad.fullmatch
+
+    def iri(value):
+        try:
+            return iris[value]
+        except KeyError:
+            # the expression only matches valid IRIs, thus the validation of URIRef is skipped
+            term = iris[value] = str.__new__(URIRef, value)
+            return term
+
+    def bnode(label):
+        try:
+            return BNode(bnodes[label])
+        except KeyError:
+            term = bnodes[label] = BNode()
+            return term
+
+    for line in data.splitlines():
+        if not line:
+            continue
+        m = match(line)
+        if m is None:
+            raise UnusualLine(line)
+        s, sb, p, o, ob, lex, lang, datatype, c, cb = m.groups()
+
+        if o is not None:
+            o = iri(o)
+        elif ob is not None:
+            o = bnode(ob)
+        else:
+            key = (lex, lang, datatype)
+            try:
+                o = literals[key]
+            except KeyError:
+                o = literals[key] = Literal(
+                    unquote(lex) if '\\' in lex else lex,
+                    lang, iri(datatype) if datatype is not None else None
+                )
+
+        if c is not None:
+            c = iri(c)
+        elif cb is not None:
+            c = bnode(cb)
+        else:
+            c = default
+
+        append((iri(s) if s is not None else bnode(sb), iri(p), o, c))
+
+    return result
+
+
+class CanonicalNQuadsParser(Parser):
+    """Parse N-Quads with a fast path for the format written by the QuitStore.
+
+    If the input contains lines in another format the whole input is parsed by the rdflib N-Quads
+    parser instead.
+    """
+
+    def parse(self, inputsource, sink, **kwargs):
+        assert sink.store.context_aware, "The parser must be given a context aware store."
+
+        data = inputsource.getByteStream().read()
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+
+        try:
+            result = quads(data, sink.identifier)
+        except UnusualLine:
+            return NQuadsParser().parse(StringInputSource(data.encode('utf-8')), sink, **kwargs)
+
+        sink = ConjunctiveGraph(store=sink.store, identifier=sink.identifier)
+        contexts = {}
+
+        def _quads():
+            for s, p, o, c in result:
+                try:
+                    context = contexts[c]
+                except KeyError:
+                    context = contexts[c] = sink.get_context(c)
+                yield s, p, o, context
+
+        sink.store.addN(_quads())
+        return sink
@@ -0,0 +1,161 @@
+"""Serializers which write query results while the query is evaluated.
+
+The rdflib result serializers collect the complete result before they write the document. The
+serializers of this module consume the bindings of SELECT queries and the triples of CONSTRUCT
+queries one by one and yield the document in chunks of bytes, thus the memory needed does not
+depend on the size of the result.
+"""
+
+import csv
+import json
+
+from io import BytesIO, StringIO
+from rdflib import Graph
+from rdflib.plugins.serializers.nt import _nt_row
+from rdflib.plugins.sparql.results.jsonresults import termToJSON
+from rdflib.plugins.sparql.results.xmlresults import SPARQLXMLWriter
+
+__all__ = ['serialize', 'TripleResult']
+
+# number of rows which are serialized into one chunk
+CHUNK_SIZE = 1000
+
+
+class TripleResult:
+    """The result of a CONSTRUCT query whose triples are generated while they are serialized."""
+
+    type = 'CONSTRUCT'
+
+    def __init__(self, triples):
+        self.triples = triples
+
+    def serialize(self, format):
+        """Serialize the result at once in formats which can not be streamed."""
+        graph = Graph()
+        graph += self.triples
+        return graph.serialize(format=format)
+
+
+def bindings(result):
+    """Iterate over the bindings of a SELECT result without keeping them in the result."""
+    if result._genbindings is not None:
+        generator, result._genbindings = result._genbindings, None
+        return generator
+    return iter(result._bindings)
+
+
+def _json(result):
+    head = json.dumps({'vars': result.vars}, ensure_ascii=False)
+    yield '{{"head": {}, "results": {{"bindings": ['.format(head).encode('utf-8')
+
+    rows = []
+    separator = ''
+    for binding in bindings(result):
+        row = {}
+        for var in binding:
+            value = termToJSON(None, binding[var])
+            if value is not None:
+                row[var] = value
+        rows.append(separator + json.dumps(row, allow_nan=False, ensure_ascii=False))
+        separator = ', '
+        if len(rows) >= CHUNK_SIZE:
+            yield ''.join(rows).encode('utf-8')
+            rows = []
+
+    rows.append(']}}')
+    yield ''.join(rows).encode('utf-8')
+
+
+def _xml(result):
+    output = BytesIO()
+
+    def flush():
+        chunk = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return chunk
+
+    writer = SPARQLXMLWriter(output)
+    writer.write_header(result.vars)
+    writer.write_results_header()
+    yield flush()
+
+    count = 0
+    for binding in bindings(result):
+        writer.write_start_result()
+        for key, value in binding.items():
+            writer.write_binding(key, value)
+        writer.write_end_result()
+        count += 1
+        if count >= CHUNK_SIZE:
+            yield flush()
+            count = 0
+
+    writer.close()
+    yield flush()
+
+
+def _csv(result):
+    output = StringIO()
+    writer = csv.writer(output, delimiter=',')
+
+    def flush():
+        chunk = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return chunk.encode('utf-8')
+
+    writer.writerow(result.vars)
+    yield flush()
+
+    count = 0
+    for binding in bindings(result):
+        writer.writerow(['' if binding.get(var) is None else binding.get(var)
+                         for var in result.vars])
+        count += 1
+        if count >= CHUNK_SIZE:
+            yield flush()
+            count = 0
+
+    yield flush()
+
+
+def _ntriples(result, encoding):
+    rows = []
+    for triple in result.triples:
+        rows.append(_nt_row(triple))
+        if len(rows) >= CHUNK_SIZE:
+            yield ''.join(rows).encode(encoding, '_rdflib_nt_escape')
+            rows = []
+
+    rows.append('\n')
+    yield ''.join(rows).encode(encoding, '_rdflib_nt_escape')
+
+
+# the encodings of the N-Triples formats as used by the rdflib serializers
+tripleFormats = {
+    'nt': 'ascii',
+    'nt11': 'utf-8'
+}
+
+serializers = {
+    'json': _json,
+    'xml': _xml,
+    'csv': _csv
+}
+
+
+def serialize(result, format):
+    """Serialize a query result in chunks.
+
+    Args:
+        result: The rdflib result of a query
+        format: The name of the result format
+    Returns:
+        A generator of chunks of bytes or None if the result can not be streamed in the format
+    """
+    if isinstance(result, TripleResult) and format in tripleFormats:
+        return _ntriples(result, tripleFormats[format])
+    if result.type != 'SELECT' or format not in serializers:
+        return None
+    return serializers[format](result)
@@ -0,0 +1,362 @@
+import threading
+
+from array import array
+from bisect import bisect_left, bisect_right
+from rdflib import Graph, URIRef
+from rdflib.store import Store
+
+__all__ = ['CompactStore', 'TermDictionary']
+
+# the estimated memory of a term object and its entries in a dictionary besides its characters
+TERM_SIZE = 100
+
+
+class TermDictionary:
+    """A dictionary which maps terms to integer ids and back.
+
+    Each distinct term is kept once, no matter how many graphs use it. Terms are never removed, thus
+    an id stays valid for the lifetime of the dictionary.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._terms = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, term):
+        """Get the id of a term and add the term to the dictionary if it is unknown."""
+        try:
+            return self._ids[term]
+        except KeyError:
+            pass
+
+        with self._lock:
+            id = self._ids.get(term)
+            if id is None:
+                self._terms.append(term)
+                id = self._ids[term] = len(self._terms) - 1
+                self._size += len(term) + TERM_SIZE
+            return id
+
+    def id(self, term):
+        """Get the id of a term or None if the term is unknown."""
+        return self._ids.get(term)
+
+    def term(self, id):
+        return self._terms[id]
+
+    @property
+    def size(self):
+        """Estimate the memory used by the terms in bytes."""
+        return self._size
+
+    def __len__(self):
+        return len(self._terms)
+
+
+# the orders of the indexes given by the positions of the terms of a triple
+SPO = (0, 1, 2)
+POS = (1, 2, 0)
+OSP = (2, 0, 1)
+
+
+def _order(s, p, o):
+    """Get the order of the index in which the bound terms of a pattern form a prefix."""
+    if s is not None and (p is not None or o is None):
+        return SPO
+    if p is not None:
+        return POS
+    if o is not None:
+        return OSP
+    return SPO
+
+
+def _columns(rows):
+    return tuple(array('I', column) for column in zip(*rows)) or (
+        array('I'), array('I'), array('I')
+    )
+
+
+class _Triples:
+    """The triples of a context in sorted permutation indexes of term ids.
+
+    An index consists of three arrays of ids which hold the triples sorted by their terms in the
+    order of the index. The bound terms of any triple pattern are a prefix of one of the orders
+    SPO, POS and OSP, thus the matches of a pattern are found by binary search as one range of an
+    index. The POS and OSP indexes are built when they are needed first. Added triples are
+    collected in a pending array and merged into the indexes once the triples are read.
+    """
+
+    __slots__ = ('_indexes', '_pending', '_lock')
+
+    def __init__(self):
+        self._indexes = {SPO: _columns([])}
+        self._pending = array('I')
+        self._lock = threading.Lock()
+
+    def add(self, s, p, o):
+        with self._lock:
+            self._pending.extend((s, p, o))
+
+    def columns(self):
+        """Get the (subjects, predicates, objects) arrays in SPO order including added triples."""
+        if not self._pending:
+            return self._indexes[SPO]
+
+        with self._lock:
+            if self._pending:
+                pending = self._pending
+                rows = set(zip(*self._indexes[SPO]))
+                rows.update(zip(pending[0::3], pending[1::3], pending[2::3]))
+                self._setRows(sorted(rows))
+            return self._indexes[SPO]
+
+    def _setRows(self, rows):
+        self._indexes = {SPO: _columns(rows)}
+        self._pending = array('I')
+
+    def index(self, order):
+        """Get the columns of the index of an order, building the index if necessary."""
+        spo = self.columns()
+        try:
+            return self._indexes[order]
+        except KeyError:
+            pass
+
+        with self._lock:
+            indexes = self._indexes
+            if order not in indexes:
+                indexes[order] = _columns(sorted(zip(*(spo[i] for i in order))))
+            return indexes[order]
+
+    def remove(self, s, p, o):
+        rows = [row for row in zip(*self.columns()) if not _matches(row, s, p, o)]
+        with self._lock:
+            self._setRows(rows)
+
+    def match(self, s, p, o):
+        """Generate the (s, p, o) id tuples which match a pattern of ids or None."""
+        return match(self.index, s, p, o)
+
+    @property
+    def size(self):
+        """Get the memory used by the indexes and the pending triples in bytes."""
+        columns = [column for index in self._indexes.values() for column in index]
+        return sum(len(column) * column.itemsize for column in columns + [self._pending])
+
+    def __len__(self):
+        return len(self.columns()[0])
+
+
+def match(index, s, p, o):
+    """Generate the (s, p, o) id tuples which match a pattern of ids or None.
+
+    Args:
+        index: A function which returns the columns of the index of an order
+        s, p, o: The ids of the pattern or None
+    """
+    pattern = (s, p, o)
+    order = _order(s, p, o)
+    columns = index(order)
+
+    lo, hi = 0, len(columns[0])
+    for column, position in zip(columns, order):
+        id = pattern[position]
+        if id is None:
+            break
+        lo, hi = bisect_left(column, id, lo, hi), bisect_right(column, id, lo, hi)
+
+    first, second, third = columns
+    if order == SPO:
+        for i in range(lo, hi):
+            yield first[i], second[i], third[i]
+    elif order == POS:
+        for i in range(lo, hi):
+            yield third[i], first[i], second[i]
+    else:
+        for i in range(lo, hi):
+            yield second[i], third[i], first[i]
+
+
+def _matches(row, s, p, o):
+    return (s is None or row[0] == s) and (p is None or row[1] == p) and (o is None or row[2] == o)
+
+
+class CompactStore(Store):
+    """A context aware rdflib store which keeps triples as integer ids of a term dictionary.
+
+    Each store keeps its terms once in its own dictionary unless a dictionary is shared
+    explicitly, thus the terms are freed together with the store. Each
+    context keeps its triples in up to three sorted permutation indexes of ids, which take twelve
+    bytes per triple each, thus any triple pattern is looked up by binary search. Added triples are
+    sorted in when the context is read the next time, thus the store is meant to be filled once
+    and read afterwards, as is the case for the graphs parsed from git blobs.
+    """
+
+    context_aware = True
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = True
+
+    def __init__(self, configuration=None, identifier=None, dictionary=None):
+        super().__init__(configuration=None, identifier=identifier)
+        self._dictionary = dictionary if dictionary is not None else TermDictionary()
+        self._contexts = {}
+        self._graphs = {}
+        self._namespaces = {}
+        self._prefixes = {}
+
+    def _contextId(self, context):
+        if isinstance(context, Graph):
+            context = context.identifier
+        return self._dictionary.id(context)
+
+    def _graph(self, cid):
+        try:
+            return self._graphs[cid]
+        except KeyError:
+            graph = self._graphs[cid] = Graph(store=self, identifier=self._dictionary.term(cid))
+            return graph
+
+    @property
+    def size(self):
+        """Estimate the memory used by the terms and the indexes of the store in bytes."""
+        return self._dictionary.size + sum(triples.size for triples in self._contexts.values())
+
+    def termId(self, term):
+        """Get the id of a term or None if the term is unknown to the store."""
+        return self._dictionary.id(term)
+
+    def term(self, id):
+        return self._dictionary.term(id)
+
+    def contextTriples(self, context):
+        """Get the triples of a context to match patterns of term ids or None for unknown contexts.
+
+        The returned object generates the matching (s, p, o) id tuples of a pattern with its
+        match(s, p, o) method.
+        """
+        return self._contexts.get(self._contextId(context))
+
+    def _select(self, triple, context):
+        """Get the ids of a triple pattern and the contexts to search for it.
+
+        Returns:
+            A tuple of the id pattern and a list of (context id, triples) tuples or None if a term
+            of the pattern is unknown
+        """
+        ids = []
+        for term in triple:
+            if term is None:
+                ids.append(None)
+                continue
+            id = self._dictionary.id(term)
+            if id is None:
+                return None
+            ids.append(id)
+
+        if context is None:
+            return ids, list(self._contexts.items())
+        cid = self._contextId(context)
+        if cid not in self._contexts:
+            return None
+        return ids, [(cid, self._contexts[cid])]
+
+    def add(self, triple, context, quoted=False):
+        Store.add(self, triple, context, quoted)
+        self.addN([tuple(triple) + (context,)])
+
+    def addN(self, quads):
+        add = self._dictionary.add
+        for s, p, o, c in quads:
+            cid = add(c.identifier if isinstance(c, Graph) else c)
+            try:
+                triples = self._contexts[cid]
+            except KeyError:
+                triples = self._contexts[cid] = _Triples()
+            triples.add(add(s), add(p), add(o))
+
+    def remove(self, triple, context=None):
+        Store.remove(self, triple, context)
+        selected = self._select(triple, context)
+        if selected is None:
+            return
+        ids, contexts = selected
+        for cid, triples in contexts:
+            triples.remove(*ids)
+
+    def triples(self, triple, context=None):
+        if context is not None and context == self:
+            context = None
+
+        selected = self._select(triple, context)
+        if selected is None:
+            return
+        ids, contexts = selected
+        term = self._dictionary.term
+
+        if len(contexts) == 1:
+            cid, triples = contexts[0]
+            graph = self._graph(cid)
+            for s, p, o in triples.match(*ids):
+                yield (term(s), term(p), term(o)), iter((graph,))
+            return
+
+        # a triple is reported once with all the contexts it is contained in
+        matches = {}
+        for cid, triples in contexts:
+            for row in triples.match(*ids):
+                matches.setdefault(row, []).append(self._graph(cid))
+        for (s, p, o), graphs in matches.items():
+            yield (term(s), term(p), term(o)), iter(graphs)
+
+    def __len__(self, context=None):
+        if context is not None:
+            triples = self._contexts.get(self._contextId(context))
+            return len(triples) if triples is not None else 0
+
+        if len(self._contexts) == 1:
+            return len(next(iter(self._contexts.values())))
+        rows = set()
+        for triples in self._contexts.values():
+            rows.update(zip(*triples.columns()))
+        return len(rows)
+
+    def contexts(self, triple=None):
+        if triple is None or triple == (None, None, None):
+            for cid in list(self._contexts):
+                yield self._graph(cid)
+            return
+
+        selected = self._select(triple, None)
+        if selected is None:
+            return
+        ids, contexts = selected
+        for cid, triples in contexts:
+            if next(triples.match(*ids), None) is not None:
+                yield self._graph(cid)
+
+    def add_graph(self, graph):
+        cid = self._dictionary.add(graph.identifier)
+        if cid not in self._contexts:
+            self._contexts[cid] = _Triples()
+
+    def remove_graph(self, graph):
+        cid = self._contextId(graph)
+        self._contexts.pop(cid, None)
+        self._graphs.pop(cid, None)
+
+    def bind(self, prefix, namespace):
+        self._prefixes[namespace] = prefix
+        self._namespaces[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        for prefix, namespace in list(self._namespaces.items()):
+            yield prefix, URIRef(namespace)
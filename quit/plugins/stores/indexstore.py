@@ -0,0 +1,400 @@
+import functools
+import hashlib
+import mmap
+
+from array import array
+from collections import Counter, defaultdict
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.namespace import RDF
+from rdflib.graph import ModificationException
+from rdflib.store import VALID_STORE, CORRUPTED_STORE, NO_STORE
+
+from quit.plugins.stores.compactstore import CompactStore, SPO, POS, OSP, TERM_SIZE, match
+from quit.tools.statistics import Statistics
+
+__all__ = ['BloomFilter', 'IndexStore', 'build', 'termHash']
+
+# the magic number of an index file, the last byte is the version of the format
+MAGIC = b'QUITIDX\x03'
+
+ORDERS = (SPO, POS, OSP)
+
+
+def _key(term):
+    """Encode a term as bytes, the order of the encoded terms is the order of the term table."""
+    if isinstance(term, Literal):
+        if term.language:
+            head = 'L@' + term.language
+        elif term.datatype:
+            head = 'L^' + str(term.datatype)
+        else:
+            head = 'L'
+    elif isinstance(term, BNode):
+        head = 'B'
+    else:
+        head = 'U'
+    return (head + '\0' + str(term)).encode('utf-8', 'surrogatepass')
+
+
+def _term(key):
+    """Build a term from the bytes created by _key."""
+    head, value = key.decode('utf-8', 'surrogatepass').split('\0', 1)
+    if head.startswith('L@'):
+        return Literal(value, lang=head[2:])
+    if head.startswith('L^'):
+        return Literal(value, datatype=URIRef(head[2:]))
+    if head == 'L':
+        return Literal(value)
+    if head == 'B':
+        return BNode(value)
+    return URIRef(value)
+
+
+def _hash(position, key):
+    """Hash an encoded term at a position of a triple."""
+    digest = hashlib.blake2b(bytes((position,)) + key, digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+@functools.lru_cache(maxsize=65536)
+def termHash(position, term):
+    """Get the hash of a term at a position of a triple as kept by the BloomFilter of a context.
+
+    Unlike the builtin hash of a string the hash is the same in every process, thus the filters
+    can be saved in the index file.
+    """
+    return _hash(position, _key(term))
+
+
+def _pad(data):
+    return data + b'\0' * (-len(data) % 8)
+
+
+class BloomFilter:
+    """A compact summary of a set of values which tells whether a value may be in the set.
+
+    Values are given by their hash. The filter keeps ten bits per value and sets seven of them for
+    each value, thus a value of the set is always reported as contained and any other value is
+    reported as contained with a probability of about one percent.
+    """
+
+    HASHES = 7
+
+    def __init__(self, hashes):
+        hashes = set(hashes)
+        self.size = max(len(hashes) * 10, 64)
+        self._bits = bytearray((self.size + 7) // 8)
+        for value in hashes:
+            for bit in self._positions(value):
+                self._bits[bit >> 3] |= 1 << (bit & 7)
+
+    @classmethod
+    def load(cls, size, bits):
+        """Create a filter on the bits of a saved filter of the given number of bits."""
+        bloom = cls.__new__(cls)
+        bloom.size = size
+        bloom._bits = bits
+        return bloom
+
+    def _positions(self, value):
+        size = self.size
+        first = value & 0xffffffff
+        second = (value >> 32) & 0xffffffff | 1
+        return [(first + i * second) % size for i in range(self.HASHES)]
+
+    def __contains__(self, value):
+        bits = self._bits
+        return all(bits[bit >> 3] & (1 << (bit & 7)) for bit in self._positions(value))
+
+
+
+def _statistics(rows, type):
+    """Count the triples of a context as Statistics.fromTriples does, but on term ids.
+
+    Returns:
+        An array of the number of triples, distinct subjects and objects, predicates and classes
+        followed by a (predicate, triples, subjects, objects) entry per predicate and a (class,
+        instances) entry per class
+    """
+    sizes = Counter()
+    subjects = defaultdict(set)
+    objects = defaultdict(set)
+    classes = Counter()
+    for s, p, o in rows:
+        sizes[p] += 1
+        subjects[p].add(s)
+        objects[p].add(o)
+        if p == type:
+            classes[o] += 1
+
+    counts = array('Q', (
+        len(rows), len(set().union(*subjects.values())), len(set().union(*objects.values())),
+        len(sizes), len(classes)
+    ))
+    for p, size in sorted(sizes.items()):
+        counts.extend((p, size, len(subjects[p]), len(objects[p])))
+    for c, size in sorted(classes.items()):
+        counts.extend((c, size))
+    return counts
+
+
+def build(quads):
+    """Build the index file of the given quads.
+
+    The file starts with the magic number and the number of terms, the size of the term data and
+    the number of contexts. It is followed by the offsets of the sorted terms into the term data,
+    the term data itself, a (term id, number of triples) entry for each context and the columns of
+    the SPO, POS and OSP indexes of each context as arrays of unsigned integers in the native byte
+    order. The file ends with the statistics of each context as built by _statistics and the
+    number of bits and the bits of the BloomFilter of the termHash values of each context, thus
+    both are computed once with the indexes and never by scanning the triples.
+
+    Args:
+        quads: An iterable of (s, p, o, c) tuples where c is a Graph or its identifier
+    Returns:
+        The content of the index file as bytes
+    """
+    contexts = defaultdict(set)
+    for s, p, o, c in quads:
+        contexts[c.identifier if isinstance(c, Graph) else c].add((s, p, o))
+
+    keys = set(_key(c) for c in contexts)
+    for triples in contexts.values():
+        for triple in triples:
+            keys.update(_key(term) for term in triple)
+    keys = sorted(keys)
+    ids = {key: id for id, key in enumerate(keys)}
+
+    offsets = array('Q', [0])
+    for key in keys:
+        offsets.append(offsets[-1] + len(key))
+    data = b''.join(keys)
+
+    type = ids.get(_key(RDF.type))
+    entries = array('Q')
+    columns = []
+    summaries = []
+    for c, triples in contexts.items():
+        rows = [tuple(ids[_key(term)] for term in triple) for triple in triples]
+        entries.extend((ids[_key(c)], len(rows)))
+        for order in ORDERS:
+            permuted = sorted(tuple(row[i] for i in order) for row in rows)
+            for column in zip(*permuted) if permuted else ((), (), ()):
+                columns.append(array('I', column).tobytes())
+        summaries.append(_statistics(rows, type).tobytes())
+        terms = [set(row[position] for row in rows) for position in range(3)]
+        bloom = BloomFilter(
+            _hash(position, keys[id]) for position, values in enumerate(terms) for id in values
+        )
+        summaries.extend((array('Q', [bloom.size]).tobytes(), _pad(bytes(bloom._bits))))
+
+    header = array('Q', (len(keys), len(data), len(contexts)))
+    return b''.join(
+        [MAGIC, header.tobytes(), offsets.tobytes(), _pad(data), entries.tobytes(),
+         _pad(b''.join(columns))] + summaries
+    )
+
+
+class _Terms:
+    """The term table of an index file.
+
+    Terms are decoded when they are used first and looked up by binary search over the table.
+    """
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+        self._terms = {}
+        self._ids = {}
+
+    def _key(self, id):
+        return self._data[self._offsets[id]:self._offsets[id + 1]].tobytes()
+
+    def id(self, term):
+        """Get the id of a term or None if the term is not in the table."""
+        try:
+            return self._ids[term]
+        except KeyError:
+            pass
+
+        key = _key(term)
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(self) or self._key(lo) != key:
+            return None
+        self._ids[term] = lo
+        return lo
+
+    def term(self, id):
+        try:
+            return self._terms[id]
+        except KeyError:
+            term = self._terms[id] = _term(self._key(id))
+            return term
+
+    @property
+    def size(self):
+        """Estimate the memory used by the decoded terms in bytes."""
+        terms = sum(len(term) + TERM_SIZE for term in self._terms.values())
+        return terms + TERM_SIZE * len(self._ids)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+class _Triples:
+    """The indexes and statistics of the triples of a context in an index file."""
+
+    __slots__ = ('_indexes', 'statistics', 'filter')
+
+    def __init__(self, indexes, statistics=None, filter=None):
+        self._indexes = indexes
+        self.statistics = statistics
+        self.filter = filter
+
+    def columns(self):
+        return self._indexes[SPO]
+
+    def index(self, order):
+        return self._indexes[order]
+
+    def match(self, s, p, o):
+        return match(self.index, s, p, o)
+
+    def __len__(self):
+        return len(self._indexes[SPO][0])
+
+
+class IndexStore(CompactStore):
+    """A read-only context aware rdflib store on an index file as created by build.
+
+    The file is memory-mapped and the terms and indexes are read from the mapping without copying
+    them, thus opening a store takes constant time and the pages of the file are loaded and
+    evicted by the operating system as needed.
+    """
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(identifier=identifier)
+        self._buffered = 0
+        if configuration is not None:
+            self.open(configuration)
+
+    @property
+    def size(self):
+        """Estimate the memory used by the store without the pages of a memory-mapped file."""
+        return self._dictionary.size + self._buffered
+
+    def open(self, configuration, create=False):
+        try:
+            with open(configuration, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return NO_STORE
+        return VALID_STORE if self.load(buffer) else CORRUPTED_STORE
+
+    def load(self, buffer):
+        """Read the terms and indexes from a buffer with the content of an index file.
+
+        Returns:
+            True if the buffer holds a valid index file, False otherwise
+        """
+        view = memoryview(buffer)
+        if len(view) < len(MAGIC) + 24 or view[:len(MAGIC)].tobytes() != MAGIC:
+            return False
+        position = len(MAGIC) + 24
+        terms, size, contexts = view[len(MAGIC):position].cast('Q')
+
+        def take(length, format):
+            nonlocal position
+            end = position + length * array(format).itemsize
+            if end > len(view):
+                raise ValueError()
+            part = view[position:end].cast(format) if format != 'B' else view[position:end]
+            position = end
+            return part
+
+        try:
+            offsets = take(terms + 1, 'Q')
+            data = take(size, 'B')
+            position += -size % 8
+            entries = take(2 * contexts, 'Q')
+            indexes = {}
+            for i in range(contexts):
+                count = entries[2 * i + 1]
+                indexes[entries[2 * i]] = _Triples({
+                    order: tuple(take(count, 'I') for column in order) for order in ORDERS
+                })
+            position += -position % 8
+            for triples in indexes.values():
+                counts = take(5, 'Q')
+                triples.statistics = (
+                    counts, take(4 * counts[3], 'Q'), take(2 * counts[4], 'Q')
+                )
+                bits = take(1, 'Q')[0]
+                triples.filter = BloomFilter.load(bits, take((bits + 7) // 8, 'B'))
+                position += -position % 8
+        except ValueError:
+            return False
+
+        self._dictionary = _Terms(offsets, data)
+        self._buffered = 0 if isinstance(buffer, mmap.mmap) else len(view)
+        self._contexts = indexes
+        self._graphs = {}
+        return True
+
+    def statistics(self, context):
+        """Get the Statistics of a context as saved in the index file.
+
+        Args:
+            context: A Graph or its identifier
+        Returns:
+            The Statistics or None if the store has no such context
+        """
+        id = self._dictionary.id(context.identifier if isinstance(context, Graph) else context)
+        try:
+            counts, predicates, classes = self._contexts[id].statistics
+        except KeyError:
+            return None
+
+        term = self._dictionary.term
+        statistics = Statistics()
+        statistics.triples, statistics.subjects, statistics.objects = counts[:3]
+        for i in range(0, len(predicates), 4):
+            statistics.predicates[term(predicates[i])] = list(predicates[i + 1:i + 4])
+        for i in range(0, len(classes), 2):
+            statistics.classes[term(classes[i])] = classes[i + 1]
+        return statistics
+
+    def termFilter(self, context):
+        """Get the BloomFilter of the terms of a context as saved in the index file.
+
+        Args:
+            context: A Graph or its identifier
+        Returns:
+            The BloomFilter or None if the store has no such context
+        """
+        id = self._dictionary.id(context.identifier if isinstance(context, Graph) else context)
+        try:
+            return self._contexts[id].filter
+        except KeyError:
+            return None
+
+    def add(self, triple, context, quoted=False):
+        raise ModificationException()
+
+    def addN(self, quads):
+        raise ModificationException()
+
+    def remove(self, triple, context=None):
+        raise ModificationException()
+
+    def add_graph(self, graph):
+        raise ModificationException()
+
+    def remove_graph(self, graph):
+        raise ModificationException()
@@ -0,0 +1,353 @@
+import os
+import sqlite3
+import threading
+
+from itertools import groupby
+
+from quit.cache import CommitIndex, encode_term as _encode, decode_term as _decode
+from rdflib import Graph, URIRef
+from rdflib.store import Store, VALID_STORE, NO_STORE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    extra TEXT NOT NULL,
+    UNIQUE (kind, value, extra)
+);
+CREATE TABLE IF NOT EXISTS quads (
+    s INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    o INTEGER NOT NULL,
+    c INTEGER NOT NULL,
+    PRIMARY KEY (c, s, p, o)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS quads_spo ON quads (s, p, o);
+CREATE INDEX IF NOT EXISTS quads_pos ON quads (p, o, s);
+CREATE INDEX IF NOT EXISTS quads_osp ON quads (o, s, p);
+CREATE TABLE IF NOT EXISTS contexts (
+    id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS namespaces (
+    prefix TEXT PRIMARY KEY,
+    uri TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS synced_commits (
+    id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS synced_refs (
+    name TEXT PRIMARY KEY,
+    commit_id TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore(Store):
+    """A context aware rdflib store which keeps its quads in an SQLite database file.
+
+    Terms are stored once in a dictionary table and quads reference them by their integer id. The
+    most recently used terms are kept in memory to avoid a database lookup for each of them.
+    """
+
+    context_aware = True
+    formula_aware = False
+    transaction_aware = True
+    graph_aware = True
+
+    # number of terms kept in each direction of the in-memory term cache
+    TERM_CACHE_SIZE = 100000
+    # number of rows fetched at once while the matches of a triple pattern are generated
+    FETCH_SIZE = 1000
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration=None, identifier=identifier)
+        self._db = None
+        self._lock = threading.RLock()
+        self._ids = {}
+        self._terms = {}
+
+        if configuration is not None:
+            self.open(configuration, create=True)
+
+    def open(self, configuration, create=False):
+        if not create and not os.path.exists(configuration):
+            return NO_STORE
+
+        directory = os.path.dirname(configuration)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(configuration, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction=False):
+        if self._db is None:
+            return
+        if commit_pending_transaction:
+            self._db.commit()
+        else:
+            self._db.rollback()
+        self._db.close()
+        self._db = None
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._db.rollback()
+            self._ids.clear()
+            self._terms.clear()
+
+    def _id(self, term, create=False):
+        """Get the id of a term, optionally adding unknown terms to the dictionary."""
+        key = _encode(term)
+        try:
+            return self._ids[key]
+        except KeyError:
+            pass
+
+        row = self._db.execute(
+            'SELECT id FROM terms WHERE kind = ? AND value = ? AND extra = ?', key
+        ).fetchone()
+        if row is None:
+            if not create:
+                return None
+            id = self._db.execute(
+                'INSERT INTO terms (kind, value, extra) VALUES (?, ?, ?)', key
+            ).lastrowid
+        else:
+            id = row[0]
+
+        if len(self._ids) >= self.TERM_CACHE_SIZE:
+            self._ids.clear()
+        self._ids[key] = id
+        return id
+
+    def _term(self, id):
+        try:
+            return self._terms[id]
+        except KeyError:
+            pass
+
+        row = self._db.execute(
+            'SELECT kind, value, extra FROM terms WHERE id = ?', (id,)
+        ).fetchone()
+        term = _decode(*row)
+
+        if len(self._terms) >= self.TERM_CACHE_SIZE:
+            self._terms.clear()
+        self._terms[id] = term
+        return term
+
+    def _context(self, id):
+        return Graph(store=self, identifier=self._term(id))
+
+    def _where(self, triple, context):
+        """Build the WHERE clause for a triple pattern.
+
+        Returns:
+            A tuple of the clause and its parameters or None if a term is unknown to the store
+        """
+        clauses = []
+        params = []
+        for column, term in zip(('s', 'p', 'o', 'c'), tuple(triple) + (context,)):
+            if term is None:
+                continue
+            id = self._id(term)
+            if id is None:
+                return None
+            clauses.append('{} = ?'.format(column))
+            params.append(id)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def add(self, triple, context, quoted=False):
+        Store.add(self, triple, context, quoted)
+        self.addN([tuple(triple) + (context,)])
+
+    def addN(self, quads):
+        with self._lock:
+            rows = []
+            contexts = set()
+            for s, p, o, c in quads:
+                cid = self._id(c, create=True)
+                contexts.add(cid)
+                rows.append((
+                    self._id(s, create=True), self._id(p, create=True), self._id(o, create=True),
+                    cid
+                ))
+            self._db.executemany(
+                'INSERT OR IGNORE INTO quads (s, p, o, c) VALUES (?, ?, ?, ?)', rows
+            )
+            self._db.executemany(
+                'INSERT OR IGNORE INTO contexts (id) VALUES (?)', ((c,) for c in contexts)
+            )
+
+    def remove(self, triple, context=None):
+        Store.remove(self, triple, context)
+        with self._lock:
+            where = self._where(triple, context)
+            if where is None:
+                return
+            self._db.execute('DELETE FROM quads' + where[0], where[1])
+
+    def triples(self, triple, context=None):
+        if context is not None and context == self:
+            context = None
+
+        with self._lock:
+            where = self._where(triple, context)
+            if where is None:
+                return
+            # each call reads from its own cursor, thus nested calls do not disturb each other
+            cursor = self._db.cursor()
+            cursor.execute(
+                'SELECT s, p, o, c FROM quads' + where[0] + ' ORDER BY s, p, o', where[1]
+            )
+
+        def rows():
+            while True:
+                with self._lock:
+                    batch = cursor.fetchmany(self.FETCH_SIZE)
+                if not batch:
+                    return
+                yield from batch
+
+        try:
+            for (s, p, o), group in groupby(rows(), key=lambda row: row[:3]):
+                with self._lock:
+                    decoded = (self._term(s), self._term(p), self._term(o))
+                    contexts = [self._context(row[3]) for row in group]
+                yield decoded, iter(contexts)
+        finally:
+            cursor.close()
+
+    def __len__(self, context=None):
+        with self._lock:
+            if context is None:
+                query = 'SELECT COUNT(*) FROM (SELECT DISTINCT s, p, o FROM quads)'
+                return self._db.execute(query).fetchone()[0]
+
+            cid = self._id(context)
+            if cid is None:
+                return 0
+            return self._db.execute('SELECT COUNT(*) FROM quads WHERE c = ?', (cid,)).fetchone()[0]
+
+    def contexts(self, triple=None):
+        with self._lock:
+            if triple is None or triple == (None, None, None):
+                rows = self._db.execute('SELECT id FROM contexts').fetchall()
+            else:
+                where = self._where(triple, None)
+                if where is None:
+                    return
+                rows = self._db.execute(
+                    'SELECT DISTINCT c FROM quads' + where[0], where[1]
+                ).fetchall()
+            contexts = [self._context(row[0]) for row in rows]
+
+        for context in contexts:
+            yield context
+
+    def add_graph(self, graph):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR IGNORE INTO contexts (id) VALUES (?)', (self._id(graph, create=True),)
+            )
+
+    def remove_graph(self, graph):
+        with self._lock:
+            cid = self._id(graph)
+            if cid is None:
+                return
+            self._db.execute('DELETE FROM quads WHERE c = ?', (cid,))
+            self._db.execute('DELETE FROM contexts WHERE id = ?', (cid,))
+
+    def bind(self, prefix, namespace):
+        with self._lock:
+            self._db.execute('DELETE FROM namespaces WHERE uri = ?', (str(namespace),))
+            self._db.execute(
+                'INSERT OR REPLACE INTO namespaces (prefix, uri) VALUES (?, ?)',
+                (prefix, str(namespace))
+            )
+
+    def namespace(self, prefix):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT uri FROM namespaces WHERE prefix = ?', (prefix,)
+            ).fetchone()
+        return URIRef(row[0]) if row else None
+
+    def prefix(self, namespace):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT prefix FROM namespaces WHERE uri = ?', (str(namespace),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def namespaces(self):
+        with self._lock:
+            rows = self._db.execute('SELECT prefix, uri FROM namespaces').fetchall()
+        for prefix, uri in rows:
+            yield prefix, URIRef(uri)
+
+    def syncedCommits(self):
+        """Get the ids of the commits which are synchronized into the store."""
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT id FROM synced_commits')]
+
+    def syncedRefs(self):
+        """Get the commit ids the references pointed to during the last synchronization."""
+        with self._lock:
+            return dict(self._db.execute('SELECT name, commit_id FROM synced_refs'))
+
+    def addSyncedCommit(self, commit_id):
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO synced_commits (id) VALUES (?)', (commit_id,))
+
+    def setSyncedRef(self, name, commit_id):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO synced_refs (name, commit_id) VALUES (?, ?)',
+                (name, commit_id)
+            )
+
+    def clearSynced(self):
+        with self._lock:
+            self._db.execute('DELETE FROM synced_commits')
+            self._db.execute('DELETE FROM synced_refs')
+
+
+class SQLiteCommitIndex(CommitIndex):
+    """A CommitIndex which is kept in the tables of a SQLiteStore.
+
+    The records are written in the transaction of the store, thus they are committed together with
+    the quads of the synchronized commits and are gone together with the database file.
+    """
+
+    def __init__(self, store):
+        super().__init__()
+        self._store = store
+        self._commits.update(store.syncedCommits())
+        self._refs.update(store.syncedRefs())
+
+    def add(self, commit_id):
+        if commit_id not in self._commits:
+            self._commits.add(commit_id)
+            self._store.addSyncedCommit(commit_id)
+
+    def set_ref(self, name, commit_id):
+        if self._refs.get(name) != commit_id:
+            self._refs[name] = commit_id
+            self._store.setSyncedRef(name, commit_id)
+
+    def clear(self):
+        self._commits.clear()
+        self._refs.clear()
+        self._store.clearSynced()
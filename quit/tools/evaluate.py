@@ -15,8 +15,11 @@ also return a dict of list of dicts
 """
 
 import collections
+import heapq
+import itertools
 
 from rdflib import Variable, Graph, BNode, URIRef, Literal
+from rdflib.paths import Path
 from six import iteritems, itervalues
 
 from rdflib.plugins.sparql import CUSTOM_EVALS
@@ -31,6 +34,16 @@ from rdflib.plugins.sparql.algebra import Join, ToMultiSet, Values
 
 from quit.web import service
 from quit.exceptions import UnSupportedQuery, UnSupportedQueryType
+from quit.graphs import CopyOnEditGraph
+from quit.plugins.stores.compactstore import CompactStore
+from quit.tools.statistics import orderTriples
+
+# number of triples a streamed CONSTRUCT query remembers to suppress duplicates
+CONSTRUCT_WINDOW = 100000
+
+# number of solutions an indexed basic graph pattern matches against the next pattern at once
+BGP_BATCH = 1000
+
 
 def evalBGP(ctx, bgp):
 
@@ -73,6 +86,102 @@ def evalBGP(ctx, bgp):
             yield x
 
 
+def _indexedTriples(graph):
+    """Get the store and the id triples of a graph whose triples are kept as term ids.
+
+    Returns:
+        A (store, triples) tuple or None if the graph is not a single context of a CompactStore
+    """
+    if isinstance(graph, CopyOnEditGraph):
+        delta = graph.delta()
+        if delta is None or delta[1] or delta[2]:
+            return None
+        graph = delta[0]
+    if type(graph) is not Graph or not isinstance(graph.store, CompactStore):
+        return None
+
+    triples = graph.store.contextTriples(graph)
+    return (graph.store, triples) if triples is not None else None
+
+
+def evalIndexedBGP(ctx, bgp):
+    """
+    A basic graph pattern on a graph whose triples are kept as term ids
+
+    The patterns are matched in batches of solutions of term ids, the terms of the solutions are
+    only looked up for the final bindings. The default graph of a dataset is not the union of its
+    graphs (SPARQL_DEFAULT_GRAPH_UNION is disabled), thus the patterns on the data of a commit are
+    the ones in GRAPH clauses, which query a single graph at a time.
+
+    Returns:
+        A generator of the solutions or None if the graph or the patterns are not supported
+    """
+    indexed = _indexedTriples(ctx.graph)
+    if indexed is None or any(isinstance(p, Path) for s, p, o in bgp):
+        return None
+    store, triples = indexed
+
+    # the positions of the variables in a solution
+    slots = {}
+    plans = []
+    for pattern in bgp:
+        lookup = []
+        new = []
+        checks = []
+        for position, node in enumerate(pattern):
+            value = ctx[node]
+            if value is not None:
+                id = store.termId(value)
+                if id is None:
+                    return iter(())
+                lookup.append((id, None))
+            elif node in slots:
+                lookup.append((None, slots[node]))
+            else:
+                previous = next((i for i, n in new if n == node), None)
+                if previous is not None:
+                    checks.append((previous, position))
+                else:
+                    new.append((position, node))
+                lookup.append((None, None))
+        for position, node in new:
+            slots[node] = len(slots)
+        plans.append((lookup, [position for position, node in new], checks))
+
+    return _indexedSolutions(ctx, store, triples, plans, list(slots))
+
+
+def _indexedSolutions(ctx, store, triples, plans, variables):
+    match = triples.match
+
+    def extend(batch, depth):
+        if depth == len(plans):
+            yield batch
+            return
+
+        lookup, new, checks = plans[depth]
+        out = []
+        for solution in batch:
+            pattern = [id if slot is None else solution[slot] for id, slot in lookup]
+            for row in match(*pattern):
+                if checks and any(row[a] != row[b] for a, b in checks):
+                    continue
+                out.append(solution + tuple(row[position] for position in new))
+                if len(out) >= BGP_BATCH:
+                    yield from extend(out, depth + 1)
+                    out = []
+        if out:
+            yield from extend(out, depth + 1)
+
+    bindings = dict(ctx.solution())
+    term = store.term
+    for batch in extend([()], 0):
+        for solution in batch:
+            solutionBindings = dict(bindings)
+            solutionBindings.update(zip(variables, map(term, solution)))
+            yield FrozenBindings(ctx, solutionBindings)
+
+
 def evalExtend(ctx, extend):
     # TODO: Deal with dict returned from evalPart from GROUP BY
 
@@ -109,9 +218,47 @@ def evalJoin(ctx, join):
     if join.lazy:
         return evalLazyJoin(ctx, join)
     else:
-        a = evalPart(ctx, join.p1)
-        b = set(evalPart(ctx, join.p2))
-        return _join(a, b)
+        a = list(evalPart(ctx, join.p1))
+        b = list(set(evalPart(ctx, join.p2)))
+        return _hashJoin(a, b)
+
+
+def _hashJoin(a, b):
+    """
+    Join two lists of solutions by hashing the smaller one on the shared variables
+
+    The variables bound in every solution of both lists are used as key, other
+    shared variables are compared for the solutions with the same key. Without
+    such variables every pair of solutions is compared.
+    """
+    if not a or not b:
+        return
+
+    keys = None
+    for row in itertools.chain(a, b):
+        keys = set(row) if keys is None else keys.intersection(row)
+        if not keys:
+            break
+
+    if not keys:
+        for x in a:
+            for y in b:
+                if x.compatible(y):
+                    yield x.merge(y)
+        return
+
+    keys = list(keys)
+    swapped = len(a) > len(b)
+    build, probe = (b, a) if swapped else (a, b)
+
+    index = collections.defaultdict(list)
+    for row in build:
+        index[tuple(row[k] for k in keys)].append(row)
+
+    for row in probe:
+        for other in index.get(tuple(row[k] for k in keys), ()):
+            if row.compatible(other):
+                yield row.merge(other) if swapped else other.merge(row)
 
 
 def evalUnion(ctx, union):
@@ -220,10 +367,22 @@ def evalPart(ctx, part):
             pass  # the given custome-function did not handle this part
 
     if part.name == 'BGP':
-        # Reorder triples patterns by number of bound nodes in the current ctx
-        # Do patterns with more bound nodes first
-        triples = sorted(part.triples, key=lambda t: len([n for n in t if ctx[n] is None]))
+        statistics = getattr(ctx._dataset, 'statistics', None)
+        if statistics is not None:
+            statistics = statistics(
+                None if ctx.graph is ctx._dataset else ctx.graph.identifier
+            )
+        if statistics is not None:
+            # Order triple patterns by their estimated number of solutions in the queried graph
+            triples = orderTriples(part.triples, statistics, lambda n: ctx[n])
+        else:
+            # Reorder triples patterns by number of bound nodes in the current ctx
+            # Do patterns with more bound nodes first
+            triples = sorted(part.triples, key=lambda t: len([n for n in t if ctx[n] is None]))
 
+        indexed = evalIndexedBGP(ctx, triples)
+        if indexed is not None:
+            return indexed
         return evalBGP(ctx, triples)
     elif part.name == 'Filter':
         return evalFilter(ctx, part)
@@ -317,35 +476,68 @@ def evalAggregateJoin(ctx, agg):
         yield FrozenBindings(ctx)
 
 
-def evalOrderBy(ctx, part):
+class _OrderKey(object):
+    """
+    The values of all ORDER BY conditions of a row, compared in their direction
+    """
+
+    __slots__ = ('values', 'descending')
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __lt__(self, other):
+        for a, b, descending in zip(self.values, other.values, self.descending):
+            if a < b:
+                return not descending
+            if b < a:
+                return descending
+        return False
+
+
+def evalOrderBy(ctx, part, limit=None):
+    """
+    Sort the solutions by one precomputed key per row
+
+    If a limit is given, only the first rows are kept while the solutions are
+    consumed, thus they are never materialized.
+    """
 
     res = evalPart(ctx, part.p)
 
-    for e in reversed(part.expr):
+    descending = [bool(e.order and e.order == 'DESC') for e in part.expr]
 
-        reverse = bool(e.order and e.order == 'DESC')
-        res = sorted(res, key=lambda x: _val(value(x, e.expr, variables=True)), reverse=reverse)
+    def key(x):
+        return _OrderKey(
+            [_val(value(x, e.expr, variables=True)) for e in part.expr], descending)
 
-    return res
+    if limit is not None:
+        return heapq.nsmallest(limit, res, key=key)
+    return sorted(res, key=key)
+
+
+def _evalTopK(ctx, part, limit):
+    """
+    Evaluate the ORDER BY below a slice with a bounded heap, if there is one
+    """
+    if part.name == 'OrderBy':
+        return evalOrderBy(ctx, part, limit)
+    if part.name == 'Project' and part.p.name == 'OrderBy':
+        return (row.project(part.PV) for row in evalOrderBy(ctx, part.p, limit))
+    return None
 
 
 def evalSlice(ctx, slice):
-    # import pdb; pdb.set_trace()
-    res = evalPart(ctx, slice.p)
-    i = 0
-    while i < slice.start:
-        next(res)
-        i += 1
-    i = 0
-    for x in res:
-        i += 1
-        if slice.length is None:
-            yield x
-        else:
-            if i <= slice.length:
-                yield x
-            else:
-                break
+    res = None
+    if slice.length is not None:
+        res = _evalTopK(ctx, slice.p, slice.start + slice.length)
+    if res is None:
+        res = evalPart(ctx, slice.p)
+
+    end = None if slice.length is None else slice.start + slice.length
+    for x in itertools.islice(res, slice.start, end):
+        yield x
 
 
 def evalReduced(ctx, part):
@@ -440,6 +632,33 @@ def evalConstructQuery(ctx, query):
 
     return res
 
+
+def evalConstructQueryTriples(ctx, query):
+    """
+    Generate the triples of a CONSTRUCT query while the solutions are produced
+
+    Duplicates are only suppressed within a window of the most recently
+    generated triples, thus the memory needed does not grow with the result.
+    """
+    template = query.template
+
+    if not template:
+        # a construct-where query
+        template = query.p.p.triples  # query->project->bgp ...
+
+    # most recently generated triples, the oldest one is dropped first
+    recent = collections.OrderedDict()
+
+    for c in evalPart(ctx, query.p):
+        for triple in _fillTemplate(template, c):
+            if triple in recent:
+                recent.move_to_end(triple)
+                continue
+            yield triple
+            recent[triple] = None
+            if len(recent) > CONSTRUCT_WINDOW:
+                recent.popitem(last=False)
+
 def evalService(ctx, part):
 
     srv = service.get(part.term)
@@ -452,6 +671,19 @@ def evalService(ctx, part):
             yield x
 
 def evalQuery(graph, query, initBindings, base=None):
+    ctx = _queryContext(graph, query, initBindings)
+    return evalPart(ctx, query.algebra)
+
+
+def evalConstructTriples(graph, query, initBindings={}):
+    """
+    Generate the triples of a CONSTRUCT query one by one instead of collecting them in a graph
+    """
+    ctx = _queryContext(graph, query, initBindings)
+    return evalConstructQueryTriples(ctx, query.algebra)
+
+
+def _queryContext(graph, query, initBindings):
 
     initBindings = dict( ( Variable(k),v ) for k,v in iteritems(initBindings) )
 
@@ -484,4 +716,4 @@ def evalQuery(graph, query, initBindings, base=None):
                 g = d.named
                 ctx.load(g, default=False)
 
-    return evalPart(ctx, main)
+    return ctx
@@ -1,11 +1,29 @@
 from rdflib.plugin import register
+from rdflib.parser import Parser
 from rdflib.serializer import Serializer
+from rdflib.store import Store
 from rdflib.query import Processor, UpdateProcessor, ResultSerializer
 
 register(
     'nquad-ordered', Serializer,
     'quit.plugins.serializers.nquadsordered', 'OrderedNQuadsSerializer')
 
+register(
+    'nquad-canonical', Parser,
+    'quit.plugins.parsers.nquads', 'CanonicalNQuadsParser')
+
+register(
+    'QuitSQLite', Store,
+    'quit.plugins.stores.sqlitestore', 'SQLiteStore')
+
+register(
+    'QuitCompact', Store,
+    'quit.plugins.stores.compactstore', 'CompactStore')
+
+register(
+    'QuitIndex', Store,
+    'quit.plugins.stores.indexstore', 'IndexStore')
+
 register(
     'sparql', Processor,
     'quit.tools.processor', 'SPARQLProcessor')
@@ -0,0 +1,134 @@
+"""Statistics of graphs used to order the triple patterns of basic graph patterns.
+
+The statistics are counts of the triples of a graph: the number of triples and distinct subjects
+and objects in total and per predicate as well as the number of instances per class. They are used
+to estimate the number of solutions of a triple pattern. Statistics of several graphs are combined
+by adding the counts, thus the distinct counts of combined statistics are upper bounds.
+"""
+
+from collections import Counter, defaultdict
+from rdflib import BNode, Variable
+from rdflib.namespace import RDF
+from rdflib.paths import Path
+
+__all__ = ['Statistics', 'BOUND', 'orderTriples']
+
+# placeholder for a variable which is bound by an earlier pattern to a yet unknown value
+BOUND = object()
+
+
+class Statistics(object):
+    """Counts of the triples of graphs to estimate the cardinality of triple patterns."""
+
+    def __init__(self):
+        self.triples = 0
+        self.subjects = 0
+        self.objects = 0
+        # predicate -> [triples, distinct subjects, distinct objects]
+        self.predicates = {}
+        self.classes = Counter()
+
+    @classmethod
+    def fromGraphs(cls, graphs):
+        """Count the triples of the given graphs.
+
+        The distinct counts are computed for each graph and added up.
+        """
+        return cls.combine(cls.fromTriples(graph.triples((None, None, None))) for graph in graphs)
+
+    @classmethod
+    def fromTriples(cls, triples):
+        """Count the given triples."""
+        statistics = cls()
+        sizes = Counter()
+        subjects = defaultdict(set)
+        objects = defaultdict(set)
+        for s, p, o in triples:
+            sizes[p] += 1
+            subjects[p].add(s)
+            objects[p].add(o)
+            if p == RDF.type:
+                statistics.classes[o] += 1
+
+        statistics.triples = sum(sizes.values())
+        statistics.subjects = len(set().union(*subjects.values()))
+        statistics.objects = len(set().union(*objects.values()))
+        for p, size in sizes.items():
+            statistics.predicates[p] = [size, len(subjects[p]), len(objects[p])]
+        return statistics
+
+    @classmethod
+    def combine(cls, statistics):
+        """Add up the counts of several statistics."""
+        result = cls()
+        for other in statistics:
+            result.triples += other.triples
+            result.subjects += other.subjects
+            result.objects += other.objects
+            result.classes.update(other.classes)
+            for p, counts in other.predicates.items():
+                total = result.predicates.setdefault(p, [0, 0, 0])
+                for i, count in enumerate(counts):
+                    total[i] += count
+        return result
+
+    def estimate(self, s, p, o):
+        """Estimate the number of triples which match a triple pattern.
+
+        Args:
+            s, p, o: The value of a term, BOUND if the term is bound to an unknown value or None
+        Returns:
+            The estimated number of matching triples
+        """
+        if p is None or isinstance(p, Path):
+            size, subjects, objects = self.triples, self.subjects, self.objects
+        elif p is BOUND:
+            size = self.triples / max(len(self.predicates), 1)
+            subjects, objects = self.subjects, self.objects
+        else:
+            size, subjects, objects = self.predicates.get(p, (0, 0, 0))
+            if p == RDF.type and o is not None and o is not BOUND:
+                size, objects = self.classes.get(o, 0), 1
+
+        if s is not None:
+            size /= max(subjects, 1)
+        if o is not None:
+            size /= max(objects, 1)
+        return size
+
+
+def orderTriples(triples, statistics, value):
+    """Order triple patterns by their estimated number of solutions.
+
+    The pattern with the fewest estimated solutions is evaluated first. Afterwards patterns which
+    share a variable with the patterns before are preferred to avoid cartesian products.
+
+    Args:
+        triples: A list of triple patterns
+        statistics: The Statistics of the queried graph
+        value: A function which returns the value a term is bound to or None
+    Returns:
+        The list of ordered triple patterns
+    """
+    bound = set()
+    remaining = list(triples)
+    ordered = []
+
+    def variable(term):
+        return isinstance(term, (Variable, BNode))
+
+    def term(node):
+        if node in bound:
+            return BOUND
+        return value(node)
+
+    while remaining:
+        candidates = [t for t in remaining if any(
+            variable(n) and term(n) is not None for n in t
+        )] or remaining
+        triple = min(candidates, key=lambda t: statistics.estimate(*(term(n) for n in t)))
+        remaining.remove(triple)
+        ordered.append(triple)
+        bound.update(n for n in triple if variable(n))
+
+    return ordered
@@ -24,11 +24,19 @@ def _append(dct, identifier, action, items):
         dct[identifier] = changes
 
 
+def _editContext(ctx, g):
+    """
+    return the graph of the dataset which takes the changes to graph g
+    """
+    dataset = ctx.dataset
+    return getattr(dataset, 'edit_context', dataset.get_context)(g)
+
+
 def _graphOrDefault(ctx, g):
     if g == 'DEFAULT':
         return ctx.graph
     else:
-        return ctx.dataset.get_context(g)
+        return _editContext(ctx, g)
 
 
 def _graphAll(ctx, g):
@@ -38,12 +46,12 @@ def _graphAll(ctx, g):
     if g == 'DEFAULT':
         return [ctx.graph]
     elif g == 'NAMED':
-        return [c for c in ctx.dataset.contexts()
+        return [_editContext(ctx, c.identifier) for c in ctx.dataset.contexts()
                 if c.identifier != ctx.graph.identifier]
     elif g == 'ALL':
-        return list(ctx.dataset.contexts())
+        return [_editContext(ctx, c.identifier) for c in ctx.dataset.contexts()]
     else:
-        return [ctx.dataset.get_context(g)]
+        return [_editContext(ctx, g)]
 
 
 def evalLoad(ctx, u):
@@ -110,7 +118,7 @@ def evalInsertData(ctx, u):
     # add quads
     # u.quads is a dict of graphURI=>[triples]
     for g in u.quads:
-        cg = ctx.dataset.get_context(g)
+        cg = _editContext(ctx, g)
         filledq = list(filter(lambda triple: triple not in cg, u.quads[g]))
         if filledq:
             _append(res["delta"], cg.identifier, 'additions', filledq)
@@ -137,7 +145,7 @@ def evalDeleteData(ctx, u):
     # remove quads
     # u.quads is a dict of graphURI=>[triples]
     for g in u.quads:
-        cg = ctx.dataset.get_context(g)
+        cg = _editContext(ctx, g)
         filledq = list(filter(lambda triple: triple in cg, u.quads[g]))
         if filledq:
             _append(res["delta"], cg.identifier, 'removals', filledq)
@@ -168,7 +176,7 @@ def evalDeleteWhere(ctx, u):
         g -= filled
 
         for g in u.quads:
-            cg = ctx.dataset.get_context(c.get(g))
+            cg = _editContext(ctx, c.get(g))
             filledq, filledq_delta = tee(_fillTemplate(u.quads[g], c))
             _append(res["delta"], cg.identifier, 'removals', list(filledq_delta))
             cg -= filledq
@@ -212,7 +220,7 @@ def evalModify(ctx, u):
     # clause."
     graphName = 'default'
     if not u.using and u.withClause:
-        g = ctx.dataset.get_context(u.withClause)
+        g = _editContext(ctx, u.withClause)
         graphName = str(g.identifier)
         ctx = ctx.pushGraph(g)
 
@@ -222,7 +230,7 @@ def evalModify(ctx, u):
         if otherDefault:
             ctx = originalctx  # restore original default graph
         if u.withClause:
-            g = ctx.dataset.get_context(u.withClause)
+            g = _editContext(ctx, u.withClause)
             graphName = str(g.identifier)
             ctx = ctx.pushGraph(g)
 
@@ -234,7 +242,7 @@ def evalModify(ctx, u):
             dg -= filled
 
             for g, q in u.delete.quads.items():
-                cg = ctx.dataset.get_context(c.get(g))
+                cg = _editContext(ctx, c.get(g))
                 filledq, filledq_delta = tee(_fillTemplate(q, c))
                 _append(res["delta"], cg.identifier, 'removals', list(filledq_delta))
                 cg -= filledq
@@ -245,7 +253,7 @@ def evalModify(ctx, u):
             dg += filled
 
             for g, q in u.insert.quads.items():
-                cg = ctx.dataset.get_context(c.get(g))
+                cg = _editContext(ctx, c.get(g))
                 filledq, filledq_delta = tee(_fillTemplate(q, c))
                 _append(res["delta"], cg.identifier, 'additions', list(filledq_delta))
                 cg += filledq
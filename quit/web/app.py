@@ -1,3 +1,4 @@
+import atexit
 import sys
 import urllib
 import hashlib
@@ -13,7 +14,7 @@ from flask_cors import CORS
 from jinja2 import Environment, contextfilter, Markup
 
 from quit.conf import Feature as QuitFeature
-from quit.core import MemoryStore, Quit
+from quit.core import MemoryStore, PersistentStore, Quit
 from quit.git import Repository
 import quit.utils as utils
 
@@ -116,11 +117,15 @@ def register_app(app, config):
     repository = Repository(config.getRepoPath(), create=True, garbageCollection=garbageCollection)
     bindings = config.getBindings()
 
-    quit = Quit(config, repository, MemoryStore(bindings))
+    if config.getStoreMode() == 'sqlite':
+        store = PersistentStore(repository.internal_path('store.sqlite'), bindings)
+    else:
+        store = MemoryStore(bindings)
+
+    quit = Quit(config, repository, store)
+    atexit.register(quit.close)
     quit.syncAll()
 
-    content = quit.store.store.serialize(format='trig').decode()
-    logger.debug("Initialize store with following content: {}".format(content))
     logger.debug("Initialize store with following graphs: {}".format(
         quit.config.getgraphurifilemap())
     )
@@ -1,3 +1,4 @@
+import json
 import sys
 import traceback
 
@@ -57,3 +58,18 @@ def blame(branch_or_ref):
         current_app.logger.error(e)
         current_app.logger.error(traceback.format_exc())
         return "<pre>" + traceback.format_exc() + "</pre>", 400
+
+
+@debug.route("/caches", methods=['GET'])
+def caches():
+    """Get the counters of the caches of the store.
+
+    Returns:
+        HTTP Response 200: a JSON object with the entries, bytes, hits, misses and evictions of
+        each cache
+    """
+    quit = current_app.config['quit']
+
+    response = make_response(json.dumps(quit.cacheStats(), sort_keys=True), 200)
+    response.headers['Content-Type'] = 'application/json'
+    return response
@@ -2,14 +2,18 @@ import traceback
 import re
 
 import logging
+from itertools import chain
 from werkzeug.http import parse_accept_header, parse_options_header
-from flask import Blueprint, request, current_app, make_response, Markup
+from flask import Blueprint, Response, request, current_app, make_response, Markup
 from pyparsing import ParseException
 from rdflib import ConjunctiveGraph
 from rdflib.plugins.sparql.parser import parseQuery, parseUpdate
-from rdflib.plugins.sparql.algebra import translateQuery, translateUpdate
+from rdflib.plugins.sparql.algebra import translateQuery, translateUpdate, traverse
+from rdflib.plugins.sparql.parserutils import CompValue
+from quit.cache import Cache
 from quit.conf import Feature
 from quit.helpers import isAbsoluteUri
+from quit.plugins.serializers.results import streaming
 from quit.web.app import render_template, feature_required
 from quit.exceptions import UnSupportedQueryType
 
@@ -42,28 +46,77 @@ rdfMimetypes = {
 }
 
 
+# the first keyword after the prologue tells whether a request is a query or an update
+r_keyword = re.compile(
+    r'(?:\s|#[^\n]*|PREFIX\s+[^\s:]*:\s*<[^>]*>|BASE\s*<[^>]*>)*([A-Za-z]+)', re.IGNORECASE
+)
+queryKeywords = {'SELECT', 'CONSTRUCT', 'DESCRIBE', 'ASK'}
+
+# translated queries and updates by (query, base)
+parsedQueries = Cache(capacity=1000)
+
+# algebra whose result changes each time a query is evaluated
+volatileAlgebra = {
+    'Builtin_NOW', 'Builtin_RAND', 'Builtin_UUID', 'Builtin_STRUUID', 'Builtin_BNODE',
+    'ServiceGraphPattern'
+}
+
+
+def _parse_query(query, base):
+    parsedQuery = parseQuery(query)
+    translatedQuery = translateQuery(parsedQuery, base=base)
+    # Check if BASE is absolute http(s) URI
+    for value in parsedQuery[0]:
+        if value.name == 'Base' and not isAbsoluteUri(value.iri):
+            raise UnSupportedQueryType()
+    return translatedQuery.algebra.name, translatedQuery
+
+
+def _parse_update(query, base):
+    parsedUpdate = parseUpdate(query)
+    translatedUpdate = translateUpdate(parsedUpdate, base=base)
+    # Check if BASE is absolute http(s) URI
+    for value in parsedUpdate.prologue[0]:
+        if value.name == 'Base' and not isAbsoluteUri(value.iri):
+            raise UnSupportedQueryType()
+    return parsedUpdate.request[0].name, translatedUpdate
+
+
+def is_cacheable(algebra):
+    """Check whether a query has the same result each time it is evaluated on the same data."""
+    volatile = []
+
+    def visit(node):
+        if isinstance(node, CompValue) and node.name in volatileAlgebra:
+            volatile.append(node)
+
+    traverse(algebra, visitPre=visit)
+    return not volatile
+
+
 def parse_query_type(query, base=None):
     try:
-        parsedQuery = parseQuery(query)
-        translatedQuery = translateQuery(parsedQuery, base=base)
-        # Check if BASE is absolute http(s) URI
-        for value in parsedQuery[0]:
-            if value.name == 'Base' and not isAbsoluteUri(value.iri):
-                raise UnSupportedQueryType()
-        return translatedQuery.algebra.name, translatedQuery
-    except ParseException:
+        return parsedQueries.get((query, base))
+    except KeyError:
         pass
 
-    try:
-        parsedUpdate = parseUpdate(query)
-        translatedUpdate = translateUpdate(parsedUpdate, base=base)
-        # Check if BASE is absolute http(s) URI
-        for value in parsedUpdate.prologue[0]:
-            if value.name == 'Base' and not isAbsoluteUri(value.iri):
-                raise UnSupportedQueryType()
-        return parsedUpdate.request[0].name, translatedUpdate
-    except ParseException:
-        raise UnSupportedQueryType
+    match = r_keyword.match(query)
+    if match and match.group(1).upper() not in queryKeywords:
+        parsers = [_parse_update, _parse_query]
+    else:
+        parsers = [_parse_query, _parse_update]
+
+    for parse in parsers:
+        try:
+            result = parse(query, base)
+        except ParseException:
+            continue
+        # blank nodes in update requests have to be new nodes for every request
+        if parse is _parse_query or ('_:' not in query and '[' not in query):
+            parsedQueries.set((query, base), result)
+        return result
+
+    raise UnSupportedQueryType
 
 
 @endpoint.route("/sparql", defaults={'branch_or_ref': None}, methods=['POST', 'GET'])
@@ -128,7 +181,9 @@ def sparql(branch_or_ref):
 
     try:
         queryType, parsedQuery = parse_query_type(query, quit.config.namespace)
-        graph = quit.instance(branch_or_ref)
+        commit = quit.repository.revision(branch_or_ref) if branch_or_ref else None
+        commit_id = commit.id if commit else None
+        graph = quit.instance(commit)
     except UnSupportedQueryType as e:
         logger.exception(e)
         return make_response('Unsupported Query Type', 400)
@@ -151,19 +206,22 @@ def sparql(branch_or_ref):
             # query ok, but unsupported query type or other problem during commit
             logger.exception(e)
             return make_response('Error after executing the update query.', 400)
-    elif queryType in ['SelectQuery', 'DescribeQuery', 'AskQuery', 'ConstructQuery']:
-        res = graph.query(parsedQuery)
-    else:
+    elif queryType not in ['SelectQuery', 'DescribeQuery', 'AskQuery', 'ConstructQuery']:
         logger.debug("Unsupported Type: {}".format(queryType))
         return make_response("Unsupported Query Type: {}".format(queryType), 400)
 
-    try:
-        if queryType in ['SelectQuery', 'AskQuery']:
-            return create_result_response(res, resultSetMimetypes[mimetype])
-        elif queryType in ['ConstructQuery', 'DescribeQuery']:
-            return create_result_response(res, rdfMimetypes[mimetype])
-    except KeyError as e:
-        return make_response("Mimetype: {} not acceptable".format(mimetype), 406)
+    # the result of a query never changes for a commit
+    key = None
+    if commit_id and is_cacheable(parsedQuery.algebra):
+        key = (commit_id, repr(parsedQuery.algebra))
+
+    def evaluate():
+        format = rdfMimetypes.get(mimetype, [None, None])[1]
+        if queryType == 'ConstructQuery' and format in streaming.tripleFormats:
+            return streaming.TripleResult(graph.construct(parsedQuery))
+        return graph.query(parsedQuery)
+
+    return query_response(quit, key, evaluate, queryType, mimetype)
 
 
 @endpoint.route("/provenance", methods=['POST', 'GET'])
@@ -199,26 +257,89 @@ def provenance():
         if queryType not in ['SelectQuery', 'AskQuery', 'ConstructQuery', 'DescribeQuery']:
             return make_response('Unsupported Query Type', 400)
 
-        res = graph.query(q)
+        # the provenance graph only changes if further commits are synchronized
+        key = None
+        if is_cacheable(parsedQuery.algebra):
+            key = ('provenance', quit.syncedCommits, repr(parsedQuery.algebra))
 
-        try:
-            if queryType in ['SelectQuery', 'AskQuery']:
-                return create_result_response(res, resultSetMimetypes[mimetype])
-            elif queryType in ['ConstructQuery', 'DescribeQuery']:
-                return create_result_response(res, rdfMimetypes[mimetype])
-        except KeyError as e:
-            return make_response("Mimetype: {} not acceptable".format(mimetype), 406)
+        return query_response(quit, key, lambda: graph.query(q), queryType, mimetype)
     else:
         if mimetype == 'text/html':
             return render_template('provenance.html')
 
 
-def create_result_response(res, mimetype):
-    """Create a response with the requested serialization."""
-    response = make_response(
-        res.serialize(format=mimetype[1]),
-        200
-    )
+def query_response(quit, key, evaluate, queryType, mimetype):
+    """Create a response with the serialized result of a query.
+
+    If the result cache is enabled, results are looked up and stored with the given key.
+
+    Args:
+        quit: The Quit object
+        key: A tuple identifying the result or None if the result must not be cached
+        evaluate: A function returning the result of the query
+        queryType: The name of the query algebra
+        mimetype: The requested mime type
+    """
+    if queryType in ['SelectQuery', 'AskQuery']:
+        mimetypes = resultSetMimetypes
+    else:
+        mimetypes = rdfMimetypes
+
+    if mimetype not in mimetypes:
+        return make_response("Mimetype: {} not acceptable".format(mimetype), 406)
+    mimetype = mimetypes[mimetype]
+
+    if key is None or quit.results is None:
+        return create_result_response(evaluate(), mimetype)
+
+    # mime types which share a format are cached separately to answer with the requested one
+    key = quit.results.key(*key, *mimetype)
+    try:
+        contentType, body = quit.results.get(key)
+    except KeyError:
+        return create_result_response(evaluate(), mimetype, quit.results, key)
+
+    response = make_response(body, 200)
+    response.headers['Content-Type'] = contentType
+    return response
+
+
+def _cached(chunks, cache, key, contentType):
+    """Pass the chunks of a result through and store the result if it fits into the cache."""
+    parts = []
+    size = 0
+    for chunk in chunks:
+        yield chunk
+        if parts is not None:
+            size += len(chunk)
+            if size > cache.budget:
+                parts = None
+            else:
+                parts.append(chunk)
+
+    if parts is not None:
+        cache.set(key, (contentType, b''.join(parts)))
+
+
+def create_result_response(res, mimetype, cache=None, key=None):
+    """Create a response with the requested serialization.
+
+    SELECT results are written while the query is evaluated if the format supports it.
+    """
+    chunks = streaming.serialize(res, mimetype[1])
+
+    if chunks is None:
+        body = res.serialize(format=mimetype[1])
+        if cache is not None:
+            cache.set(key, (mimetype[0], body))
+        response = make_response(body, 200)
+    else:
+        if cache is not None:
+            chunks = _cached(chunks, cache, key, mimetype[0])
+        # the first chunk is created upfront to report errors of the query with a status code
+        first = next(chunks, b'')
+        response = Response(chain([first], chunks), 200)
+
     response.headers['Content-Type'] = mimetype[0]
     return response
 
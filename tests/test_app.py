@@ -8,7 +8,9 @@ import quit.application as quitApp
 from quit.web.app import create_app
 import unittest
 from helpers import TemporaryRepository, TemporaryRepositoryFactory
+from quit.cache import ShardedFileReference
 import json
+from tempfile import TemporaryDirectory
 from helpers import createCommit, assertResultBindingsEqual
 
 
@@ -1556,6 +1558,185 @@ class QuitAppTestCase(unittest.TestCase):
                 "p": {'type': 'uri', 'value': 'urn:y'},
                 "o": {'type': 'uri', 'value': 'urn:z'}})
 
+    def testReloadPersistentStore(self):
+        """Test reload of quit store with a persistent internal store.
+
+        1. Start app with the sqlite store mode
+        2. Execute INSERT query
+        3. Restart app
+        4. Execute SELECT query against the provenance endpoint and expect both commits
+        """
+        # Prepate a git Repository
+        with TemporaryRepositoryFactory().withEmptyGraph("urn:graph") as repo:
+            # Start Quit
+            args = quitApp.parseArgs(
+                ['-t', repo.workdir, '-cm', 'graphfiles', '-sm', 'sqlite', '-f', 'provenance']
+            )
+            objects = quitApp.initialize(args)
+            config = objects['config']
+            app = create_app(config).test_client()
+
+            # execute INSERT DATA query
+            update = "INSERT DATA {graph <urn:graph> {<urn:x> <urn:y> <urn:z> .}}"
+            app.post('/sparql', data=dict(query=update))
+
+            self.assertTrue(path.isfile(path.join(repo.path, 'quit', 'store.sqlite')))
+
+            # reload the store
+            objects = quitApp.initialize(args)
+            config = objects['config']
+            newApp = create_app(config).test_client()
+
+            # execute SELECT query
+            select = "SELECT ?hex WHERE { ?commit <http://quit.aksw.org/vocab/hex> ?hex }"
+            select_resp = newApp.post(
+                '/provenance',
+                data=dict(query=select),
+                headers=dict(accept="application/sparql-results+json")
+            )
+
+            obj = json.loads(select_resp.data.decode("utf-8"))
+
+            self.assertEqual(len(obj["results"]["bindings"]), 2)
+
+    def testResultCache(self):
+        """Test that query results are cached per commit.
+
+        1. Start app with a result cache
+        2. Execute the same SELECT query twice and expect a cache hit
+        3. Execute INSERT query
+        4. Execute the SELECT query again and expect the new result
+        """
+        with TemporaryRepositoryFactory().withEmptyGraph("urn:graph") as repo, \
+                TemporaryDirectory() as spill:
+            args = quitApp.parseArgs(
+                ['-t', repo.workdir, '-cm', 'graphfiles', '-rc', '1M', '-rd', spill]
+            )
+            objects = quitApp.initialize(args)
+            config = objects['config']
+            app = create_app(config).test_client()
+            results = app.application.config['quit'].results
+
+            select = "SELECT ?o WHERE { graph <urn:graph> { <urn:x> <urn:y> ?o } }"
+            headers = dict(accept="application/sparql-results+json")
+            first = app.post('/sparql', data=dict(query=select), headers=headers).data
+            second = app.post('/sparql', data=dict(query=select), headers=headers)
+            self.assertEqual(first, second.data)
+            self.assertEqual(second.headers['Content-Type'], 'application/sparql-results+json')
+            self.assertEqual(results.stats['hits'], 1)
+
+            # the mime types share the JSON format but are answered with their own content type
+            plain = app.post(
+                '/sparql', data=dict(query=select), headers=dict(accept="application/json")
+            )
+            self.assertEqual(plain.headers['Content-Type'], 'application/json')
+            self.assertEqual(results.stats['hits'], 1)
+            second = app.post('/sparql', data=dict(query=select), headers=headers)
+            self.assertEqual(second.headers['Content-Type'], 'application/sparql-results+json')
+            self.assertEqual(results.stats['hits'], 2)
+
+            update = "INSERT DATA {graph <urn:graph> {<urn:x> <urn:y> <urn:z> .}}"
+            app.post('/sparql', data=dict(query=update))
+
+            select_resp = app.post('/sparql', data=dict(query=select), headers=headers)
+            obj = json.loads(select_resp.data.decode("utf-8"))
+            self.assertEqual(len(obj["results"]["bindings"]), 1)
+            self.assertEqual(results.stats['hits'], 2)
+
+    def testVolatileResultsAreNotCached(self):
+        """Test that results of queries which change on each evaluation are not cached."""
+        with TemporaryRepositoryFactory().withEmptyGraph("urn:graph") as repo:
+            args = quitApp.parseArgs(['-t', repo.workdir, '-cm', 'graphfiles', '-rc', '1M'])
+            objects = quitApp.initialize(args)
+            app = create_app(objects['config']).test_client()
+            results = app.application.config['quit'].results
+
+            headers = dict(accept="application/sparql-results+json")
+            for expression in ['NOW()', 'RAND()', 'UUID()', 'STRUUID()', 'BNODE()']:
+                select = "SELECT * WHERE {{ BIND({} AS ?value) }}".format(expression)
+                for i in range(2):
+                    app.post('/sparql', data=dict(query=select), headers=headers).data
+            self.assertEqual(results.stats['entries'], 0)
+            self.assertEqual(results.stats['hits'], 0)
+
+            select = "SELECT * WHERE { BIND(1 AS ?value) }"
+            for i in range(2):
+                app.post('/sparql', data=dict(query=select), headers=headers).data
+            self.assertEqual(results.stats['hits'], 1)
+
+    def testCacheStats(self):
+        """Test that the counters of the caches are available as JSON."""
+        with TemporaryRepositoryFactory().withEmptyGraph("urn:graph") as repo:
+            args = quitApp.parseArgs(['-t', repo.workdir, '-cm', 'graphfiles'])
+            objects = quitApp.initialize(args)
+            app = create_app(objects['config']).test_client()
+
+            app.post('/sparql', data=dict(query="SELECT * WHERE { ?s ?p ?o }"),
+                     headers=dict(accept="application/sparql-results+json"))
+            response = app.get('/caches')
+            self.assertEqual(response.headers['Content-Type'], 'application/json')
+            stats = json.loads(response.data.decode("utf-8"))
+            self.assertIn('blob', stats)
+            self.assertEqual(stats['instance']['entries'], 1)
+            self.assertNotIn('result', stats)
+
+    def testShardedGraphFile(self):
+        """Test that updates of a sharded graph file only rewrite the affected shards.
+
+        1. Prepare a git repository with a graph split into two shards
+        2. Start Quit
+        3. Execute INSERT DATA query
+        4. Execute SELECT query and check the shards in the new commit
+        """
+        lineA = '<http://ex.org/a> <http://ex.org/p> <http://ex.org/o> <http://example.org/> .'
+        lineB = '<http://ex.org/b> <http://ex.org/p> <http://ex.org/o> <http://example.org/> .'
+        lineC = '<http://ex.org/c> <http://ex.org/p> <http://ex.org/o> <http://example.org/> .'
+        shardA = ShardedFileReference.shard(lineA)
+        shardB = ShardedFileReference.shard(lineB)
+        shardC = ShardedFileReference.shard(lineC)
+
+        with TemporaryRepository() as repo:
+            os.mkdir(path.join(repo.workdir, 'graph.nq.d'))
+            with open(path.join(repo.workdir, 'graph.nq.d.graph'), 'w') as graphFile:
+                graphFile.write('http://example.org/')
+            for shard, line in ((shardA, lineA), (shardB, lineB)):
+                with open(path.join(repo.workdir, 'graph.nq.d', shard), 'a') as shardFile:
+                    shardFile.write(line + '\n')
+
+            index = repo.index
+            index.read()
+            index.add('graph.nq.d.graph')
+            index.add('graph.nq.d/' + shardA)
+            index.add('graph.nq.d/' + shardB)
+            index.write()
+            author = Signature('QuitStoreTest', 'quit@quit.aksw.org')
+            repo.create_commit('HEAD', author, author, 'init', index.write_tree(), [])
+            initial = repo.revparse_single('HEAD')
+
+            # Start Quit
+            args = quitApp.parseArgs(['-t', repo.workdir, '-cm', 'graphfiles'])
+            objects = quitApp.initialize(args)
+            config = objects['config']
+            app = create_app(config).test_client()
+
+            # execute INSERT DATA query
+            update = "INSERT DATA {graph <http://example.org/> {<http://ex.org/c> <http://ex.org/p> <http://ex.org/o> .}}"
+            app.post('/sparql', data=dict(query=update))
+
+            # execute SELECT query
+            select = "SELECT ?s WHERE {graph <http://example.org/> {?s ?p ?o .}} ORDER BY ?s"
+            select_resp = app.post('/sparql', data=dict(query=select), headers=dict(accept="application/sparql-results+json"))
+            obj = json.loads(select_resp.data.decode("utf-8"))
+            self.assertEqual([binding['s']['value'] for binding in obj["results"]["bindings"]],
+                             ['http://ex.org/a', 'http://ex.org/b', 'http://ex.org/c'])
+
+            head = repo.revparse_single('HEAD')
+            self.assertNotIn('graph.nq', head.tree)
+            self.assertIn(lineC, head.tree['graph.nq.d/' + shardC].data.decode().splitlines())
+            for shard in set((shardA, shardB)) - set((shardC,)):
+                self.assertEqual(head.tree['graph.nq.d/' + shard].id,
+                                 initial.tree['graph.nq.d/' + shard].id)
+
     def testRepoDataAfterInitWithEmptyContent(self):
         """Test file content from newly created app, starting with an empty graph.
 
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
+import marshal
 import unittest
 from context import quit
-from quit.cache import Cache, FileReference
-from os import path, environ
+from quit.cache import BlobCache, BlobHistory, BloomFilter, Cache, CommitIndex, FileReference
+from quit.cache import ResultCache, ShardedFileReference
+from rdflib import ConjunctiveGraph, Literal, URIRef
+from os import path, environ, utime
 from pygit2 import init_repository, Repository, clone_repository
 from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE, Signature
 from tempfile import TemporaryDirectory, NamedTemporaryFile
@@ -48,6 +51,250 @@ class CacheTests(unittest.TestCase):
         self.assertEqual(cache.size, 1)
 
 
+    def testBudget(self):
+        cache = Cache(budget=10, sizeof=len)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        cache.get('a')
+        cache.set('c', 'cccc')
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.bytes, 8)
+
+        cache.set('d', 'd' * 11)
+        self.assertNotIn('d', cache)
+        self.assertEqual(cache.size, 2)
+
+    def testEvictionsAreLogged(self):
+        cache = Cache(capacity=1, name='test')
+        cache.set('a', 1)
+        with self.assertLogs('quit.cache', level='DEBUG') as logs:
+            cache.set('b', 2)
+        self.assertIn('test cache', logs.output[0])
+        self.assertIn("'evictions': 1", logs.output[0])
+
+    def testBloomFilter(self):
+        bloom = BloomFilter(hash(('value', i)) for i in range(1000))
+        self.assertTrue(all(hash(('value', i)) in bloom for i in range(1000)))
+        falsePositives = sum(hash(('other', i)) in bloom for i in range(10000))
+        self.assertLess(falsePositives, 300)
+        self.assertNotIn(hash('value'), BloomFilter([]))
+
+    def testStats(self):
+        cache = Cache(capacity=1)
+        cache.set('a', 1)
+        cache.get('a')
+        with self.assertRaises(KeyError):
+            cache.get('b')
+        cache.set('b', 2)
+
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertEqual(cache.stats['evictions'], 1)
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testKey(self):
+        self.assertEqual(ResultCache.key('abc', 'query', 'json'),
+                         ResultCache.key('abc', 'query', 'json'))
+        self.assertNotEqual(ResultCache.key('abc', 'query', 'json'),
+                            ResultCache.key('abc', 'query', 'xml'))
+
+    def testSpill(self):
+        cache = ResultCache(budget=10, path=self.dir.name)
+        cache.set('a' * 40, ('text/csv', b'12345678'))
+        cache.set('b' * 40, ('text/csv', b'1234'))
+        cache.set('c' * 40, ('text/csv', b'123456789012'))
+
+        self.assertNotIn('a' * 40, cache)
+        self.assertEqual(cache.get('a' * 40), ('text/csv', b'12345678'))
+        self.assertEqual(cache.get('c' * 40), ('text/csv', b'123456789012'))
+        self.assertEqual(cache.stats['hits'], 2)
+        with self.assertRaises(KeyError):
+            cache.get('d' * 40)
+
+    def testSpillBudget(self):
+        value = ('text/csv', b'12345678')
+        cache = ResultCache(budget=10, path=self.dir.name, diskBudget=2 * len(marshal.dumps(value)))
+        for key in 'abcd':
+            cache.set(key * 40, value)
+
+        # the least recently spilled result exceeds the disk budget
+        self.assertEqual(list(cache._files()), ['b' * 40, 'c' * 40])
+        self.assertFalse(path.exists(path.join(self.dir.name, 'aa', 'a' * 38)))
+        with self.assertRaises(KeyError):
+            cache.get('a' * 40)
+
+        # a result loaded back into memory is removed from the directory
+        self.assertEqual(cache.get('c' * 40), value)
+        self.assertFalse(path.exists(path.join(self.dir.name, 'cc', 'c' * 38)))
+        self.assertEqual(list(cache._files()), ['b' * 40, 'd' * 40])
+
+        # a new cache finds the files of the directory
+        files = ResultCache(budget=10, path=self.dir.name)._files()
+        self.assertEqual(sorted(files), ['b' * 40, 'd' * 40])
+
+    def testWithoutSpill(self):
+        cache = ResultCache(budget=10)
+        cache.set('a' * 40, ('text/csv', b'12345678'))
+        cache.set('b' * 40, ('text/csv', b'1234'))
+
+        with self.assertRaises(KeyError):
+            cache.get('a' * 40)
+        self.assertEqual(cache.get('b' * 40), ('text/csv', b'1234'))
+
+
+class CommitIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.path = path.join(self.dir.name, 'quit', 'commits')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testAddCommit(self):
+        index = CommitIndex()
+        index.add("abc")
+        self.assertIn("abc", index)
+        self.assertNotIn("def", index)
+        self.assertEqual(len(index), 1)
+
+    def testPersistence(self):
+        index = CommitIndex(self.path)
+        index.add("abc")
+        index.set_ref("refs/heads/master", "abc")
+        index.set_ref("refs/heads/master", "def")
+
+        index = CommitIndex(self.path)
+        self.assertIn("abc", index)
+        self.assertEqual(index.ref("refs/heads/master"), "def")
+        self.assertIsNone(index.ref("refs/heads/develop"))
+
+    def testClear(self):
+        index = CommitIndex(self.path)
+        index.add("abc")
+        index.set_ref("refs/heads/master", "abc")
+        index.clear()
+
+        index = CommitIndex(self.path)
+        self.assertNotIn("abc", index)
+        self.assertIsNone(index.ref("refs/heads/master"))
+
+
+class BlobHistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.path = path.join(self.dir.name, 'quit', 'history')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testChanges(self):
+        history = BlobHistory()
+        history.add("c1", [("a.nq", "a1", None), ("b.nq", "b1", None)])
+        history.add("c2", [("a.nq", "a2", "a1")])
+        history.add("c3", [])
+
+        self.assertEqual(history.changes("c2"), {"a.nq": ("a2", "a1")})
+        self.assertEqual(history.changes("c3"), {})
+        self.assertIsNone(history.changes("c4"))
+        self.assertEqual(history.previous("a.nq", "c2"), "a1")
+        self.assertIsNone(history.previous("a.nq", "c1"))
+        self.assertIsNone(history.previous("b.nq", "c2"))
+        self.assertEqual(history.commits("a.nq"), ["c1", "c2"])
+        self.assertEqual(history.commits("b.nq"), ["c1"])
+        self.assertIn("c3", history)
+
+    def testPersistence(self):
+        history = BlobHistory(self.path)
+        history.add("c1", [("a.nq", "a1", None)])
+        history.add("c2", [("a.nq", "a2", "a1")])
+        history.add("c2", [("a.nq", "a2", "a1")])
+
+        history = BlobHistory(self.path)
+        self.assertEqual(history.changes("c1"), {"a.nq": ("a1", None)})
+        self.assertEqual(history.commits("a.nq"), ["c1", "c2"])
+
+    def testFingerprint(self):
+        history = BlobHistory(self.path, "map1")
+        history.add("c1", [("a.nq", "a1", None)])
+        self.assertIn("c1", BlobHistory(self.path, "map1"))
+
+        # the paths were recorded for another mapping of graph files
+        history = BlobHistory(self.path, "map2")
+        self.assertNotIn("c1", history)
+        self.assertFalse(history.valid)
+        history.add("c2", [("b.nq", "b1", None)])
+        self.assertTrue(history.valid)
+
+        history = BlobHistory(self.path, "map2")
+        self.assertNotIn("c1", history)
+        self.assertEqual(history.changes("c2"), {"b.nq": ("b1", None)})
+
+
+class BlobCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testRoundTrip(self):
+        content = (
+            '<http://ex.org/a> <http://ex.org/b> "x"@en <http://ex.org/g1> .\n'
+            '<http://ex.org/a> <http://ex.org/b> "1"^^<http://www.w3.org/2001/XMLSchema#integer> '
+            '<http://ex.org/g1> .\n'
+            '_:b1 <http://ex.org/b> <http://ex.org/c> <http://ex.org/g2> .\n'
+        )
+        graph = ConjunctiveGraph()
+        graph.parse(data=content, format='nquads')
+
+        cache = BlobCache(self.dir.name)
+        self.assertIsNone(cache.get('0123456789abcdef'))
+        cache.set('0123456789abcdef', graph)
+
+        loaded = BlobCache(self.dir.name).get('0123456789abcdef')
+        self.assertEqual(set(loaded.quads((None, None, None, None))),
+                         set(graph.quads((None, None, None, None))))
+        g1 = loaded.get_context(URIRef('http://ex.org/g1'))
+        self.assertIn((URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('x', lang='en')),
+                      g1)
+        self.assertEqual(len(g1), 2)
+
+    def testCorruptEntry(self):
+        cache = BlobCache(self.dir.name)
+        cache.set('0123456789abcdef', ConjunctiveGraph())
+        with open(path.join(self.dir.name, '01', '23456789abcdef'), 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(cache.get('0123456789abcdef'))
+
+    def testBudget(self):
+        graph = ConjunctiveGraph()
+        graph.add((URIRef('http://ex.org/a'), URIRef('http://ex.org/b'), Literal('x')))
+        BlobCache(self.dir.name).set('aaaa', graph)
+        size = path.getsize(path.join(self.dir.name, 'aa', 'aa'))
+
+        cache = BlobCache(self.dir.name, budget=3 * size - 1)
+        cache.set('bbbb', graph)
+        utime(path.join(self.dir.name, 'aa', 'aa'), (1, 1))
+        utime(path.join(self.dir.name, 'bb', 'bb'), (2, 2))
+        # loading a file marks it as recently used
+        self.assertIsNotNone(cache.get('aaaa'))
+
+        cache.set('cccc', graph)
+        self.assertIn('aaaa', cache)
+        self.assertNotIn('bbbb', cache)
+        self.assertIn('cccc', cache)
+
+
 class FileReferenceTests(unittest.TestCase):
     def setUp(self):
         pass
@@ -55,6 +302,52 @@ class FileReferenceTests(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def testUnsortedContent(self):
+        f = FileReference('graph.nq', 'c .\na .\nb .\na .')
+        self.assertEqual(f.content, 'a .\nb .\nc .')
+
+    def testAddAndRemove(self):
+        f = FileReference('graph.nq', 'a .\nc .\ne .')
+        f.add('d .')
+        f.add('a .')
+        f.remove('c .')
+        f.remove('x .')
+        f.extend(['b .', 'f .'])
+        f.remove('f .')
+        self.assertEqual(f.size, len('a .\nb .\nd .\ne .\n'))
+        self.assertEqual(f.content, 'a .\nb .\nd .\ne .')
+
+        f.remove('d .')
+        f.add('c .')
+        self.assertEqual(f.content, 'a .\nb .\nc .\ne .')
+
+    def testLazyContent(self):
+        loads = []
+
+        def load():
+            loads.append(True)
+            return 'a .\nc .'
+
+        f = FileReference('graph.nq', load, 8)
+        self.assertEqual(f.size, 8)
+        self.assertEqual(loads, [])
+
+        f.add('b .')
+        self.assertEqual(loads, [True])
+        self.assertEqual(f.size, len('a .\nb .\nc .\n'))
+        self.assertEqual(f.content, 'a .\nb .\nc .')
+        self.assertEqual(loads, [True])
+
+    def testShardedFiles(self):
+        line = '<urn:x> <urn:y> <urn:z> <urn:g> .'
+        f = ShardedFileReference('graph')
+        f.add(line)
+        name = path.join('graph', ShardedFileReference.shard(line))
+        self.assertEqual(f.files(), [(name, line)])
+        self.assertEqual(f.files(), [(name, line)])
+        f.reset()
+        self.assertEqual(f.files(), [])
+
 
 def main():
     unittest.main()
@@ -173,6 +173,36 @@ class TestConfiguration(unittest.TestCase):
         allFiles = conf.getgraphsfromdir()
         self.assertEqual(sorted(allFiles), sorted(['config.ttl', 'example1.nq', 'example2.nt', 'example3.nq']))
 
+    def testCacheSizeConfig(self):
+        conf = QuitConfiguration(configfile=self.localConfigFile, namespace=self.ns)
+        self.assertIsNone(conf.getBlobCacheSize())
+        self.assertIsNone(conf.getCommitCacheSize())
+        self.assertIsNone(conf.getDiskCacheSize())
+        self.assertIsNone(conf.getResultCacheSize())
+        self.assertIsNone(conf.getResultCacheDir())
+        self.assertIsNone(conf.getResultCacheDirSize())
+
+        conf = QuitConfiguration(
+            configfile=self.localConfigFile, namespace=self.ns, blobcache='512M', commitcache=1024,
+            diskcache=0, resultcache='64M', resultcachedir='/tmp/results', resultcachedirsize='1G'
+        )
+        self.assertEqual(conf.getBlobCacheSize(), 512 * 1024 * 1024)
+        self.assertEqual(conf.getCommitCacheSize(), 1024)
+        self.assertEqual(conf.getDiskCacheSize(), 0)
+        self.assertEqual(conf.getResultCacheSize(), 64 * 1024 * 1024)
+        self.assertEqual(conf.getResultCacheDir(), '/tmp/results')
+        self.assertEqual(conf.getResultCacheDirSize(), 1024 * 1024 * 1024)
+
+    def testParsersConfig(self):
+        conf = QuitConfiguration(configfile=self.localConfigFile, namespace=self.ns)
+        self.assertEqual(conf.getParsers(), 1)
+
+        conf = QuitConfiguration(configfile=self.localConfigFile, namespace=self.ns, parsers=0)
+        self.assertEqual(conf.getParsers(), 0)
+
+        with self.assertRaises(InvalidConfigurationError):
+            QuitConfiguration(configfile=self.localConfigFile, namespace=self.ns, parsers=-1)
+
     def testGraphConfigDefaultMode(self):
         conf = QuitConfiguration(configfile=self.localConfigFile, namespace=self.ns)
 
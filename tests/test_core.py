@@ -6,13 +6,19 @@ import stat
 import time
 import unittest
 from context import quit
+from unittest import mock
 import quit.core
 import quit.git
+import quit.tools.evaluate as evaluate
+from quit.conf import Feature, QuitConfiguration
 from quit.graphs import InMemoryAggregatedGraph
+from quit.namespace import PROV, QUIT
+from quit.plugins.stores.indexstore import IndexStore, termHash
+from helpers import TemporaryRepositoryFactory, createCommit
 from os import path, environ
 from pygit2 import init_repository, Repository, clone_repository
 from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE, Signature
-from rdflib import Graph, URIRef
+from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
 from tempfile import TemporaryDirectory, NamedTemporaryFile
 
 
@@ -41,6 +47,170 @@ class MemoryStoreTests(unittest.TestCase):
         pass
 
 
+class PersistentStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.path = path.join(self.dir.name, 'store.sqlite')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testQuadsSurviveReopen(self):
+        store = quit.core.PersistentStore(self.path)
+        g = store.store
+        g.addN([
+            (URIRef('urn:x'), URIRef('urn:y'), Literal('z', lang='en'), Graph(identifier='urn:g1')),
+            (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'), Graph(identifier='urn:g2')),
+        ])
+        g.commit()
+        g.close()
+
+        store = quit.core.PersistentStore(self.path)
+        g = store.store
+        self.assertTrue(store.persistent)
+        self.assertEqual(len(g), 2)
+        self.assertEqual(
+            set(c.identifier for c in g.contexts()), {URIRef('urn:g1'), URIRef('urn:g2')}
+        )
+        self.assertIn(
+            (URIRef('urn:x'), URIRef('urn:y'), Literal('z', lang='en')),
+            g.get_context(URIRef('urn:g1'))
+        )
+        self.assertEqual(len(g.get_context(URIRef('urn:g2'))), 1)
+        self.assertEqual(g.store.namespace('prov'), URIRef('http://www.w3.org/ns/prov#'))
+
+    def testRemove(self):
+        g = quit.core.PersistentStore(self.path).store
+        g.addN([
+            (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'), Graph(identifier='urn:g1')),
+            (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'), Graph(identifier='urn:g2')),
+        ])
+        g.remove((URIRef('urn:x'), None, None, Graph(identifier='urn:g1')))
+
+        self.assertEqual(len(g.get_context(URIRef('urn:g1'))), 0)
+        self.assertEqual(len(g.get_context(URIRef('urn:g2'))), 1)
+
+    def testTriplesAreFetchedInBatches(self):
+        g = quit.core.PersistentStore(self.path).store
+        g.store.FETCH_SIZE = 3
+        g.addN(
+            (URIRef('urn:s{}'.format(i)), URIRef('urn:p'), URIRef('urn:o'), context)
+            for i in range(10)
+            for context in (Graph(identifier='urn:g1'), Graph(identifier='urn:g2'))
+        )
+
+        triples = g.store.triples((None, URIRef('urn:p'), None))
+        first, contexts = next(triples)
+        # a nested pattern is evaluated while the outer one is still open
+        self.assertEqual(len(list(g.store.triples((first[0], None, None)))), 1)
+        rest = [(triple, len(list(contexts))) for triple, contexts in triples]
+        self.assertEqual(len(list(contexts)), 2)
+        self.assertEqual(len(rest), 9)
+        self.assertTrue(all(count == 2 for triple, count in rest))
+
+    def testQuitDoesNotResyncAfterRestart(self):
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            config = QuitConfiguration(
+                configmode='graphfiles', features=Feature.Provenance, targetdir=repo.workdir,
+                namespace='http://quit.instance/'
+            )
+            config.initgraphconfig()
+            repository = quit.git.Repository(repo.workdir)
+            store = quit.core.PersistentStore(repository.internal_path('store.sqlite'))
+            instance = quit.core.Quit(config, repository, store)
+            instance.syncAll()
+            store.store.close()
+
+            store = quit.core.PersistentStore(repository.internal_path('store.sqlite'))
+            restarted = quit.core.Quit(config, repository, store)
+            restarted.changeset = lambda commit, delta=None: self.fail("commit synced again")
+            restarted.syncAll()
+
+            head = repo.revparse_single('HEAD').hex
+            result = store.store.query(
+                "ASK { ?commit <http://quit.aksw.org/vocab/hex> ?hex }",
+                initBindings={'hex': Literal(head)}
+            )
+            self.assertTrue(result.askAnswer)
+
+    def testCommitIndexLivesInPersistentStore(self):
+        """Test that a new or deleted database is synchronized even if another run synced before."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            repository = quit.git.Repository(repo.workdir)
+            config = QuitConfiguration(
+                configmode='graphfiles', features=Feature.Unknown, targetdir=repo.workdir,
+                namespace='http://quit.instance/'
+            )
+            config.initgraphconfig()
+            quit.core.Quit(config, repository, quit.core.MemoryStore()).syncAll()
+
+            config = QuitConfiguration(
+                configmode='graphfiles', features=Feature.Provenance, targetdir=repo.workdir,
+                namespace='http://quit.instance/'
+            )
+            config.initgraphconfig()
+            head = repo.revparse_single('HEAD').hex
+            query = "ASK { ?commit <http://quit.aksw.org/vocab/hex> ?hex }"
+            for attempt in range(2):
+                store = quit.core.PersistentStore(repository.internal_path('store.sqlite'))
+                quit.core.Quit(config, repository, store).syncAll()
+                result = store.store.query(query, initBindings={'hex': Literal(head)})
+                self.assertTrue(result.askAnswer)
+                store.store.close()
+                os.remove(repository.internal_path('store.sqlite'))
+
+    def testSwitchingStoreModes(self):
+        """Test that a persistent store only skips the commits it synchronized itself."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            repository = quit.git.Repository(repo.workdir)
+
+            def run(store, features):
+                config = QuitConfiguration(
+                    configmode='graphfiles', features=features, targetdir=repo.workdir,
+                    namespace='http://quit.instance/'
+                )
+                config.initgraphconfig()
+                instance = quit.core.Quit(config, repository, store)
+                synced = []
+                changeset = instance.changeset
+                instance.changeset = lambda commit, delta=None: (
+                    synced.append(commit.id), changeset(commit, delta)
+                )
+                instance.syncAll()
+                return synced
+
+            def persistentStore():
+                return quit.core.PersistentStore(repository.internal_path('store.sqlite'))
+
+            first = repo.revparse_single('HEAD').hex
+            store = persistentStore()
+            self.assertEqual(run(store, Feature.Provenance), [first])
+            store.store.close()
+
+            # a memory store does not share the index of the persistent store
+            self.assertEqual(run(quit.core.MemoryStore(), Feature.Unknown), [first])
+
+            with open(path.join(repo.workdir, "graph.nq"), "a") as graphFile:
+                graphFile.write("\n<urn:x> <urn:y> <urn:a> <http://example.org/> .")
+            createCommit(repo)
+            second = repo.revparse_single('HEAD').hex
+            self.assertEqual(run(quit.core.MemoryStore(), Feature.Unknown), [second])
+
+            # the persistent store resumes behind the commit it synchronized itself
+            store = persistentStore()
+            self.assertEqual(run(store, Feature.Provenance), [second])
+            result = store.store.query(
+                "ASK { ?commit <http://quit.aksw.org/vocab/hex> ?hex }",
+                initBindings={'hex': Literal(second)}
+            )
+            self.assertTrue(result.askAnswer)
+            store.store.close()
+
+
 class VirtualGraphTests(unittest.TestCase):
     SELECT = """SELECT ?g ?s ?p ?o WHERE {GRAPH ?g {?s ?p ?o}}"""
     INSERT = """INSERT DATA {
@@ -107,6 +277,336 @@ class QuitTests(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def _quit(self, repo, features=Feature.Unknown, **kwargs):
+        config = QuitConfiguration(
+            configmode='graphfiles', features=features, targetdir=repo.workdir,
+            namespace='http://quit.instance/', **kwargs
+        )
+        config.initgraphconfig()
+        repository = quit.git.Repository(repo.workdir)
+        return quit.core.Quit(config, repository, quit.core.MemoryStore())
+
+    def testSyncAllSkipsSyncedHistory(self):
+        """Test that a second synchronization does not walk the already synced commits again."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            instance = self._quit(repo, Feature.Provenance)
+            instance.syncAll()
+
+            head = repo.revparse_single('HEAD').hex
+            self.assertIn(head, instance._synced)
+            self.assertEqual(instance._synced.ref('refs/heads/master'), head)
+
+            synced = []
+            instance.changeset = lambda commit, delta=None: synced.append(commit.id)
+            instance.syncAll()
+            self.assertEqual(synced, [])
+
+            with open(path.join(repo.workdir, "graph.nq"), "a") as graphFile:
+                graphFile.write("\n<urn:x> <urn:y> <urn:a> <http://example.org/> .")
+            createCommit(repo)
+
+            instance.syncAll()
+            self.assertEqual(synced, [repo.revparse_single('HEAD').hex])
+
+    def testCommitIndexIsPersistedWithoutStoreFeatures(self):
+        """Test that the commit index is only persisted if the store content is reproducible."""
+        with TemporaryRepositoryFactory().withGraph("http://example.org/") as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+            self.assertTrue(path.isfile(path.join(repo.path, 'quit', 'commits')))
+
+            restarted = self._quit(repo)
+            self.assertIn(repo.revparse_single('HEAD').hex, restarted._synced)
+
+            restarted = self._quit(repo, Feature.Provenance)
+            self.assertEqual(len(restarted._synced), 0)
+
+    def testLineDiff(self):
+        """Test that the changes of a commit are taken from the diff of the graph files."""
+        graphContent = (
+            "<urn:x> <urn:y> <urn:z> <http://example.org/> .\n"
+            "<urn:x> <urn:y> _:b <http://example.org/> .\n"
+            "_:b <urn:y> \"a\" <http://example.org/> ."
+        )
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            with open(path.join(repo.workdir, "graph.nq"), "w") as graphFile:
+                graphFile.write(
+                    "<urn:x> <urn:y> <urn:a> <http://example.org/> .\n"
+                    "<urn:x> <urn:y> _:c <http://example.org/> .\n"
+                    "_:c <urn:y> \"b\" <http://example.org/> ."
+                )
+            createCommit(repo)
+
+            instance = self._quit(repo)
+            commit = instance.repository.revision('HEAD')
+            delta = instance._linediff(commit.parents[0], commit)
+
+            changes = dict(delta[URIRef('http://example.org/')])
+            self.assertIn((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:a')),
+                          changes['additions'])
+            self.assertIn((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')),
+                          changes['removals'])
+            self.assertEqual(len(changes['additions']), 2)
+            self.assertEqual(len(changes['removals']), 2)
+            self.assertIn(Literal('b'), set(o for s, p, o in changes['additions']))
+            self.assertIn(Literal('a'), set(o for s, p, o in changes['removals']))
+
+    def testChangesetOnlyDescribesChangedFiles(self):
+        """Test that only blobs which changed since the parent commit become new entities."""
+        graphs = {
+            'http://example.org/a/': '<urn:x> <urn:y> <urn:z> <http://example.org/a/> .',
+            'http://example.org/b/': '<urn:x> <urn:y> <urn:z> <http://example.org/b/> .'
+        }
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            with open(path.join(repo.workdir, 'graph_1.nq'), 'a') as graphFile:
+                graphFile.write('\n<urn:x> <urn:y> <urn:a> <http://example.org/b/> .')
+            createCommit(repo)
+
+            instance = self._quit(repo, Feature.Provenance)
+            instance.syncAll()
+
+            head = repo.revparse_single('HEAD')
+            parent = head.parents[0]
+            g = instance.store.store
+            entities = set(g.subjects(PROV['wasGeneratedBy'], QUIT['commit-' + head.hex]))
+            self.assertEqual(entities, set([QUIT['graph-{}-0'.format(head.tree['graph_1.nq'].hex)]]))
+            self.assertIn(
+                (QUIT['graph-{}-0'.format(head.tree['graph_1.nq'].hex)], PROV['wasDerivedFrom'],
+                 QUIT['graph-{}-0'.format(parent.tree['graph_1.nq'].hex)]),
+                g
+            )
+            entities = set(g.subjects(PROV['wasGeneratedBy'], QUIT['commit-' + parent.hex]))
+            self.assertEqual(len(entities), 2)
+
+            self.assertEqual(instance.getCommitsForFile('graph_1.nq'), [parent.hex, head.hex])
+            self.assertEqual(instance.getCommitsForFile('graph_0.nq'), [parent.hex])
+
+    def testDiscardedHistoryIsRebuilt(self):
+        """Test that the changed files of synced commits are indexed again without a history."""
+        graphs = {
+            'http://example.org/a/': '<urn:x> <urn:y> <urn:z> <http://example.org/a/> .',
+            'http://example.org/b/': '<urn:x> <urn:y> <urn:z> <http://example.org/b/> .'
+        }
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            with open(path.join(repo.workdir, 'graph_1.nq'), 'a') as graphFile:
+                graphFile.write('\n<urn:x> <urn:y> <urn:a> <http://example.org/b/> .')
+            createCommit(repo)
+            head = repo.revparse_single('HEAD')
+            expected = [head.parents[0].hex, head.hex]
+
+            self._quit(repo).syncAll()
+
+            # the mapping of graph files changed, thus the history is discarded
+            with mock.patch.object(quit.core.Quit, '_fileMapFingerprint', return_value='other'):
+                instance = self._quit(repo)
+            instance.syncAll()
+            self.assertEqual(instance.getCommitsForFile('graph_1.nq'), expected)
+
+            os.remove(instance.repository.internal_path('history'))
+            instance = self._quit(repo)
+            instance.syncAll()
+            self.assertEqual(instance.getCommitsForFile('graph_1.nq'), expected)
+
+    def testInstanceGraphsAreHeldByBlobCache(self):
+        """Test that the instance cache does not keep graphs evicted from the blob cache."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            instance = self._quit(repo)
+            commit = instance.repository.revision(repo.revparse_single('HEAD').hex)
+
+            first = instance.instance(commit).store.graphs()
+            for blob in instance.getFilesForCommit(commit):
+                instance._blobs.remove(blob)
+            second = instance.instance(commit).store.graphs()
+
+            self.assertEqual(instance._instances.stats['hits'], 1)
+            self.assertEqual(first, second)
+            self.assertIsNot(first[0], second[0])
+
+    def testInstanceIsCachedPerCommit(self):
+        """Test that the graphs of an instance are reused until the branch moves."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+
+            first = instance.instance('master')
+            second = instance.instance(repo.revparse_single('HEAD').hex)
+            self.assertEqual(instance._instances.stats['hits'], 1)
+            self.assertEqual(first.store.graphs(), second.store.graphs())
+            self.assertIsNot(first.store, second.store)
+
+            with open(path.join(repo.workdir, "graph.nq"), "a") as graphFile:
+                graphFile.write("\n<urn:x> <urn:y> <urn:a> <http://example.org/> .")
+            createCommit(repo)
+
+            dataset = instance.instance('master').store
+            self.assertIn(
+                (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:a')),
+                dataset.get_context(URIRef('http://example.org/'))
+            )
+
+    def testStatisticsPerBlob(self):
+        """Test that the statistics of a dataset are computed once per blob."""
+        graphContent = """
+            <urn:x> <urn:y> <urn:z> <http://example.org/> .
+            <urn:x> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <urn:C> <http://example.org/> .
+            <urn:a> <urn:y> <urn:z> <http://example.org/> ."""
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+
+            dataset = instance.instance('master').store
+            statistics = dataset.statistics(URIRef('http://example.org/'))
+            self.assertEqual(statistics.triples, 3)
+            self.assertEqual(dataset.statistics().triples, 3)
+            self.assertEqual(statistics.predicates[URIRef('urn:y')], [2, 2, 1])
+            self.assertEqual(statistics.classes[URIRef('urn:C')], 1)
+
+            instance.instance(repo.revparse_single('HEAD').hex).store.statistics()
+            self.assertEqual(instance._commitStatistics.stats['hits'], 1)
+            self.assertEqual(instance._commitStatistics.stats['misses'], 1)
+            self.assertIsNone(instance.instance().store.statistics())
+
+    def testStatisticsAreReadFromIndexFiles(self):
+        """Test that the statistics of a commit are read from the index files of its blobs."""
+        graphs = {
+            'urn:graph{}'.format(i): '<urn:x> <urn:y> <urn:z{}> <urn:graph{}> .'.format(i, i)
+            for i in range(3)
+        }
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+
+            commit = instance.repository.revision(repo.revparse_single('HEAD').hex)
+            with mock.patch.object(quit.core.Statistics, 'fromGraphs') as fromGraphs:
+                statistics = instance.getStatistics(commit)
+            fromGraphs.assert_not_called()
+            self.assertEqual(len(statistics), 3)
+            predicates = statistics[URIRef('urn:graph0')].predicates
+            self.assertEqual(predicates[URIRef('urn:y')], [1, 1, 1])
+
+    def testFiltersAreReadFromIndexFiles(self):
+        """Test that the term filters of a commit are read from the index files of its blobs."""
+        graphs = {
+            'urn:graph{}'.format(i): '<urn:x> <urn:y> <urn:z{}> <urn:graph{}> .'.format(i, i)
+            for i in range(3)
+        }
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+
+            commit = instance.repository.revision(repo.revparse_single('HEAD').hex)
+            graphs, filters = instance._graphsForCommit(commit)
+            with mock.patch.object(quit.core, 'termFilter') as termFilter:
+                blooms = [getFilter() for getFilter in filters]
+            termFilter.assert_not_called()
+            self.assertEqual(instance._filters.size, 0)
+            for graph, bloom in zip(graphs, blooms):
+                self.assertIn(termHash(2, graph.value(URIRef('urn:x'), URIRef('urn:y'))), bloom)
+                self.assertNotIn(termHash(2, URIRef('urn:missing')), bloom)
+
+    def testDefaultGraphBGP(self):
+        """Test which basic graph patterns of a dataset are evaluated on term ids."""
+        graphs = {
+            'urn:g1': '<urn:a> <urn:b> <urn:c> <urn:g1> .',
+            'urn:g2': '<urn:c> <urn:d> <urn:e> <urn:g2> .'
+        }
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+            graph = instance.instance('master')
+
+            calls = []
+            evalBGP = evaluate.evalBGP
+            evaluate.evalBGP = lambda ctx, bgp: calls.append(bgp) or evalBGP(ctx, bgp)
+            try:
+                # the default graph is not the union of the graphs of the dataset
+                result = graph.query('SELECT * WHERE { ?s <urn:b> ?o . ?o <urn:d> ?x }')
+                self.assertEqual(list(result), [])
+                self.assertEqual(len(calls), 1)
+
+                result = graph.query(
+                    'SELECT ?g1 ?g2 WHERE { GRAPH ?g1 { ?s <urn:b> ?o } '
+                    'GRAPH ?g2 { ?o <urn:d> ?x } }'
+                )
+                self.assertEqual(list(result), [(URIRef('urn:g1'), URIRef('urn:g2'))])
+                self.assertEqual(len(calls), 1)
+            finally:
+                evaluate.evalBGP = evalBGP
+
+    def testUpdateKeepsParentInstance(self):
+        """Test that an update does not change the dataset of the commit it was applied to."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            instance = self._quit(repo)
+            instance.syncAll()
+            parent = repo.revparse_single('HEAD').hex
+
+            graph = instance.instance(parent)
+            res = graph.update(
+                "INSERT DATA { GRAPH <http://example.org/> { <urn:x> <urn:y> <urn:a> } }"
+            )
+            instance.commit(graph, res, 'Insert', parent, 'refs/heads/master')
+
+            triple = (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:a'))
+            context = URIRef('http://example.org/')
+            self.assertIn(triple, instance.instance('master').store.get_context(context))
+            self.assertNotIn(triple, instance.instance(parent).store.get_context(context))
+
+    def testInstanceFromPersistedContexts(self):
+        """Test that an instance reads the contexts written by the Persistence feature."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            instance = self._quit(repo, Feature.Persistence)
+            instance.syncAll()
+
+            dataset = instance.instance(repo.revparse_single('HEAD').hex).store
+            self.assertIn(
+                (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')),
+                dataset.get_context(URIRef('http://example.org/'))
+            )
+
+    def testParallelParsing(self):
+        """Test that the graph files of a revision can be parsed in a process pool."""
+        graphs = {
+            'http://example.org/{}/'.format(i):
+                '<urn:x> <urn:y> "{0}" <http://example.org/{0}/> .'.format(i)
+            for i in range(3)
+        }
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            instance = self._quit(repo, parsers=2)
+            self.assertEqual(instance._parsers, 2)
+
+            dataset = instance.instance(repo.revparse_single('HEAD').hex).store
+            self.assertIsNotNone(instance._pool)
+            self.assertEqual(instance._prefetched, {})
+            for i in range(3):
+                context = dataset.get_context(URIRef('http://example.org/{}/'.format(i)))
+                self.assertIn((URIRef('urn:x'), URIRef('urn:y'), Literal(str(i))), context)
+
+            instance.close()
+            self.assertIsNone(instance._pool)
+
+    def testBlobsAreParsedIntoIndexFiles(self):
+        """Test that parsed graph files are only kept as index files, with or without disk cache."""
+        graphContent = "<urn:x> <urn:y> <urn:z> <http://example.org/> ."
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            for diskcache in (None, 0):
+                instance = self._quit(repo, diskcache=diskcache)
+                commit = instance.repository.revision(repo.revparse_single('HEAD').hex)
+                blob = next(iter(instance.getFilesForCommit(commit)))
+                f, contexts = instance.getFileReferenceAndContext(blob, commit)
+                context = next(c for c in contexts if c.identifier == URIRef('http://example.org/'))
+                self.assertIsInstance(context.store, IndexStore)
+                self.assertIn((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')), context)
+                # the packed data kept in memory counts toward the budget of the blob cache
+                size = context.store.size
+                self.assertEqual(quit.core._blobSize((f, contexts)), f.size + size)
+                if diskcache == 0:
+                    self.assertGreaterEqual(size, len(quit.core._parseBlob(graphContent)))
+
 
 class SeveralOldTest(unittest.TestCase):
     """Sort these test according to their corresponding classes."""
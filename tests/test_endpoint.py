@@ -122,5 +122,31 @@ class QuitEndpointTestCase(unittest.TestCase):
 
         self.assertRaises(UnSupportedQueryType, ep.parse_query_type, update, 'http://argument/')
 
+    def testParsedQueryCache(self):
+        ep = endpoint
+        select = "SELECT * WHERE { ?s ?p ?o }"
+        update = "INSERT DATA { <urn:1> <urn:2> <urn:3> }"
+        bnodes = "INSERT DATA { <urn:1> <urn:2> _:b }"
+
+        self.assertIs(ep.parse_query_type(select)[1], ep.parse_query_type(select)[1])
+        self.assertIs(ep.parse_query_type(update)[1], ep.parse_query_type(update)[1])
+        self.assertIsNot(ep.parse_query_type(bnodes)[1], ep.parse_query_type(bnodes)[1])
+        self.assertIsNot(
+            ep.parse_query_type(select)[1], ep.parse_query_type(select, 'http://argument/')[1]
+        )
+
+    def testKeyword(self):
+        ep = endpoint
+        keywords = {
+            "SELECT * WHERE { ?s ?p ?o }": 'SELECT',
+            "# comment\nPREFIX ex: <http://ex.org/>\nBASE <http://ex.org/> ask { }": 'ask',
+            "PREFIX : <http://ex.org/> INSERT DATA { <1> <2> <3> }": 'INSERT',
+            "  \n delete where { ?s ?p ?o }": 'delete'
+        }
+
+        for query, expected in keywords.items():
+            self.assertEqual(ep.r_keyword.match(query).group(1), expected)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import unittest
+from collections import Counter
+from context import quit
+import quit.tools.evaluate as evaluate
+from quit.tools.processor import SPARQLProcessor
+from rdflib import ConjunctiveGraph, Literal, URIRef, Variable
+from rdflib.paths import Path
+from rdflib.plugins.sparql.evalutils import _join
+from rdflib.plugins.sparql.sparql import FrozenBindings, QueryContext
+
+
+class EvaluateTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = ConjunctiveGraph()
+        for i in range(100):
+            s = URIRef('urn:s{}'.format(i))
+            self.graph.add((s, URIRef('urn:group'), Literal(i % 3)))
+            self.graph.add((s, URIRef('urn:value'), Literal(i)))
+
+    def tearDown(self):
+        pass
+
+    def _select(self, query):
+        res = SPARQLProcessor(self.graph).query(query)
+        return [[row.get(v) for v in res['vars_']] for row in res['bindings']]
+
+    def testTopK(self):
+        query = """SELECT ?s ?g ?v WHERE { ?s <urn:group> ?g ; <urn:value> ?v }
+                   ORDER BY DESC(?g) ?v"""
+        expected = self._select(query)
+        self.assertEqual(len(expected), 100)
+        self.assertEqual(expected[0][1:], [Literal(2), Literal(2)])
+
+        # the heap is used instead of sorting all solutions
+        calls = []
+        nsmallest = evaluate.heapq.nsmallest
+        evaluate.heapq.nsmallest = lambda n, *args, **kwargs: calls.append(n) or nsmallest(
+            n, *args, **kwargs)
+        try:
+            self.assertEqual(self._select(query + ' LIMIT 5'), expected[:5])
+            self.assertEqual(self._select(query + ' LIMIT 5 OFFSET 10'), expected[10:15])
+        finally:
+            evaluate.heapq.nsmallest = nsmallest
+        self.assertEqual(calls, [5, 15])
+
+    def testHashJoin(self):
+        ctx = QueryContext(initBindings={})
+        a = [FrozenBindings(ctx, {Variable('x'): Literal(i), Variable('y'): Literal(i % 5)})
+             for i in range(20)]
+        b = [FrozenBindings(ctx, {Variable('y'): Literal(i)}) for i in range(3)]
+        # ?x is shared but only bound in some of the solutions
+        b += [FrozenBindings(ctx, {Variable('y'): Literal(1), Variable('x'): Literal(i)})
+              for i in range(3)]
+        for left, right in ((a, b), (b, a)):
+            expected = Counter(_join(left, right))
+            self.assertEqual(sum(expected.values()), 13)
+            self.assertEqual(Counter(evaluate._hashJoin(left, right)), expected)
+
+    def testCartesianProduct(self):
+        ctx = QueryContext(initBindings={})
+        a = [FrozenBindings(ctx, {Variable('x'): Literal(i)}) for i in range(4)]
+        b = [FrozenBindings(ctx, {Variable('y'): Literal(i)}) for i in range(3)]
+        result = list(evaluate._hashJoin(a, b))
+        self.assertEqual(len(result), 12)
+        self.assertEqual(set(result), set(_join(a, b)))
+        self.assertEqual(list(evaluate._hashJoin(a, [])), [])
+
+    def testJoinQuery(self):
+        query = """SELECT ?s ?v ?o WHERE { ?s <urn:group> ?g { ?s <urn:value> ?v }
+                   OPTIONAL { ?s <urn:other> ?o } }"""
+        self.graph.add((URIRef('urn:s1'), URIRef('urn:other'), Literal('x')))
+        result = self._select(query)
+        self.assertEqual(len(result), 100)
+        self.assertIn([URIRef('urn:s1'), Literal(1), Literal('x')], result)
+
+    def testIndexedBGP(self):
+        data = ''.join(
+            '<urn:s{0}> <urn:group> "{1}" <urn:g> .\n'
+            '<urn:s{0}> <urn:next> <urn:s{2}> <urn:g> .\n'.format(i, i % 3, (i + 1) % 10)
+            for i in range(10)
+        ) + '<urn:s0> <urn:self> <urn:s0> <urn:g> .\n<urn:s1> <urn:self> <urn:s2> <urn:g> .\n'
+        expected = ConjunctiveGraph()
+        expected.parse(data=data, format='nquads')
+        graph = ConjunctiveGraph(store='QuitCompact')
+        graph.parse(data=data, format='nquads')
+
+        queries = [
+            'SELECT * WHERE { GRAPH <urn:g> { ?s <urn:group> ?g ; <urn:next> ?n . '
+            '?n <urn:group> ?g2 } }',
+            'SELECT * WHERE { GRAPH <urn:g> { ?s <urn:self> ?s } }',
+            'SELECT * WHERE { GRAPH <urn:g> { ?s <urn:next> [ <urn:group> "1" ] } }',
+            'SELECT * WHERE { GRAPH <urn:g> { ?s <urn:next> ?n OPTIONAL { ?n <urn:self> ?x } } }',
+            'SELECT * WHERE { VALUES ?s { <urn:s3> } GRAPH <urn:g> { ?s ?p ?o } }',
+            'SELECT * WHERE { GRAPH <urn:g> { ?s <urn:unknown> ?o } }',
+            'SELECT * WHERE { GRAPH <urn:g> { ?s <urn:next>/<urn:next> ?o } }',
+        ]
+
+        def select(graph, query):
+            return set(frozenset(row.items()) for row in
+                       SPARQLProcessor(graph).query(query)['bindings'])
+
+        for query in queries:
+            expectedResult = select(expected, query)
+            self.assertTrue(expectedResult or 'unknown' in query)
+
+            calls = []
+            evalBGP = evaluate.evalBGP
+            evaluate.evalBGP = lambda ctx, bgp: calls.append(bgp) or evalBGP(ctx, bgp)
+            try:
+                self.assertEqual(select(graph, query), expectedResult)
+            finally:
+                evaluate.evalBGP = evalBGP
+            # only the property path is not evaluated on the term ids
+            self.assertEqual(bool(calls), '/' in query)
+
+    def testOffsetBeyondSolutions(self):
+        query = "SELECT ?s WHERE { ?s <urn:value> ?v } ORDER BY ?v OFFSET 200"
+        self.assertEqual(self._select(query), [])
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,14 @@
 
 import unittest
 from context import quit
-from quit.graphs import RewriteGraph, CopyOnEditGraph
+from quit.graphs import RewriteGraph, CopyOnEditGraph, ShardedGraph
 from quit.graphs import InMemoryAggregatedGraph, InMemoryCopyOnEditAggregatedGraph
+from quit.graphs import termFilter
 from os import path, environ
 from pygit2 import init_repository, Repository, clone_repository
 from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE, Signature
 from rdflib import Graph, URIRef
+from rdflib.graph import ModificationException
 from tempfile import TemporaryDirectory, NamedTemporaryFile
 
 
@@ -19,13 +21,80 @@ class RewriteGraphTests(unittest.TestCase):
         pass
 
 
+class ShardedGraphTests(unittest.TestCase):
+    def testShards(self):
+        identifier = URIRef('urn:graph')
+        a = Graph(identifier=identifier)
+        a.add((URIRef('urn:a'), URIRef('urn:p'), URIRef('urn:o')))
+        b = Graph(identifier=identifier)
+        b.add((URIRef('urn:b'), URIRef('urn:p'), URIRef('urn:o')))
+        b.add((URIRef('urn:b'), URIRef('urn:p'), URIRef('urn:x')))
+
+        graph = ShardedGraph(identifier, [a, b])
+        self.assertEqual(len(graph), 3)
+        self.assertEqual(set(graph.subjects(URIRef('urn:p'), URIRef('urn:o'))),
+                         {URIRef('urn:a'), URIRef('urn:b')})
+        self.assertIn((URIRef('urn:b'), URIRef('urn:p'), URIRef('urn:x')), graph)
+        self.assertNotIn((URIRef('urn:a'), URIRef('urn:p'), URIRef('urn:x')), graph)
+        with self.assertRaises(ModificationException):
+            graph.add((URIRef('urn:c'), URIRef('urn:p'), URIRef('urn:o')))
+
+
 class CopyOnEditGraphTests(unittest.TestCase):
     def setUp(self):
-        pass
+        self.template = Graph(identifier=URIRef('urn:graph'))
+        self.template.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+        self.template.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:4')))
 
     def tearDown(self):
         pass
 
+    def testEditKeepsTemplate(self):
+        g = CopyOnEditGraph(self.template, store=Graph().store, identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5')))
+        g.remove((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+
+        self.assertEqual(len(self.template), 2)
+        self.assertEqual(len(g), 2)
+        self.assertEqual(set(g.objects(URIRef('urn:1'), URIRef('urn:2'))),
+                         set([URIRef('urn:4'), URIRef('urn:5')]))
+        self.assertIn((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5')), g)
+        self.assertNotIn((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')), g)
+
+        # reverting the changes empties the overlay
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+        g.remove((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5')))
+        self.assertEqual(len(g), 2)
+        self.assertEqual(len(g._added) + len(g._removed), 0)
+
+    def testRemovePattern(self):
+        g = CopyOnEditGraph(self.template, store=Graph().store, identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5')))
+        g.remove((URIRef('urn:1'), None, None))
+
+        self.assertEqual(len(g), 0)
+        self.assertEqual(len(self.template), 2)
+
+    def testUnwrap(self):
+        g = CopyOnEditGraph(self.template, store=Graph().store, identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5')))
+
+        unwrapped = g.unwrap()
+        self.assertEqual(len(unwrapped), 3)
+        self.assertEqual(len(g), 3)
+        self.assertEqual(len(self.template), 2)
+
+    def testDelta(self):
+        g = CopyOnEditGraph(self.template, store=Graph().store, identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5')))
+        template, added, removed = g.delta()
+        self.assertIs(template, self.template)
+        self.assertEqual(added, {(URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5'))})
+        self.assertEqual(removed, set())
+
+        g.unwrap()
+        self.assertIsNone(g.delta())
+
 
 class InMemoryAggregatedGraphTests(unittest.TestCase):
     def setUp(self):
@@ -73,6 +142,35 @@ class InMemoryAggregatedGraphTests(unittest.TestCase):
         self.assertEqual(len(g), 0)
         self.assertEqual(str(g.identifier), 'urn:graph')
 
+    def testSkipGraphsByFilter(self):
+        graphs = []
+        for i in range(10):
+            g = Graph(identifier='urn:graph{}'.format(i))
+            g.add((URIRef('urn:s{}'.format(i)), URIRef('urn:p'), URIRef('urn:o')))
+            graphs.append(g)
+
+        filters = [lambda bloom=termFilter(g): bloom for g in graphs]
+        iGraph = InMemoryAggregatedGraph(graphs=graphs, filters=filters)
+        searched = []
+
+        def spy(graph):
+            triples = graph.triples
+            graph.triples = lambda triple: searched.append(graph.identifier) or triples(triple)
+
+        for graph in graphs:
+            spy(graph)
+
+        triples = list(iGraph.triples((URIRef('urn:s3'), None, None)))
+        self.assertEqual(triples, [(URIRef('urn:s3'), URIRef('urn:p'), URIRef('urn:o'))])
+        self.assertLess(len(searched), 3)
+        self.assertEqual(len(list(iGraph.quads((None, URIRef('urn:p'), None)))), 10)
+        self.assertIn((URIRef('urn:s7'), URIRef('urn:p'), URIRef('urn:o')), iGraph)
+        self.assertNotIn((URIRef('urn:s7'), URIRef('urn:p'), URIRef('urn:s7')), iGraph)
+        contexts = iGraph.contexts((URIRef('urn:s5'), None, None))
+        self.assertEqual([c.identifier for c in contexts], [URIRef('urn:graph5')])
+        self.assertIs(iGraph.get_context(URIRef('urn:graph5')), graphs[5])
+        self.assertIs(iGraph.get_context('urn:graph5'), graphs[5])
+
 
 class InMemoryCopyOnEditAggregatedGraphTests(unittest.TestCase):
     def setUp(self):
@@ -81,6 +179,52 @@ class InMemoryCopyOnEditAggregatedGraphTests(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def testEditKeepsGraphs(self):
+        g = Graph(identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+
+        iGraph = InMemoryCopyOnEditAggregatedGraph(graphs=[g])
+        iGraph.addN([
+            (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:4'), iGraph.get_context(g.identifier)),
+            (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:5'), Graph(identifier='urn:other'))
+        ])
+        iGraph.remove((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+
+        self.assertEqual(len(g), 1)
+        self.assertEqual(len(iGraph), 2)
+        self.assertEqual(len(iGraph.contexts()), 2)
+        self.assertEqual(len(iGraph.get_context(URIRef('urn:graph'))), 1)
+        self.assertNotIn((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')), iGraph)
+
+    def testReadDoesNotCreateOverlay(self):
+        g = Graph(identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+
+        iGraph = InMemoryCopyOnEditAggregatedGraph(graphs=[g])
+        self.assertIs(iGraph.get_context(g.identifier), g)
+        self.assertEqual(iGraph.contexts(), [g])
+
+        overlay = iGraph.edit_context(g.identifier)
+        overlay.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:4')))
+        self.assertIs(iGraph.get_context(g.identifier), overlay)
+        self.assertEqual(len(g), 1)
+
+    def testEditAnEditedGraph(self):
+        g = Graph(identifier=URIRef('urn:graph'))
+        g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+
+        first = InMemoryCopyOnEditAggregatedGraph(graphs=[g])
+        first.edit_context(g.identifier).add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:4')))
+
+        second = InMemoryCopyOnEditAggregatedGraph(graphs=[first.get_context(g.identifier)])
+        overlay = second.edit_context(g.identifier)
+        overlay.remove((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+
+        self.assertIs(overlay._template, g)
+        self.assertEqual(len(overlay), 1)
+        self.assertEqual(len(first.get_context(g.identifier)), 2)
+        self.assertEqual(len(g), 1)
+
 
 def main():
     unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from quit.plugins.parsers.nquads import quads, UnusualLine
+from rdflib import ConjunctiveGraph, BNode, Literal, URIRef
+
+
+class CanonicalNQuadsParserTests(unittest.TestCase):
+    def setUp(self):
+        self.data = (
+            '<http://ex.org/a> <http://ex.org/p> "x\\n\\"y\\""@en <http://ex.org/g> .\n'
+            '<http://ex.org/a> <http://ex.org/p> "1"^^<http://www.w3.org/2001/XMLSchema#integer> '
+            '<http://ex.org/g> .\n'
+            '_:b1 <http://ex.org/p> <http://ex.org/o> <http://ex.org/g> .\n'
+            '<http://ex.org/a> <http://ex.org/p> _:b1 <http://ex.org/h> .\n'
+            '\n'
+            '<http://ex.org/a> <http://ex.org/p> "plain" .\n'
+        )
+
+    def tearDown(self):
+        pass
+
+    def _quads(self, graph):
+        return set((s, p, o, c.identifier) for s, p, o, c in graph.quads((None, None, None)))
+
+    def testQuads(self):
+        result = quads(self.data, URIRef('urn:default'))
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result[0], (
+            URIRef('http://ex.org/a'), URIRef('http://ex.org/p'), Literal('x\n"y"', lang='en'),
+            URIRef('http://ex.org/g')
+        ))
+        self.assertIsInstance(result[2][0], BNode)
+        self.assertEqual(result[2][0], result[3][2])
+        self.assertEqual(result[4][3], URIRef('urn:default'))
+
+    def testUnusualLine(self):
+        with self.assertRaises(UnusualLine):
+            quads('<http://ex.org/a>  <http://ex.org/p> <http://ex.org/o> .')
+        with self.assertRaises(UnusualLine):
+            quads('# comment')
+
+    def testSameResultAsRdflib(self):
+        # blank nodes and the default graph get new identifiers on each parse
+        data = self.data.replace('_:b1', '<urn:b1>').replace('"plain" .', '"plain" <urn:g> .')
+        expected = ConjunctiveGraph()
+        expected.parse(data=data, format='nquads')
+        graph = ConjunctiveGraph()
+        graph.parse(data=data, format='nquad-canonical')
+        self.assertEqual(self._quads(graph), self._quads(expected))
+
+    def testFallback(self):
+        data = '<http://ex.org/a>\t<http://ex.org/p> "a" <http://ex.org/g> . # comment\n'
+        graph = ConjunctiveGraph()
+        graph.parse(data=data, format='nquad-canonical')
+        self.assertEqual(self._quads(graph), set([(
+            URIRef('http://ex.org/a'), URIRef('http://ex.org/p'), Literal('a'),
+            URIRef('http://ex.org/g')
+        )]))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
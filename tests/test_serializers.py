@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import json
+import unittest
+from context import quit
+from quit.plugins.serializers.results import streaming
+from quit.tools.evaluate import evalConstructTriples
+from rdflib.plugins.sparql import prepareQuery
+from rdflib import ConjunctiveGraph, BNode, Literal, URIRef
+
+
+class StreamingResultSerializerTests(unittest.TestCase):
+    def setUp(self):
+        self.graph = ConjunctiveGraph()
+        for i in range(2500):
+            o = Literal('v"<&{}'.format(i), lang='en') if i % 2 else Literal(i)
+            self.graph.add((URIRef('urn:s{}'.format(i)), URIRef('urn:p'), o))
+        self.graph.add((BNode('b1'), URIRef('urn:p'), URIRef('urn:o')))
+        self.query = 'SELECT ?s ?o ?x WHERE { ?s <urn:p> ?o OPTIONAL { ?s <urn:q> ?x } }'
+
+    def tearDown(self):
+        pass
+
+    def _serialize(self, format):
+        chunks = list(streaming.serialize(self.graph.query(self.query), format))
+        self.assertGreater(len(chunks), 2)
+        return b''.join(chunks)
+
+    def testJSON(self):
+        expected = self.graph.query(self.query).serialize(format='json')
+        self.assertEqual(json.loads(self._serialize('json').decode('utf-8')),
+                         json.loads(expected.decode('utf-8')))
+
+    def testXML(self):
+        expected = self.graph.query(self.query).serialize(format='xml')
+        self.assertEqual(self._serialize('xml'), expected)
+
+    def testCSV(self):
+        expected = self.graph.query(self.query).serialize(format='csv')
+        self.assertEqual(self._serialize('csv'), expected)
+
+    def testConstruct(self):
+        query = 'CONSTRUCT { ?s <urn:q> ?o . <urn:all> <urn:q> <urn:o> } WHERE { ?s <urn:p> ?o }'
+        expected = self.graph.query(query).serialize(format='nt11')
+
+        triples = evalConstructTriples(self.graph, prepareQuery(query))
+        chunks = list(streaming.serialize(streaming.TripleResult(triples), 'nt11'))
+        self.assertGreater(len(chunks), 2)
+        lines = b''.join(chunks).splitlines()
+        self.assertEqual(len(lines), len(set(lines)))
+        self.assertEqual(set(lines), set(expected.splitlines()))
+
+    def testUnsupported(self):
+        self.assertIsNone(streaming.serialize(self.graph.query(self.query), 'html'))
+        self.assertIsNone(streaming.serialize(self.graph.query('ASK { ?s ?p ?o }'), 'json'))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+import quit.tools.evaluate as evaluate
+from quit.graphs import InMemoryAggregatedGraph
+from quit.tools.processor import SPARQLProcessor
+from quit.tools.statistics import Statistics, BOUND, orderTriples
+from rdflib import Graph, Literal, URIRef, Variable
+from rdflib.namespace import RDF
+
+
+class StatisticsTests(unittest.TestCase):
+    def setUp(self):
+        self.book = URIRef('urn:Book')
+        self.isbn = URIRef('urn:isbn')
+        self.graph = Graph(identifier=URIRef('urn:g'))
+        for i in range(50):
+            book = URIRef('urn:book{}'.format(i))
+            self.graph.add((book, RDF.type, self.book))
+            self.graph.add((book, self.isbn, Literal(str(i))))
+
+    def tearDown(self):
+        pass
+
+    def testFromTriples(self):
+        statistics = Statistics.fromGraphs([self.graph])
+        self.assertEqual(statistics.triples, 100)
+        self.assertEqual(statistics.subjects, 50)
+        self.assertEqual(statistics.objects, 51)
+        self.assertEqual(statistics.predicates[RDF.type], [50, 50, 1])
+        self.assertEqual(statistics.predicates[self.isbn], [50, 50, 50])
+        self.assertEqual(statistics.classes[self.book], 50)
+
+    def testCombine(self):
+        statistics = Statistics.combine([Statistics.fromGraphs([self.graph])] * 2)
+        self.assertEqual(statistics.triples, 200)
+        self.assertEqual(statistics.predicates[self.isbn], [100, 100, 100])
+        self.assertEqual(statistics.classes[self.book], 100)
+
+    def testEstimate(self):
+        statistics = Statistics.fromGraphs([self.graph])
+        self.assertEqual(statistics.estimate(None, None, None), 100)
+        self.assertEqual(statistics.estimate(None, RDF.type, self.book), 50)
+        self.assertEqual(statistics.estimate(None, RDF.type, URIRef('urn:Other')), 0)
+        self.assertEqual(statistics.estimate(None, self.isbn, Literal('1')), 1)
+        self.assertEqual(statistics.estimate(BOUND, RDF.type, None), 1)
+        self.assertEqual(statistics.estimate(None, URIRef('urn:unknown'), None), 0)
+
+    def testOrderTriples(self):
+        s, c, o = Variable('s'), Variable('c'), Variable('o')
+        triples = [(s, RDF.type, c), (s, self.isbn, o), (s, self.isbn, Literal('1'))]
+        statistics = Statistics.fromGraphs([self.graph])
+        ordered = orderTriples(triples, statistics, lambda n: None if n in (s, c, o) else n)
+        self.assertEqual(ordered[0], triples[2])
+
+    def testQueryResult(self):
+        query = """SELECT ?s ?c WHERE { GRAPH <urn:g> { ?s a ?c ; <urn:isbn> "7" } }"""
+        dataset = InMemoryAggregatedGraph(
+            graphs=[self.graph],
+            statistics=lambda: {self.graph.identifier: Statistics.fromGraphs([self.graph])}
+        )
+        self.assertEqual(dataset.statistics().triples, 100)
+        self.assertIsNone(dataset.statistics(URIRef('urn:other')))
+
+        calls = []
+        order = evaluate.orderTriples
+        evaluate.orderTriples = lambda *args: calls.append(args[0]) or order(*args)
+        try:
+            bindings = list(SPARQLProcessor(dataset).query(query)['bindings'])
+        finally:
+            evaluate.orderTriples = order
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(bindings), 1)
+        self.assertEqual(bindings[0]['s'], URIRef('urn:book7'))
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
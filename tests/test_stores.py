@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from os import path
+from tempfile import TemporaryDirectory
+from quit.plugins.stores.compactstore import CompactStore, TermDictionary
+from quit.graphs import termHashes
+from quit.plugins.stores.indexstore import IndexStore, build
+from quit.tools.statistics import Statistics
+from rdflib import ConjunctiveGraph, Graph, BNode, Literal, URIRef
+from rdflib.graph import ModificationException
+from rdflib.namespace import RDF
+from rdflib.store import VALID_STORE, CORRUPTED_STORE, NO_STORE
+
+
+class CompactStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.dictionary = TermDictionary()
+        self.graph = ConjunctiveGraph(store=CompactStore(dictionary=self.dictionary))
+        self.graph.addN([
+            (URIRef('urn:x'), URIRef('urn:y'), Literal('z', lang='en'), Graph(identifier='urn:g1')),
+            (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'), Graph(identifier='urn:g1')),
+            (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'), Graph(identifier='urn:g2')),
+            (URIRef('urn:a'), URIRef('urn:y'), URIRef('urn:z'), Graph(identifier='urn:g2')),
+        ])
+
+    def tearDown(self):
+        pass
+
+    def testTermDictionary(self):
+        self.assertEqual(len(self.dictionary), 7)
+        id = self.dictionary.id(URIRef('urn:x'))
+        self.assertEqual(self.dictionary.term(id), URIRef('urn:x'))
+        self.assertEqual(self.dictionary.add(URIRef('urn:x')), id)
+        self.assertIsNone(self.dictionary.id(Literal('urn:x')))
+
+        # a second graph with the same terms does not grow the dictionary
+        other = ConjunctiveGraph(store=CompactStore(dictionary=self.dictionary))
+        other.addN(self.graph.quads((None, None, None)))
+        self.assertEqual(len(self.dictionary), 7)
+        self.assertEqual(len(other), 3)
+
+    def testTriples(self):
+        g1 = self.graph.get_context(URIRef('urn:g1'))
+        g2 = self.graph.get_context(URIRef('urn:g2'))
+        self.assertEqual(len(g1), 2)
+        self.assertEqual(len(self.graph), 3)
+        self.assertIn((URIRef('urn:x'), URIRef('urn:y'), Literal('z', lang='en')), g1)
+        self.assertNotIn((URIRef('urn:x'), URIRef('urn:y'), Literal('z', lang='en')), g2)
+        self.assertEqual(set(g2.subjects(URIRef('urn:y'), URIRef('urn:z'))),
+                         {URIRef('urn:x'), URIRef('urn:a')})
+        self.assertEqual(list(g1.triples((URIRef('urn:unknown'), None, None))), [])
+
+        quads = list(self.graph.quads((URIRef('urn:x'), None, URIRef('urn:z'))))
+        self.assertEqual(set(c.identifier for s, p, o, c in quads),
+                         {URIRef('urn:g1'), URIRef('urn:g2')})
+        contexts = self.graph.contexts((URIRef('urn:a'), None, None))
+        self.assertEqual(set(c.identifier for c in contexts), {URIRef('urn:g2')})
+
+    def testPatterns(self):
+        quads = [(URIRef('urn:s{}'.format(i % 7)), URIRef('urn:p{}'.format(i % 3)),
+                  Literal(i % 5), Graph(identifier='urn:g')) for i in range(100)]
+        expected = ConjunctiveGraph()
+        expected.addN(quads)
+        graph = ConjunctiveGraph(store=CompactStore(dictionary=self.dictionary))
+        graph.addN(quads)
+
+        triple = (URIRef('urn:s1'), URIRef('urn:p1'), Literal(4))
+        for mask in range(8):
+            pattern = tuple(term if mask & (1 << i) else None for i, term in enumerate(triple))
+            self.assertEqual(sorted(graph.triples(pattern)), sorted(expected.triples(pattern)))
+            self.assertEqual(len(list(graph.triples(pattern))),
+                             len(set(graph.triples(pattern))))
+
+    def testAddAfterRead(self):
+        g1 = self.graph.get_context(URIRef('urn:g1'))
+        self.assertEqual(len(g1), 2)
+        g1.add((URIRef('urn:b'), URIRef('urn:y'), URIRef('urn:z')))
+        g1.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.assertEqual(len(g1), 3)
+        self.assertIn((URIRef('urn:b'), URIRef('urn:y'), URIRef('urn:z')), g1)
+
+    def testRemove(self):
+        self.graph.remove((URIRef('urn:x'), None, None, Graph(identifier='urn:g1')))
+        self.assertEqual(len(self.graph.get_context(URIRef('urn:g1'))), 0)
+        self.assertEqual(len(self.graph.get_context(URIRef('urn:g2'))), 2)
+
+    def testOwnDictionary(self):
+        first = CompactStore()
+        second = CompactStore()
+        self.assertEqual(first.size, 0)
+        first.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')), Graph(identifier='urn:g'))
+        self.assertIsNone(second.termId(URIRef('urn:x')))
+        self.assertGreater(first.size, len('urn:xurn:yurn:zurn:g') + 12)
+        self.assertEqual(second.size, 0)
+
+    def testParse(self):
+        data = '<urn:x> <urn:y> "a\\nb" <urn:g> .\n_:b <urn:y> <urn:x> <urn:g> .\n'
+        graph = ConjunctiveGraph(store='QuitCompact')
+        graph.parse(data=data, format='nquad-canonical')
+        expected = ConjunctiveGraph()
+        expected.parse(data=data, format='nquad-canonical')
+        self.assertEqual(set(graph.quads((None, None, None))),
+                         set(expected.quads((None, None, None))))
+        result = graph.query('SELECT ?o WHERE { GRAPH <urn:g> { <urn:x> <urn:y> ?o } }')
+        self.assertEqual([row[0] for row in result], [Literal('a\nb')])
+
+
+class IndexStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.expected = ConjunctiveGraph()
+        self.expected.addN([(URIRef('urn:s{}'.format(i % 7)), URIRef('urn:p{}'.format(i % 3)),
+                             Literal(i % 5), Graph(identifier='urn:g{}'.format(i % 2)))
+                            for i in range(100)])
+        self.expected.addN([
+            (BNode('b1'), URIRef('urn:p0'), Literal('x\u00e4\0y', lang='de'),
+             Graph(identifier='urn:g0')),
+            (URIRef('urn:s1'), URIRef('urn:p0'), Literal('1', datatype=URIRef('urn:type')),
+             Graph(identifier='urn:g1')),
+            (URIRef('urn:s2'), RDF.type, URIRef('urn:C'), Graph(identifier='urn:g0')),
+        ])
+        self.file = path.join(self.dir.name, 'index')
+        with open(self.file, 'wb') as f:
+            f.write(build(self.expected.quads((None, None, None))))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def testOpen(self):
+        store = IndexStore()
+        self.assertEqual(store.open(self.file), VALID_STORE)
+        graph = ConjunctiveGraph(store=store)
+        self.assertEqual(set(graph.quads((None, None, None))),
+                         set(self.expected.quads((None, None, None))))
+        self.assertEqual(len(graph), len(self.expected))
+        self.assertEqual(len(graph.get_context(URIRef('urn:g1'))),
+                         len(self.expected.get_context(URIRef('urn:g1'))))
+
+    def testSize(self):
+        self.assertEqual(IndexStore(self.file).size, 0)
+        with open(self.file, 'rb') as f:
+            data = f.read()
+        store = IndexStore()
+        store.load(data)
+        self.assertEqual(store.size, len(data))
+
+    def testPatterns(self):
+        graph = ConjunctiveGraph(store=IndexStore(self.file))
+        for context in (URIRef('urn:g0'), URIRef('urn:g1')):
+            g = graph.get_context(context)
+            e = self.expected.get_context(context)
+            triple = (URIRef('urn:s1'), URIRef('urn:p1'), Literal(4))
+            for mask in range(8):
+                pattern = tuple(term if mask & (1 << i) else None for i, term in enumerate(triple))
+                self.assertEqual(sorted(g.triples(pattern)), sorted(e.triples(pattern)))
+        self.assertEqual(list(graph.triples((URIRef('urn:unknown'), None, None))), [])
+
+    def testStatistics(self):
+        store = IndexStore(self.file)
+        for context in (URIRef('urn:g0'), URIRef('urn:g1')):
+            expected = Statistics.fromGraphs([self.expected.get_context(context)])
+            self.assertEqual(vars(store.statistics(context)), vars(expected))
+        self.assertIsNone(store.statistics(URIRef('urn:unknown')))
+
+    def testTermFilter(self):
+        store = IndexStore(self.file)
+        for context in (URIRef('urn:g0'), URIRef('urn:g1')):
+            bloom = store.termFilter(context)
+            for triple in self.expected.get_context(context):
+                self.assertTrue(all(value in bloom for value in termHashes(triple)))
+            self.assertNotIn(termHashes((URIRef('urn:unknown'), None, None))[0], bloom)
+        self.assertIsNone(store.termFilter(URIRef('urn:unknown')))
+
+    def testReadOnly(self):
+        graph = ConjunctiveGraph(store=IndexStore(self.file))
+        with self.assertRaises(ModificationException):
+            graph.add((URIRef('urn:s1'), URIRef('urn:p1'), URIRef('urn:o'), URIRef('urn:g0')))
+        with self.assertRaises(ModificationException):
+            graph.remove((URIRef('urn:s1'), None, None))
+
+    def testInvalidFile(self):
+        self.assertEqual(IndexStore().open(path.join(self.dir.name, 'missing')), NO_STORE)
+        with open(self.file, 'r+b') as f:
+            f.truncate(100)
+        self.assertEqual(IndexStore().open(self.file), CORRUPTED_STORE)
+        self.assertFalse(IndexStore().load(b'garbage'))
+        self.assertTrue(IndexStore().load(build([])))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()